@@ -1,32 +1,70 @@
 from __future__ import annotations
 
+import json
 import os
-from typing import Any, Dict, Tuple, Optional, List
+import time
+from typing import Any, AsyncIterator, Dict, Tuple, Optional, List
 
-from fastapi import APIRouter
-from pydantic import BaseModel, Field
+from fastapi import APIRouter, HTTPException, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
 
-from backend.retrieval.retrieval import _extract_answer_and_sources, get_answer
+from backend.utils.timing import Timings
 
 router = APIRouter(tags=["chat"])
 
 
+def _retrieval():
+    """Import the RAG pipeline on first use.
+
+    It pulls in LangChain, the OpenAI SDK and the vector store clients;
+    importing it here instead of at module level keeps them off the cold
+    start of processes that only serve health checks or PDFs.
+    """
+    from backend.retrieval import retrieval
+
+    return retrieval
+
+
+_SESSION_ID_PATTERN = r"^[A-Za-z0-9_-]{8,64}$"
+
+
 class QueryRequest(BaseModel):
     question: str
     history: Optional[List[dict]] = Field(
         default=None,
         description="Previous conversation history"
     )
+    session_id: Optional[str] = Field(
+        default=None,
+        pattern=_SESSION_ID_PATTERN,
+        description=(
+            "Client-generated conversation id; the server keeps the history and uses `history` "
+            "only when it does not know the id"
+        ),
+    )
+    resume: bool = Field(
+        default=False,
+        description=(
+            "The client already had turns in this session and sent no `history`: an unknown "
+            "`session_id` is answered with 409 so the client can resend the conversation"
+        ),
+    )
 
 class Source(BaseModel):
     file: str
     page: int | None = None
+    # Snippet of the cited chunk and its boxes on `page` as [x0, y0, x1, y1]
+    # fractions of the page size (origin top left), from the ingestion-time
+    # highlight index.
     text: str | None = None
+    boxes: list[list[float]] | None = None
 
 
 class QueryResponse(BaseModel):
     answer: str
     sources: list[Source]
+    session_id: str | None = None
 
 
 _DUMMY_ANSWER = 'During maternity leave, employees working full or part-time will be entitled to occupational maternity pay as follows:\n- For the first eight weeks, full pay less any Statutory Maternity Pay or maternity allowance\n- For the next 18 weeks, half pay plus any Statutory Maternity Pay or maternity allowance (total cannot exceed full pay)\n- For the next 13 weeks, Statutory Maternity Pay or maternity allowance\n- For the final 13 weeks, no pay.'
@@ -68,25 +106,49 @@ _DUMMY_TRACE = {
 }
 
 
-from fastapi import Query
+from fastapi import Path, Query
+
+
+def _require_session(req: QueryRequest) -> None:
+    """409 if *req* continues a session this server does not know and brought no history.
+
+    In-memory sessions live in one worker; after a restart, on another
+    worker or a serverless cold start the client has to resend them.
+    """
+    if req.resume and req.history is None and req.session_id and not _retrieval().has_session(req.session_id):
+        raise HTTPException(status_code=409, detail="Unknown session: resend the request with `history`")
 
 # ---------------------------------------------------------------------------
 # Main chat route – returns answer + source metadata
 # ---------------------------------------------------------------------------
 
 @router.post("/chat", response_model=QueryResponse)
-async def chat(req: QueryRequest, use_dummy_response: bool = Query(False)) -> QueryResponse:  # noqa: D401
+async def chat(
+    req: QueryRequest, response: Response, use_dummy_response: bool = Query(False)
+) -> QueryResponse:  # noqa: D401
     """Return an answer for a staff HR question.
 
     Set query param `use_dummy_response=true` to return a hard-coded dummy answer (UI testing).
+    The `Server-Timing` header breaks the latency down per pipeline stage.
     """
     if use_dummy_response:
-        answer, sources = _extract_answer_and_sources(_DUMMY_ANSWER)
+        answer, sources = _retrieval()._extract_answer_and_sources(_DUMMY_ANSWER)
         return QueryResponse(answer=_DUMMY_ANSWER, sources=sources)
 
-    # Use real pipeline with tracing so we can extract source metadata
-    answer, sources, trace = get_answer(req.question, history=req.history, trace=True)
-    return QueryResponse(answer=answer, sources=[Source(**s) for s in sources])
+    _require_session(req)
+    # Traces are recorded (and sampled) according to the retrieval config.
+    timings = Timings()
+    answer, sources = await _retrieval().aget_answer(
+        req.question, history=req.history, session_id=req.session_id, timings=timings
+    )
+    response.headers["Server-Timing"] = timings.server_timing()
+    return QueryResponse(answer=answer, sources=[Source(**s) for s in sources], session_id=req.session_id)
+
+
+@router.delete("/chat/sessions/{session_id}", status_code=204)
+async def delete_session(session_id: str = Path(pattern=_SESSION_ID_PATTERN)) -> None:
+    """Forget a server-side conversation (e.g. when the user starts a new chat)."""
+    _retrieval().end_session(session_id)
 
 
 # ---------------------------------------------------------------------------
@@ -101,11 +163,138 @@ class DebugResponse(BaseModel):
 
 
 @router.post("/chat/debug", response_model=DebugResponse)
-async def chat_debug(req: QueryRequest, use_dummy_response: bool = Query(False)) -> DebugResponse:  # noqa: D401
+async def chat_debug(
+    req: QueryRequest, response: Response, use_dummy_response: bool = Query(False)
+) -> DebugResponse:  # noqa: D401
     """Same as `/chat` but also returns the retrieval & generation trace."""
     if use_dummy_response:
-        answer, sources = _extract_answer_and_sources(_DUMMY_ANSWER)
+        answer, sources = _retrieval()._extract_answer_and_sources(_DUMMY_ANSWER)
         return DebugResponse(answer=answer, trace=_DUMMY_TRACE, sources=sources)
 
-    answer, sources, trace = get_answer(req.question, trace=True)
+    _require_session(req)
+    timings = Timings()
+    answer, sources, trace = await _retrieval().aget_answer(
+        req.question, history=req.history, session_id=req.session_id, trace=True, timings=timings
+    )
+    response.headers["Server-Timing"] = timings.server_timing()
     return DebugResponse(answer=answer, trace=trace, sources=[Source(**s) for s in sources])
+
+
+# ---------------------------------------------------------------------------
+# Streaming route – Server-Sent Events, one `token` event per text delta and a
+# final `sources` event carrying a QueryResponse
+# ---------------------------------------------------------------------------
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _dummy_stream() -> AsyncIterator[Tuple[str, Any]]:
+    parser = _retrieval()._StreamingSourcesParser()
+    for word in _DUMMY_ANSWER.split(" "):
+        text = parser.feed(word + " ")
+        if text:
+            yield "token", text
+    answer, sources, tail = parser.finish()
+    if tail:
+        yield "token", tail
+    yield "sources", {"answer": answer, "sources": sources}
+
+
+@router.post("/chat/stream")
+async def chat_stream(req: QueryRequest, use_dummy_response: bool = Query(False)) -> StreamingResponse:  # noqa: D401
+    """Stream the answer as Server-Sent Events.
+
+    Emits `event: token` with `{"text": ...}` as the answer is generated and
+    ends with `event: sources` whose data is a `QueryResponse`.  Errors are
+    reported as a final `event: error`.
+    """
+    if not use_dummy_response:
+        _require_session(req)
+    stream = (
+        _dummy_stream()
+        if use_dummy_response
+        else _retrieval().astream_answer(req.question, history=req.history, session_id=req.session_id)
+    )
+
+    async def events() -> AsyncIterator[str]:
+        try:
+            async for kind, payload in stream:
+                if kind == "token":
+                    yield _sse("token", {"text": payload})
+                else:
+                    final = QueryResponse(
+                        answer=payload["answer"],
+                        sources=[Source(**s) for s in payload["sources"]],
+                        session_id=req.session_id,
+                    )
+                    yield _sse("sources", final.model_dump())
+        except Exception as exc:  # noqa: BLE001
+            yield _sse("error", {"detail": str(exc)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+# ---------------------------------------------------------------------------
+# Batch route – many independent questions, one NDJSON line per answer
+# ---------------------------------------------------------------------------
+
+
+class BatchRequest(BaseModel):
+    questions: List[str] = Field(..., min_length=1, max_length=1000)
+    trace: bool = Field(default=True, description="Include each question's retrieval & generation trace")
+    concurrency: Optional[int] = Field(
+        default=None, ge=1, le=64, description="Concurrent LLM calls (default from the retrieval config)"
+    )
+
+
+@router.post("/chat/batch")
+async def chat_batch(req: BatchRequest) -> StreamingResponse:  # noqa: D401
+    """Answer a list of questions, streaming results as NDJSON.
+
+    The questions share one embedding request; searches and LLM calls then
+    run with bounded concurrency.  Each line is
+    `{"index", "question", "answer", "sources", "timings_ms", "trace"}` (or
+    `{"index", "question", "error"}`) in completion order; the last line is
+    `{"summary": {"questions", "errors", "elapsed_ms"}}`.
+    """
+
+    async def lines() -> AsyncIterator[str]:
+        started = time.perf_counter()
+        errors = 0
+        try:
+            async for result in _retrieval().abatch_answers(
+                req.questions, trace=req.trace, concurrency=req.concurrency
+            ):
+                if "error" not in result:
+                    try:
+                        result["sources"] = [Source.model_validate(s).model_dump() for s in result["sources"]]
+                    except ValidationError as exc:
+                        result = {
+                            "index": result["index"],
+                            "question": result["question"],
+                            "error": f"Invalid sources: {exc}",
+                        }
+                if "error" in result:
+                    errors += 1
+                yield json.dumps(result, ensure_ascii=False, default=str) + "\n"
+        except Exception as exc:  # noqa: BLE001
+            yield json.dumps({"error": str(exc)}) + "\n"
+            return
+        summary = {
+            "questions": len(req.questions),
+            "errors": errors,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+        yield json.dumps({"summary": summary}) + "\n"
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,27 +1,116 @@
 from __future__ import annotations
 
+import asyncio
+import os
 from pathlib import Path
+from typing import Literal
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request, Response
 from fastapi.responses import FileResponse
 
 from backend import ROOT_DIR
+from backend.utils.pdf_pages import MEDIA_TYPES, PageCache, PageOutOfRange, file_hash
 
 router = APIRouter(tags=["files"])
 
+_PDF_DIR = ROOT_DIR / "local" / "shrewsbury_policies"
 
-@router.get("/pdf")
-async def get_pdf(file: str = Query(..., description="PDF filename")) -> FileResponse:  # noqa: D401
-    """Stream a PDF sitting under local/.
+# Browsers may reuse a response for an hour, then revalidate with the ETag
+# (a 304 costs a round trip but no body).
+_CACHE_CONTROL = "public, max-age=3600"
 
-    We accept only base filenames to avoid directory traversal.
-    """
+# Longest page range /pdf/page extracts in one response.
+_MAX_RANGE_PAGES = 20
+
+_page_cache = PageCache(
+    ROOT_DIR / os.getenv("MEDDOC_PAGE_CACHE_DIR", "local/cache/pages"),
+    max_bytes=int(os.getenv("MEDDOC_PAGE_CACHE_MB", "512")) * 1024 * 1024,
+)
+
+
+def _resolve(file: str) -> Path:
+    """Map a base filename to the PDF under local/ (no directory traversal)."""
     filename = Path(file).name
     if not filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files allowed")
 
-    pdf_path = ROOT_DIR / "local" / "shrewsbury_policies" / filename
+    pdf_path = _PDF_DIR / filename
     if not pdf_path.exists():
         raise HTTPException(status_code=404, detail=f"File not found")
+    return pdf_path
+
+
+def _not_modified(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison.
+    return etag in (tag.strip().removeprefix("W/") for tag in header.split(","))
+
+
+def _file_response(request: Request, path: Path, media_type: str, etag: str, **kwargs) -> Response:
+    """``FileResponse`` with our ETag and caching headers, or a 304.
+
+    Starlette serves ``Range`` / ``If-Range`` requests (206, 416) itself.
+    """
+    headers = {"ETag": etag, "Cache-Control": _CACHE_CONTROL}
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path=path, media_type=media_type, headers=headers, **kwargs)
+
+
+@router.get("/pdf")
+async def get_pdf(request: Request, file: str = Query(..., description="PDF filename")) -> Response:  # noqa: D401
+    """Stream a PDF sitting under local/.
+
+    We accept only base filenames to avoid directory traversal.  The ETag is
+    the file's content hash, and byte ranges are honoured so PDF viewers can
+    fetch the pages they display first.
+    """
+    pdf_path = _resolve(file)
+    etag = f'"{await asyncio.to_thread(file_hash, pdf_path)}"'
+    return _file_response(request, pdf_path, "application/pdf", etag, filename=pdf_path.name)
+
+
+@router.get("/pdf/page")
+async def get_pdf_page(
+    request: Request,
+    file: str = Query(..., description="PDF filename"),
+    page: int = Query(..., ge=1, description="Page to return (1-based)"),
+    last_page: int | None = Query(None, ge=1, description="Last page of a range; PDF format only"),
+    format: Literal["pdf", "png", "webp"] = Query("pdf", description="Page PDF or rendered image"),
+    dpi: int = Query(144, ge=48, le=300, description="Image resolution; rounded to a multiple of 24"),
+) -> Response:
+    """Return one page (or a short range) of a policy PDF.
+
+    ``format=pdf`` extracts the pages into a small standalone PDF;
+    ``png``/``webp`` render the single page.  Results are cached on disk by
+    source content hash, so repeat requests are served straight from a file
+    with a strong ETag.
+    """
+    pdf_path = _resolve(file)
+    last = last_page or page
+    if last < page or last - page + 1 > _MAX_RANGE_PAGES:
+        raise HTTPException(status_code=400, detail=f"Page range must be ascending and at most {_MAX_RANGE_PAGES} pages")
+    if format != "pdf" and last != page:
+        raise HTTPException(status_code=400, detail="Images are rendered one page at a time")
+    # Bucket the resolution so arbitrary values cannot fill the cache.
+    dpi = max(48, round(dpi / 24) * 24)
 
-    return FileResponse(path=pdf_path, media_type="application/pdf", filename=filename)
+    try:
+        path, key = await asyncio.to_thread(_page_cache.get, pdf_path, page, last, format, dpi)
+    except PageOutOfRange as exc:
+        raise HTTPException(status_code=404, detail=f"Page out of range: {exc}")
+    except ImportError as exc:
+        # PyMuPDF, or Pillow for WebP, is missing in this deployment.
+        raise HTTPException(status_code=501, detail=f"Page rendering unavailable: {exc}")
+    return _file_response(
+        request,
+        path,
+        MEDIA_TYPES[format],
+        f'"{key}"',
+        filename=f"{pdf_path.stem}-p{page}{f'-{last}' if last != page else ''}.{format}",
+        content_disposition_type="inline",
+    )
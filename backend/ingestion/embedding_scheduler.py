@@ -0,0 +1,339 @@
+from __future__ import annotations
+
+"""Rate-limit-aware embedding scheduler shared by the ingestion entry points.
+
+Both ``preprocess.py`` and ``ingest.py`` hand their chunks to
+:class:`EmbeddingScheduler`, which
+
+1. packs chunks into batches bounded by token count and item count,
+2. runs up to ``concurrency`` embedding requests at once under a
+   token-bucket limiter sized to the provider's tokens-per-minute quota,
+3. retries throttled (429) and transient (5xx / network) failures with
+   jittered exponential backoff, honouring ``Retry-After`` when present, and
+4. checkpoints every upserted batch so that a crash mid-folder resumes
+   without re-embedding batches that already reached the vector store.
+
+Before any of that, each chunk is looked up in a content-addressed store
+(SHA-256 of embedding model + whitespace-normalised text, see
+:class:`backend.utils.embedding_cache.EmbeddingCache`).  Only misses are sent
+to the API, so re-chunking the corpus re-embeds just the chunks whose text
+changed, and rebuilding an index for a new replica costs no API calls.
+"""
+
+import asyncio
+import hashlib
+import json
+import random
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Sequence, Set
+
+import openai
+
+from backend.utils.embedding_cache import EmbeddingCache, normalise_text
+from backend.utils.tokens import count_tokens
+
+__all__ = [
+    "DEFAULT_SCHEDULER_CFG",
+    "EmbeddingCheckpoint",
+    "EmbeddingScheduler",
+    "SchedulerStats",
+    "TokenBucket",
+    "chroma_upsert",
+    "count_tokens",
+    "pack_batches",
+]
+
+DEFAULT_SCHEDULER_CFG: Dict[str, Any] = {
+    "tokens_per_minute": 1_000_000,
+    "max_batch_tokens": 8_000,
+    "max_batch_size": 256,
+    "concurrency": 4,
+    "max_retries": 8,
+    "backoff_base_s": 1.0,
+    "backoff_max_s": 60.0,
+    "checkpoint_path": "local/cache/embedding_checkpoint.jsonl",
+    "chunk_store_path": "local/cache/chunk_embeddings.sqlite3",  # None disables
+}
+
+Upsert = Callable[[List[str], List[List[float]], List[str], List[Dict[str, Any]]], Awaitable[None]]
+
+_RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+# ---------------------------------------------------------------------------
+# Token accounting
+# ---------------------------------------------------------------------------
+
+
+def pack_batches(token_counts: Sequence[int], max_tokens: int, max_items: int) -> List[List[int]]:
+    """Greedily group indices so each batch stays under both limits.
+
+    A single text larger than *max_tokens* gets a batch of its own.
+    """
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+    for idx, n in enumerate(token_counts):
+        if current and (current_tokens + n > max_tokens or len(current) >= max_items):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(idx)
+        current_tokens += n
+    if current:
+        batches.append(current)
+    return batches
+
+
+class TokenBucket:
+    """Async token bucket refilled continuously at ``tokens_per_minute``."""
+
+    def __init__(self, tokens_per_minute: float) -> None:
+        self.capacity = float(tokens_per_minute)
+        self.rate = tokens_per_minute / 60.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: int) -> None:
+        # Requests larger than the bucket are clipped so they cannot wait forever.
+        tokens = min(float(tokens), self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+    def drain(self) -> None:
+        """Empty the bucket, e.g. after the provider reported throttling."""
+        self._tokens = 0.0
+        self._updated = time.monotonic()
+
+# ---------------------------------------------------------------------------
+# Checkpointing
+# ---------------------------------------------------------------------------
+
+
+class EmbeddingCheckpoint:
+    """Append-only JSONL log of upserted batches and finished groups.
+
+    A *group* is the unit the caller considers atomic – one PDF (keyed by
+    its ``pdf_hash``) for both ingestion entry points.  Batch keys only
+    matter while their group is incomplete: finishing a group drops them,
+    so ingesting the same PDF again (re-added, rolled back to an earlier
+    version, or into a wiped collection) writes every chunk again.
+    """
+
+    def __init__(self, path: str | Path | None) -> None:
+        self.path = Path(path) if path else None
+        self._batches: Dict[str, Set[str]] = {}
+        if self.path is not None and self.path.exists():
+            with self.path.open("r", encoding="utf-8") as fh:
+                for line in fh:
+                    try:
+                        rec = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # torn final line after a crash
+                    if "batch" in rec:
+                        self._batches.setdefault(rec["group"], set()).add(rec["batch"])
+                    elif "finished" in rec:
+                        self._batches.pop(rec["finished"], None)
+
+    def has_batch(self, group: str, key: str) -> bool:
+        """True if batch *key* of the incomplete *group* was already upserted."""
+        return key in self._batches.get(group, ())
+
+    def is_incomplete(self, group: str) -> bool:
+        """True if some, but not all, batches of *group* were upserted."""
+        return group in self._batches
+
+    def mark_batch(self, group: str, key: str) -> None:
+        self._batches.setdefault(group, set()).add(key)
+        self._append({"group": group, "batch": key})
+
+    def mark_finished(self, group: str) -> None:
+        self._batches.pop(group, None)
+        self._append({"finished": group})
+
+    def _append(self, rec: Dict[str, str]) -> None:
+        if self.path is None:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a", encoding="utf-8") as fh:
+            fh.write(json.dumps(rec) + "\n")
+
+# ---------------------------------------------------------------------------
+# Scheduler
+# ---------------------------------------------------------------------------
+
+
+def _is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, (openai.APIConnectionError, openai.APITimeoutError)):
+        return True
+    status = getattr(exc, "status_code", None)
+    return status in _RETRYABLE_STATUS
+
+
+def _retry_after(exc: BaseException) -> float | None:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+@dataclass
+class SchedulerStats:
+    batches: int = 0
+    skipped_batches: int = 0
+    texts: int = 0
+    cached_texts: int = 0
+    tokens: int = 0
+    retries: int = 0
+    throttled: int = 0
+    elapsed_s: float = 0.0
+
+    def summary(self) -> str:
+        rate = self.tokens / self.elapsed_s * 60 if self.elapsed_s else 0.0
+        return (
+            f"{self.batches} batches ({self.skipped_batches} resumed from checkpoint), "
+            f"{self.texts} texts ({self.cached_texts} from chunk store), "
+            f"{self.tokens} tokens, {self.retries} retries "
+            f"({self.throttled} throttled), {rate:,.0f} tokens/min"
+        )
+
+
+class EmbeddingScheduler:
+    """Embed and upsert chunks in token-packed, rate-limited, concurrent batches."""
+
+    def __init__(self, embeddings: Any, cfg: Dict[str, Any] | None = None, *, root: Path | None = None) -> None:
+        self.cfg = {**DEFAULT_SCHEDULER_CFG, **(cfg or {})}
+        self.embeddings = embeddings
+        self.bucket = TokenBucket(self.cfg["tokens_per_minute"])
+        self._semaphore = asyncio.Semaphore(self.cfg["concurrency"])
+        self.model = getattr(embeddings, "model", "") or ""
+        self.checkpoint = EmbeddingCheckpoint(self._resolve(self.cfg.get("checkpoint_path"), root))
+        store_path = self._resolve(self.cfg.get("chunk_store_path"), root)
+        # Chunk vectors are large; keep the memory tier small and rely on SQLite.
+        self.store = EmbeddingCache(store_path, max_entries=256, normalise=normalise_text) if store_path else None
+        self.stats = SchedulerStats()
+
+    @staticmethod
+    def _resolve(path: str | Path | None, root: Path | None) -> Path | None:
+        if not path:
+            return None
+        path = Path(path)
+        return root / path if root is not None and not path.is_absolute() else path
+
+    @staticmethod
+    def batch_key(ids: Sequence[str], texts: Sequence[str]) -> str:
+        sha = hashlib.sha256()
+        for chunk_id, text in zip(ids, texts):
+            sha.update(chunk_id.encode("utf-8") + b"\0" + text.encode("utf-8") + b"\0")
+        return sha.hexdigest()[:24]
+
+    async def run(
+        self,
+        group: str,
+        texts: Sequence[str],
+        metadatas: Sequence[Dict[str, Any]],
+        ids: Sequence[str],
+        upsert: Upsert,
+        *,
+        finish: bool = True,
+    ) -> int:
+        """Embed *texts* and hand each batch to *upsert*; return texts written.
+
+        Pass ``finish=False`` when *group* arrives in several calls (page
+        windows of one PDF) and mark it finished on the checkpoint after the
+        last one.
+        """
+        started = time.monotonic()
+        if self.store is not None:
+            cached = await asyncio.to_thread(self.store.get_many, list(texts), self.model)
+        else:
+            cached = [None] * len(texts)
+        hits = [i for i, vec in enumerate(cached) if vec is not None]
+        misses = [i for i, vec in enumerate(cached) if vec is None]
+
+        # Stored chunks go straight to the upsert in plain size-bounded
+        # batches; only the misses are token-packed for the API.
+        token_counts = [count_tokens(texts[i]) for i in misses]
+        size = self.cfg["max_batch_size"]
+        batches = [hits[i:i + size] for i in range(0, len(hits), size)]
+        batches += [
+            [misses[j] for j in batch]
+            for batch in pack_batches(token_counts, self.cfg["max_batch_tokens"], size)
+        ]
+        tokens_of = dict(zip(misses, token_counts))
+
+        async def one(indices: List[int]) -> int:
+            batch_ids = [ids[i] for i in indices]
+            batch_texts = [texts[i] for i in indices]
+            key = self.batch_key(batch_ids, batch_texts)
+            if self.checkpoint.is_incomplete(group) and self.checkpoint.has_batch(group, key):
+                self.stats.skipped_batches += 1
+                return 0
+            from_store = cached[indices[0]] is not None
+            batch_tokens = sum(tokens_of.get(i, 0) for i in indices)
+            async with self._semaphore:
+                if not from_store:
+                    vectors = await self._embed_with_retry(batch_texts, batch_tokens)
+                    if self.store is not None:
+                        await asyncio.to_thread(self.store.put_many, batch_texts, self.model, vectors)
+                else:
+                    vectors = [cached[i] for i in indices]
+                await upsert(batch_ids, vectors, batch_texts, [metadatas[i] for i in indices])
+            self.checkpoint.mark_batch(group, key)
+            self.stats.batches += 1
+            self.stats.texts += len(indices)
+            self.stats.cached_texts += len(indices) if from_store else 0
+            self.stats.tokens += batch_tokens
+            return len(indices)
+
+        written = sum(await asyncio.gather(*(one(b) for b in batches)))
+        if finish:
+            self.checkpoint.mark_finished(group)
+        self.stats.elapsed_s += time.monotonic() - started
+        return written
+
+    async def _embed_with_retry(self, texts: List[str], tokens: int) -> List[List[float]]:
+        attempt = 0
+        while True:
+            await self.bucket.acquire(tokens)
+            try:
+                return await self.embeddings.aembed_documents(texts)
+            except Exception as exc:  # noqa: BLE001
+                if not _is_retryable(exc) or attempt >= self.cfg["max_retries"]:
+                    raise
+                attempt += 1
+                self.stats.retries += 1
+                if getattr(exc, "status_code", None) == 429:
+                    self.stats.throttled += 1
+                    self.bucket.drain()
+                delay = _retry_after(exc)
+                if delay is None:
+                    cap = min(self.cfg["backoff_max_s"], self.cfg["backoff_base_s"] * 2 ** attempt)
+                    delay = random.uniform(0, cap)  # "full jitter"
+                await asyncio.sleep(delay)
+
+    def close(self) -> None:
+        if self.store is not None:
+            self.store.close()
+
+
+def chroma_upsert(collection: Any) -> Upsert:
+    """Return an :data:`Upsert` writing pre-computed vectors to a Chroma collection."""
+
+    async def upsert(ids: List[str], vectors: List[List[float]], texts: List[str], metadatas: List[Dict[str, Any]]) -> None:
+        await asyncio.to_thread(
+            collection.upsert, ids=ids, embeddings=vectors, documents=texts, metadatas=metadatas
+        )
+
+    return upsert
@@ -1,68 +1,173 @@
+import asyncio
+import hashlib
 import os
 import pathlib
-from typing import List
+import sys
+from typing import Iterator, List
 import fitz  # PyMuPDF
 import chromadb
 from langchain_openai import OpenAIEmbeddings
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import Chroma
 
+# Allow `python backend/ingestion/ingest.py` to import the project package.
+_ROOT = pathlib.Path(__file__).resolve().parents[2]
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from backend import ROOT_DIR  # noqa: E402
+from backend.ingestion.embedding_scheduler import EmbeddingScheduler, chroma_upsert  # noqa: E402
+from backend.utils.families import DEFAULT_FAMILY_CFG, chunk_family  # noqa: E402
+from backend.vectorstore import corpus_fingerprint, write_corpus_version  # noqa: E402
+
 CHUNK_SIZE = 1000
 CHUNK_OVERLAP = 200
 
+# Pages read per step and chunks embedded per scheduler call; together they
+# bound memory per PDF, however many pages it has.
+WINDOW_PAGES = 20
+EMBED_WINDOW = 256
+
+# Token packing / rate limits for the embedding API; see embedding_scheduler.py.
+SCHEDULER_CFG = {"checkpoint_path": "local/cache/ingest_checkpoint.jsonl"}
+
 def extract_text_from_pdf(pdf_path: pathlib.Path) -> str:
     """Read full text from a PDF using PyMuPDF."""
     doc = fitz.open(pdf_path)
     text = "".join(page.get_text() for page in doc)
     return text
 
-def load_documents(doc_dir: pathlib.Path) -> List[tuple[str, dict]]:
-    """Return list of (chunk_text, metadata) tuples for all PDFs in a directory."""
-    splitter = RecursiveCharacterTextSplitter(
+def _file_hash(pdf_path: pathlib.Path) -> str:
+    sha = hashlib.sha256()
+    with pdf_path.open("rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+def _splitter() -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
         chunk_size=CHUNK_SIZE,
         chunk_overlap=CHUNK_OVERLAP,
+        add_start_index=True,
     )
-    texts = []
-    for pdf_path in doc_dir.glob("*.pdf"):
-        raw_text = extract_text_from_pdf(pdf_path)
-        chunks = splitter.split_text(raw_text)
-        for i, chunk in enumerate(chunks):
-            metadata = {
-                "filename": pdf_path.name,
-                "page_number": None,
-                "chunk": i
-            }
-            texts.append((chunk, metadata))
-    return texts
+
+def _page_at(page_starts: List[tuple[int, int]], offset: int) -> int:
+    """Page number of the text at *offset*, given ``(offset, page)`` page starts."""
+    page = page_starts[0][1]
+    for start, number in page_starts:
+        if start > offset:
+            break
+        page = number
+    return page
+
+def iter_chunks(
+    pdf_path: pathlib.Path, splitter: RecursiveCharacterTextSplitter, *, window_pages: int = WINDOW_PAGES
+) -> Iterator[tuple[str, dict]]:
+    """Yield ``(chunk_text, metadata)`` for one PDF, reading *window_pages* pages at a time.
+
+    The text is split as one stream, as if the pages were joined: the last
+    chunk of each window is held back and re-split with the next window's
+    text, so chunks still run across page boundaries.  ``page_number`` is
+    the page a chunk starts on.
+    """
+    pdf_hash = _file_hash(pdf_path)
+    # Plain text has no headings: the file name decides the family.
+    family = chunk_family(pdf_path.name, [], DEFAULT_FAMILY_CFG)
+    buffer = ""
+    page_starts: List[tuple[int, int]] = []  # (offset in buffer, 1-based page)
+    index = 0
+    with fitz.open(pdf_path) as doc:
+        for first in range(0, doc.page_count, window_pages):
+            last = min(first + window_pages, doc.page_count)
+            for page_no in range(first, last):
+                page_starts.append((len(buffer), page_no + 1))
+                buffer += doc[page_no].get_text()
+            docs = splitter.create_documents([buffer])
+            final = last == doc.page_count
+            for chunk in docs if final else docs[:-1]:
+                yield chunk.page_content, {
+                    "filename": pdf_path.name,
+                    "page_number": _page_at(page_starts, chunk.metadata["start_index"]),
+                    "chunk": index,
+                    "pdf_hash": pdf_hash,
+                    "family": family,
+                }
+                index += 1
+            if not final and docs:
+                cut = docs[-1].metadata["start_index"]
+                carried = _page_at(page_starts, cut)
+                buffer = buffer[cut:]
+                page_starts = [(0, carried)] + [(start - cut, n) for start, n in page_starts if start > cut]
+
+def load_documents(doc_dir: pathlib.Path) -> List[tuple[str, dict]]:
+    """Return list of (chunk_text, metadata) tuples for all PDFs in a directory.
+
+    Holds every chunk in memory; :func:`ingest_documents` streams instead.
+    """
+    splitter = _splitter()
+    return [pair for pdf_path in sorted(doc_dir.glob("*.pdf")) for pair in iter_chunks(pdf_path, splitter)]
+
+async def _embed_stream(pdf_paths: List[pathlib.Path], vectordb: Chroma) -> int:
+    """Embed each PDF's chunks in windows of ``EMBED_WINDOW``, one checkpoint group per PDF."""
+    scheduler = EmbeddingScheduler(vectordb.embeddings, SCHEDULER_CFG, root=ROOT_DIR)
+    upsert = chroma_upsert(vectordb._collection)
+    splitter = _splitter()
+    total = 0
+
+    async def flush(items: list[tuple[str, dict]]) -> int:
+        pdf_hash = items[0][1]["pdf_hash"]
+        texts = [t for t, _ in items]
+        metas = [m for _, m in items]
+        ids = [f"{pdf_hash}-{m['chunk']}" for m in metas]
+        return await scheduler.run(pdf_hash, texts, metas, ids, upsert, finish=False)
+
+    try:
+        for pdf_path in pdf_paths:
+            window: list[tuple[str, dict]] = []
+            pdf_hash = None
+            for text, meta in iter_chunks(pdf_path, splitter):
+                pdf_hash = meta["pdf_hash"]
+                window.append((text, meta))
+                if len(window) >= EMBED_WINDOW:
+                    total += await flush(window)
+                    window = []
+            if window:
+                total += await flush(window)
+            if pdf_hash is not None:
+                scheduler.checkpoint.mark_finished(pdf_hash)
+    finally:
+        scheduler.close()
+    print(f"Embedding: {scheduler.stats.summary()}")
+    return total
 
 def ingest_documents(doc_dir: str) -> None:
-    """Parse PDFs, embed chunks, and persist them to Chroma DB."""
+    """Parse PDFs, embed chunks, and persist them to Chroma DB.
+
+    PDFs are read, split and embedded in windows, so memory stays flat
+    regardless of document size.
+    """
     dir_path = pathlib.Path(doc_dir)
-    pairs = load_documents(dir_path)
-    if not pairs:
+    pdf_paths = sorted(dir_path.glob("*.pdf"))
+    if not pdf_paths:
         print("No PDF files found in", dir_path)
         return
-    docs, metadatas = zip(*pairs)
 
     client = chromadb.HttpClient(host=os.getenv("CHROMA_HOST", "localhost"), port=int(os.getenv("CHROMA_PORT", "8000")))
     embeddings = OpenAIEmbeddings(
         model="text-embedding-3-large",
-        api_key=os.getenv("OPENAI_API_KEY")
+        api_key=os.getenv("OPENAI_API_KEY"),
+        max_retries=0,  # retries are handled by EmbeddingScheduler
     )
 
     vectordb = Chroma(client=client, collection_name="documents", embedding_function=embeddings)
 
-    batch_size = 100
-    total_docs = len(docs)
-
-    for i in range(0, total_docs, batch_size):
-        batch_docs = list(docs[i:i+batch_size])
-        batch_metas = list(metadatas[i:i+batch_size])
-
-        print(f"Processing batch {i//batch_size + 1}/{(total_docs + batch_size - 1)//batch_size}")
-        vectordb.add_texts(texts=batch_docs, metadatas=batch_metas)
+    total = asyncio.run(_embed_stream(pdf_paths, vectordb))
+    # The collection may hold other PDFs too; read its whole pdf_hash set once.
+    # `{}` is the default config, i.e. this "documents" collection.
+    metadatas = vectordb._collection.get(include=["metadatas"])["metadatas"] or []
+    write_corpus_version({}, corpus_fingerprint(m["pdf_hash"] for m in metadatas if m and m.get("pdf_hash")))
 
-    print(f"Ingested {len(docs)} chunks into ChromaDB collection")
+    print(f"Ingested {total} chunks into ChromaDB collection")
 
 if __name__ == "__main__":
     ingest_documents("/app/local/shrewsbury_policies")
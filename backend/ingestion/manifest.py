@@ -0,0 +1,282 @@
+from __future__ import annotations
+
+"""Ingestion manifest and incremental re-ingestion planning.
+
+The manifest records, for every ingested file, the ``pdf_hash`` it was
+ingested at, a content hash per page and the ids of the chunks it produced
+(with their page number).  Comparing a folder against the manifest yields an
+:class:`IngestionPlan`:
+
+* new files are added in full;
+* files whose bytes changed are re-partitioned only on the pages whose hash
+  changed (widened to the full page span of every chunk that touches them) –
+  chunks of untouched pages are kept and merely re-stamped with the new
+  ``pdf_hash`` – unless so many pages changed that a full re-ingest is
+  simpler;
+* files that disappeared from the folder, or – when ``supersede`` is on –
+  that are superseded by a newer version of the same document
+  (``…-V2.pdf`` → ``…-V3.pdf``), have all their chunks deleted;
+* a file with the same bytes as another one in the folder is skipped as a
+  duplicate: chunk ids are derived from ``pdf_hash``, so both copies would
+  write – and later delete – the same chunks.
+"""
+
+import hashlib
+import json
+import os
+import re
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Sequence, Set
+
+import fitz  # PyMuPDF
+
+__all__ = [
+    "FileEntry",
+    "FilePlan",
+    "IngestionManifest",
+    "IngestionPlan",
+    "page_hashes",
+    "plan_folder",
+    "supersede_versions",
+]
+
+
+@dataclass
+class FileEntry:
+    filename: str
+    pdf_hash: str
+    page_hashes: List[str]
+    # chunk id -> [first, last] 1-based page span ([] when unknown)
+    chunks: Dict[str, List[int]] = field(default_factory=dict)
+
+
+class IngestionManifest:
+    """JSON file mapping filename → :class:`FileEntry`."""
+
+    def __init__(self, path: str | Path) -> None:
+        self.path = Path(path)
+        self.entries: Dict[str, FileEntry] = {}
+        if self.path.exists():
+            raw = json.loads(self.path.read_text(encoding="utf-8"))
+            self.entries = {name: FileEntry(**entry) for name, entry in raw.get("files", {}).items()}
+
+    def save(self) -> None:
+        """Write atomically so a crash never leaves a truncated manifest."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+        payload = {"files": {name: asdict(e) for name, e in sorted(self.entries.items())}}
+        tmp.write_text(json.dumps(payload, indent=1), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+
+def page_hashes(pdf_path: Path) -> List[str]:
+    """Return one content hash per page (drawing operators + embedded images)."""
+    hashes: List[str] = []
+    with fitz.open(pdf_path) as doc:
+        for page in doc:
+            sha = hashlib.sha256(page.read_contents())
+            for img in page.get_images(full=True):
+                sha.update(doc.xref_stream_raw(img[0]) or b"")
+            hashes.append(sha.hexdigest()[:16])
+    return hashes
+
+# ---------------------------------------------------------------------------
+# Planning
+# ---------------------------------------------------------------------------
+
+_VERSION_RE = re.compile(r"[-_ ]v(\d+(?:\.\d+)*)(?=\.pdf$)", re.IGNORECASE)
+_FULL_ID_RE = re.compile(r"-\d+")
+
+
+def _version_key(filename: str) -> tuple[str, tuple[int, ...]] | None:
+    match = _VERSION_RE.search(filename)
+    if not match:
+        return None
+    base = filename[: match.start()].lower()
+    return base, tuple(int(p) for p in match.group(1).split("."))
+
+
+def _is_full_ingest_id(chunk_id: str, pdf_hash: str) -> bool:
+    """Whether *chunk_id* is one a full ingest of *pdf_hash* writes (``{pdf_hash}-{n}``)."""
+    return chunk_id.startswith(pdf_hash) and _FULL_ID_RE.fullmatch(chunk_id, len(pdf_hash)) is not None
+
+
+def supersede_versions(filenames: Sequence[str]) -> Dict[str, str]:
+    """Map each superseded filename to the newer file that replaces it.
+
+    Files are grouped by name with the trailing ``-V<n>`` token removed; in
+    each group every version but the highest is superseded.
+    """
+    groups: Dict[str, List[tuple[tuple[int, ...], str]]] = {}
+    for name in filenames:
+        key = _version_key(name)
+        if key is not None:
+            groups.setdefault(key[0], []).append((key[1], name))
+    superseded: Dict[str, str] = {}
+    for versions in groups.values():
+        versions.sort()
+        latest = versions[-1][1]
+        for _, name in versions[:-1]:
+            superseded[name] = latest
+    return superseded
+
+
+@dataclass
+class FilePlan:
+    filename: str
+    action: str  # "add" | "update" | "delete" | "duplicate" | "unchanged"
+    pdf_hash: str | None = None
+    # 0-based page indices to (re-)partition; None means the whole file.
+    pages: List[int] | None = None
+    delete_ids: List[str] = field(default_factory=list)
+    keep_ids: List[str] = field(default_factory=list)
+    page_hashes: List[str] = field(default_factory=list)
+    reason: str = ""
+
+
+@dataclass
+class IngestionPlan:
+    files: List[FilePlan]
+
+    def by_action(self, action: str) -> List[FilePlan]:
+        return [f for f in self.files if f.action == action]
+
+    def report(self) -> str:
+        """Summarise the plan; deletions are listed separately so they are seen before anything runs."""
+        lines, deletions = [], []
+        for plan in self.files:
+            reason = f" ({plan.reason})" if plan.reason else ""
+            if plan.action == "unchanged":
+                continue
+            if plan.action in ("delete", "duplicate"):
+                deletions.append(f"  {plan.action:<9} {plan.filename}: delete {len(plan.delete_ids)} chunks{reason}")
+                continue
+            if plan.pages is None:
+                detail = f"add all pages, delete {len(plan.delete_ids)} chunks"
+            else:
+                detail = (
+                    f"re-embed {len(plan.pages)}/{len(plan.page_hashes)} pages, "
+                    f"keep {len(plan.keep_ids)} chunks, delete {len(plan.delete_ids)}"
+                )
+            lines.append(f"  {plan.action:<9} {plan.filename}: {detail}{reason}")
+        counts = {a: len(self.by_action(a)) for a in ("add", "update", "delete", "duplicate", "unchanged")}
+        header = ", ".join(f"{n} {a}" for a, n in counts.items())
+        planned_pages = sum(len(p.page_hashes) if p.pages is None else len(p.pages) for p in self.files if p.action in ("add", "update"))
+        deleted = sum(len(p.delete_ids) for p in self.files)
+        lines.insert(0, f"[preprocess] Plan: {header}; {planned_pages} pages to partition, {deleted} chunks to delete")
+        if deletions:
+            lines.append(f"[preprocess] Files to delete or skip ({len(deletions)}):")
+            lines.extend(deletions)
+        return "\n".join(lines)
+
+
+def _expand_to_chunk_spans(
+    chunks: Dict[str, List[int]], changed: Set[int], removed: Set[int], num_pages: int
+) -> tuple[Set[int], Set[str]]:
+    """Return (0-based pages to re-partition, chunk ids to delete).
+
+    A chunk that touches a changed page is deleted, and every page it spans
+    must then be re-partitioned so its unchanged text is not lost – which may
+    in turn touch further chunks, hence the fixed-point loop.
+    """
+    todo = set(changed)
+    delete: Set[str] = set()
+    while True:
+        touched = todo | removed
+        newly = {
+            cid for cid, span in chunks.items()
+            if cid not in delete and (not span or any(p - 1 in touched for p in range(span[0], span[-1] + 1)))
+        }
+        if not newly:
+            return todo, delete
+        delete |= newly
+        for cid in newly:
+            span = chunks[cid]
+            todo |= {p - 1 for p in range(span[0], span[-1] + 1) if p - 1 < num_pages} if span else set()
+
+
+def _owners(files: Dict[str, tuple[str, List[str]]], manifest: IngestionManifest) -> Dict[str, str]:
+    """Map each ``pdf_hash`` in *files* to the one filename that ingests it.
+
+    A file already ingested at that hash keeps it; otherwise the first name
+    in sorted order wins.
+    """
+    by_hash: Dict[str, List[str]] = {}
+    for name, (pdf_hash, _) in sorted(files.items()):
+        by_hash.setdefault(pdf_hash, []).append(name)
+
+    def ingested(name: str) -> bool:
+        entry = manifest.entries.get(name)
+        return entry is not None and entry.pdf_hash == files[name][0]
+
+    return {pdf_hash: next((n for n in names if ingested(n)), names[0]) for pdf_hash, names in by_hash.items()}
+
+
+def plan_folder(
+    files: Dict[str, tuple[str, List[str]]],
+    manifest: IngestionManifest,
+    *,
+    max_changed_page_ratio: float = 0.5,
+    supersede: bool = False,
+) -> IngestionPlan:
+    """Compare *files* (filename → (pdf_hash, page hashes)) with *manifest*.
+
+    Superseded versions are only deleted with *supersede*; it deletes every
+    chunk of the older files, so it is opt-in.
+    """
+    plans: List[FilePlan] = []
+    superseded = supersede_versions(list(files)) if supersede else {}
+    owners = _owners(files, manifest)
+
+    for name, (pdf_hash, pages) in sorted(files.items()):
+        entry = manifest.entries.get(name)
+        if owners[pdf_hash] != name:
+            # Chunks it shares with the owner (same pdf_hash) must survive.
+            ids = list(entry.chunks) if entry and entry.pdf_hash != pdf_hash else []
+            plans.append(FilePlan(name, "duplicate", pdf_hash, delete_ids=ids, reason=f"same content as {owners[pdf_hash]}"))
+            continue
+        if name in superseded:
+            ids = list(entry.chunks) if entry else []
+            plans.append(FilePlan(name, "delete", pdf_hash, delete_ids=ids, reason=f"superseded by {superseded[name]}"))
+            continue
+        if entry is None:
+            plans.append(FilePlan(name, "add", pdf_hash, page_hashes=pages))
+            continue
+        if entry.pdf_hash == pdf_hash:
+            plans.append(FilePlan(name, "unchanged", pdf_hash, keep_ids=list(entry.chunks), page_hashes=pages))
+            continue
+
+        changed = [i for i, h in enumerate(pages) if i >= len(entry.page_hashes) or entry.page_hashes[i] != h]
+        removed = set(range(len(pages), len(entry.page_hashes)))
+        pages_todo, delete_ids = _expand_to_chunk_spans(entry.chunks, set(changed), removed, len(pages))
+        unknown_spans = any(not entry.chunks[cid] for cid in delete_ids)
+        if not pages or unknown_spans or len(pages_todo) / len(pages) > max_changed_page_ratio:
+            plans.append(
+                FilePlan(name, "update", pdf_hash, delete_ids=list(entry.chunks), page_hashes=pages,
+                         reason=f"{len(changed)} pages changed, full re-ingest")
+            )
+            continue
+        keep_ids = [cid for cid in entry.chunks if cid not in delete_ids]
+        plans.append(
+            FilePlan(name, "update", pdf_hash, pages=sorted(pages_todo), delete_ids=sorted(delete_ids),
+                     keep_ids=keep_ids, page_hashes=pages)
+        )
+
+    for name, entry in sorted(manifest.entries.items()):
+        if name not in files:
+            plans.append(FilePlan(name, "delete", entry.pdf_hash, delete_ids=list(entry.chunks), reason="file removed"))
+
+    # A removed file renamed in the folder is re-added under its new name and
+    # rewrites the same `{pdf_hash}-{n}` ids in place; deletions run last, so
+    # they must not take those ids (or any id a kept file still uses) with them.
+    kept = {cid for p in plans if p.action in ("unchanged", "update") for cid in p.keep_ids}
+    rewritten = {p.pdf_hash for p in plans if p.action in ("add", "update") and p.pages is None}
+    for plan in plans:
+        if plan.action in ("delete", "duplicate"):
+            plan.delete_ids = [
+                cid for cid in plan.delete_ids
+                if cid not in kept and not (plan.pdf_hash in rewritten and _is_full_ingest_id(cid, plan.pdf_hash))
+            ]
+
+    return IngestionPlan(plans)
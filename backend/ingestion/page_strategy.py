@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+"""Per-page choice of partition strategy for ``partition_strategy: adaptive``.
+
+Most policy PDFs have a clean text layer, and unstructured's ``fast``
+strategy extracts it in milliseconds per page.  ``hi_res`` runs layout
+detection (and OCR) and costs seconds per page, but it is only needed where
+the text layer is missing or misleading.  :func:`plan_strategies` profiles
+every page with PyMuPDF – characters in the text layer, share of the page
+covered by text and by images, and the number of ruling lines (table
+borders) – and groups the pages by strategy:
+
+* ``scanned`` – hardly any text but images (or mostly images): ``hi_res``;
+* ``table`` – many horizontal / vertical rules: ``hi_res``, which returns
+  ``Table`` elements with their structure;
+* ``text`` – everything else: ``fast``.
+
+Both strategies return the same unstructured ``Element`` types, so the
+chunker and the highlight index see no difference.  :class:`PartitionReport`
+adds up pages and seconds per strategy for the ingestion summary.
+"""
+
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List
+
+import fitz  # PyMuPDF
+
+__all__ = ["DEFAULT_ADAPTIVE_CFG", "PageProfile", "PartitionReport", "plan_strategies", "profile_page"]
+
+DEFAULT_ADAPTIVE_CFG: Dict[str, Any] = {
+    "text_strategy": "fast",
+    "hi_res_strategy": "hi_res",
+    # Fewer characters than this in the text layer, with an image on the
+    # page, means a scanned page.
+    "min_text_chars": 80,
+    # Images covering this share of the page always go to hi_res.
+    "max_image_ratio": 0.6,
+    # This many ruling lines (or cell edges) make a page table-like.
+    "table_min_lines": 12,
+    "min_line_length": 20.0,  # points; shorter strokes are underlines etc.
+    # Used for the time-saved estimate until a hi_res page has been timed.
+    "hi_res_page_s": 2.0,
+}
+
+
+@dataclass
+class PageProfile:
+    page: int  # 0-based
+    chars: int
+    text_ratio: float
+    image_ratio: float
+    ruling_lines: int
+    kind: str  # "text", "scanned" or "table"
+
+
+def _ruling_lines(page: fitz.Page, min_length: float, page_area: float) -> int:
+    lines = 0
+    for path in page.get_drawings():
+        for item in path["items"]:
+            if item[0] == "l":
+                p1, p2 = item[1], item[2]
+                dx, dy = abs(p1.x - p2.x), abs(p1.y - p2.y)
+                if (dy < 1 and dx >= min_length) or (dx < 1 and dy >= min_length):
+                    lines += 1
+            elif item[0] == "re":
+                rect = item[1]
+                if min(rect.width, rect.height) < 2 and max(rect.width, rect.height) >= min_length:
+                    lines += 1  # a rule drawn as a thin filled rectangle
+                elif rect.width >= min_length and rect.height >= 2 and rect.width * rect.height < 0.25 * page_area:
+                    lines += 2  # a cell box; page-sized backgrounds are ignored
+    return lines
+
+
+def profile_page(page: fitz.Page, index: int, cfg: Dict[str, Any] = DEFAULT_ADAPTIVE_CFG) -> PageProfile:
+    """Measure one page and classify it."""
+    rect = page.rect
+    area = (rect.width * rect.height) or 1.0
+    chars = 0
+    text_area = 0.0
+    for x0, y0, x1, y1, text, _, block_type in page.get_text("blocks"):
+        if block_type == 0:
+            chars += len(text.strip())
+            text_area += (x1 - x0) * (y1 - y0)
+    image_area = 0.0
+    for info in page.get_image_info():
+        box = fitz.Rect(info["bbox"]) & rect
+        if not box.is_empty:
+            image_area += box.width * box.height
+    image_ratio = min(1.0, image_area / area)
+    lines = _ruling_lines(page, cfg["min_line_length"], area)
+
+    if image_ratio >= cfg["max_image_ratio"] or (chars < cfg["min_text_chars"] and image_ratio > 0):
+        kind = "scanned"
+    elif lines >= cfg["table_min_lines"]:
+        kind = "table"
+    else:
+        kind = "text"
+    return PageProfile(index, chars, round(min(1.0, text_area / area), 3), round(image_ratio, 3), lines, kind)
+
+
+def plan_strategies(
+    pdf_path: Path, cfg: Dict[str, Any], pages: List[int] | None = None
+) -> Dict[str, List[int]]:
+    """Return ``{strategy: [0-based pages]}`` for *pages* (default: all) of *pdf_path*."""
+    plan: Dict[str, List[int]] = {}
+    with fitz.open(pdf_path) as doc:
+        for index in range(doc.page_count) if pages is None else pages:
+            kind = profile_page(doc[index], index, cfg).kind
+            strategy = cfg["text_strategy"] if kind == "text" else cfg["hi_res_strategy"]
+            plan.setdefault(strategy, []).append(index)
+    return plan
+
+
+@dataclass
+class PartitionReport:
+    """Pages and partitioning seconds per strategy (``cache`` for cache hits)."""
+
+    pages: Dict[str, int] = field(default_factory=dict)
+    seconds: Dict[str, float] = field(default_factory=dict)
+
+    def record(self, strategy: str, pages: int, seconds: float) -> None:
+        self.pages[strategy] = self.pages.get(strategy, 0) + pages
+        self.seconds[strategy] = self.seconds.get(strategy, 0.0) + seconds
+
+    def merge(self, other: "PartitionReport") -> None:
+        for strategy, pages in other.pages.items():
+            self.record(strategy, pages, other.seconds.get(strategy, 0.0))
+
+    def saved_s(self, cfg: Dict[str, Any] = DEFAULT_ADAPTIVE_CFG) -> float:
+        """Estimated seconds saved against partitioning the ``fast`` pages with hi_res."""
+        hi_res, fast = cfg["hi_res_strategy"], cfg["text_strategy"]
+        per_page = (
+            self.seconds[hi_res] / self.pages[hi_res] if self.pages.get(hi_res) else cfg["hi_res_page_s"]
+        )
+        return max(0.0, self.pages.get(fast, 0) * per_page - self.seconds.get(fast, 0.0))
+
+    def as_dict(self, cfg: Dict[str, Any] | None = None) -> Dict[str, Any]:
+        """Totals; with the adaptive *cfg* also the estimated ``saved_s``."""
+        out: Dict[str, Any] = {
+            "pages": dict(self.pages),
+            "seconds": {k: round(v, 2) for k, v in self.seconds.items()},
+        }
+        if cfg is not None:
+            out["saved_s"] = round(self.saved_s(cfg), 1)
+        return out
+
+    def summary(self, cfg: Dict[str, Any] | None = None) -> str:
+        parts = [f"{strategy} {pages} pages ({self.seconds[strategy]:.1f}s)" for strategy, pages in self.pages.items()]
+        line = "  ".join(parts) or "nothing partitioned"
+        if cfg is not None:
+            line += f"  (~{self.saved_s(cfg):.0f}s saved vs all {cfg['hi_res_strategy']})"
+        return line
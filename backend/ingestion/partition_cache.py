@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+"""Content-addressed cache of ``partition_pdf`` output.
+
+Partitioning (``hi_res`` in particular) is by far the slowest ingestion
+step, so its output is kept on disk.  An entry is keyed by the PDF's
+``pdf_hash``, the partition strategy and the installed ``unstructured``
+version: a revised file or a library upgrade never reuses stale elements,
+whatever the file is called.
+
+Each entry is a zip archive (deflate) holding ``meta.json`` and one JSON
+member per page, ``pages/00012.json``, with the element dicts of that page.
+:meth:`PartitionCache.load` can therefore read just the pages a partial
+re-ingest (or one page window of a large file) needs without inflating the
+rest, and :meth:`PartitionCache.store_pages` builds an entry window by
+window without holding the whole document.  The cache is bounded by
+``max_bytes``; the least recently used entries are deleted first.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+import zipfile
+from pathlib import Path
+from typing import Any, Dict, Iterable, List
+
+__all__ = ["DEFAULT_PARTITION_CACHE_CFG", "PartitionCache", "open_partition_cache", "unstructured_version"]
+
+DEFAULT_PARTITION_CACHE_CFG: Dict[str, Any] = {
+    "enabled": True,
+    "path": "local/cache/partitions",
+    "max_mb": 2048,
+}
+
+_version: str | None = None
+
+
+def unstructured_version() -> str:
+    """Installed ``unstructured`` version (part of every cache key)."""
+    global _version
+    if _version is None:
+        try:
+            from unstructured.__version__ import __version__ as version
+        except ImportError:
+            from importlib.metadata import PackageNotFoundError, version as dist_version
+
+            try:
+                version = dist_version("unstructured")
+            except PackageNotFoundError:
+                version = "unknown"
+        _version = str(version)
+    return _version
+
+
+def _page_member(page: int) -> str:
+    return f"pages/{page:05d}.json"
+
+
+class PartitionCache:
+    """Partitioned elements per ``(pdf_hash, strategy, unstructured version)``.
+
+    Parameters
+    ----------
+    root: str | Path
+        Cache directory; one ``.zip`` file per entry.
+    max_bytes: int
+        Once the entries exceed this size the least recently used ones are
+        deleted until the cache is back under 90 % of it.
+    """
+
+    def __init__(self, root: str | Path, *, max_bytes: int = 2048 * 1024 * 1024) -> None:
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def path(self, pdf_hash: str, strategy: str) -> Path:
+        safe_version = unstructured_version().replace("/", "_")
+        return self.root / f"{pdf_hash[:32]}-{strategy}-{safe_version}.zip"
+
+    def has(self, pdf_hash: str, strategy: str) -> bool:
+        return self.path(pdf_hash, strategy).exists()
+
+    def load(self, pdf_hash: str, strategy: str, pages: Iterable[int] | None = None) -> List[Any] | None:
+        """Return the cached elements, or ``None`` on a miss.
+
+        With *pages* (1-based) only those pages are read; elements without a
+        page number are only returned by a full load.
+        """
+        from unstructured.staging.base import elements_from_dicts
+
+        path = self.path(pdf_hash, strategy)
+        try:
+            archive = zipfile.ZipFile(path)
+        except FileNotFoundError:
+            return None
+        except zipfile.BadZipFile:
+            path.unlink(missing_ok=True)  # truncated by a crash: partition again
+            return None
+        with archive:
+            stored = json.loads(archive.read("meta.json"))["pages"]
+            wanted = stored if pages is None else [p for p in sorted(set(pages)) if p in stored]
+            dicts: List[Dict[str, Any]] = []
+            for page in wanted:
+                dicts.extend(json.loads(archive.read(_page_member(page))))
+        try:
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            pass
+        return elements_from_dicts(dicts)
+
+    def store(self, pdf_hash: str, strategy: str, elements: List[Any]) -> Path:
+        """Write *elements* as one entry (atomically) and evict if over budget."""
+        return self.store_pages(pdf_hash, strategy, elements, first=True, last=True, writer=uuid.uuid4().hex)
+
+    def store_pages(
+        self,
+        pdf_hash: str,
+        strategy: str,
+        elements: List[Any],
+        *,
+        first: bool,
+        last: bool,
+        writer: str = "",
+        default_page: int = 0,
+    ) -> Path | None:
+        """Add one page window of elements to the entry being built.
+
+        Windows go to a temporary archive (named after *writer*, so two
+        files with the same content do not collide); the entry appears
+        atomically once the *last* window is written.  *default_page* is
+        used for elements before the first one with a page number.
+        """
+        from unstructured.staging.base import elements_to_dicts
+
+        by_page: Dict[int, List[Dict[str, Any]]] = {}
+        page = default_page
+        for element in elements_to_dicts(elements):
+            # Elements without a page stay next to their predecessor, so a
+            # full load returns them in the original order.
+            page = (element.get("metadata") or {}).get("page_number") or page
+            by_page.setdefault(page, []).append(element)
+
+        path = self.path(pdf_hash, strategy)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{writer.replace('/', '_') or 'w'}.tmp")
+        with zipfile.ZipFile(tmp, "w" if first else "a", compression=zipfile.ZIP_DEFLATED, compresslevel=6) as archive:
+            for number, page_elements in sorted(by_page.items()):
+                archive.writestr(_page_member(number), json.dumps(page_elements, separators=(",", ":")))
+            if last:
+                stored = sorted(int(name[6:11]) for name in archive.namelist() if name.startswith("pages/"))
+                meta = {
+                    "pdf_hash": pdf_hash,
+                    "strategy": strategy,
+                    "unstructured": unstructured_version(),
+                    "pages": stored,
+                    "created": time.time(),
+                }
+                archive.writestr("meta.json", json.dumps(meta))
+        if not last:
+            return None
+        os.replace(tmp, path)
+        self._evict()
+        return path
+
+    def size(self) -> int:
+        return sum(f.stat().st_size for f in self.root.glob("*.zip"))
+
+    def _evict(self) -> None:
+        with self._lock:
+            entries = []
+            for f in self.root.glob("*.zip"):
+                try:
+                    st = f.stat()
+                except FileNotFoundError:
+                    continue  # evicted by another worker
+                entries.append((st.st_mtime, st.st_size, f))
+            size = sum(s for _, s, _ in entries)
+            if size <= self.max_bytes:
+                return
+            entries.sort()
+            for _, entry_size, f in entries:
+                if size <= self.max_bytes * 0.9:
+                    break
+                f.unlink(missing_ok=True)
+                size -= entry_size
+
+
+def open_partition_cache(cfg: Dict[str, Any], root: Path) -> PartitionCache | None:
+    """The cache configured in *cfg*'s ``partition_cache`` block, or ``None`` if disabled."""
+    cache_cfg = {**DEFAULT_PARTITION_CACHE_CFG, **cfg.get("partition_cache", {})}
+    if not cache_cfg["enabled"]:
+        return None
+    return PartitionCache(root / cache_cfg["path"], max_bytes=int(cache_cfg["max_mb"] * 1024 * 1024))
@@ -1,24 +1,56 @@
 from __future__ import annotations
 
+import argparse
+import asyncio
 import hashlib
+import json
 import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Any, List
 
-import chromadb
+import fitz  # PyMuPDF
 import yaml
-from langchain_community.vectorstores import Chroma
 from langchain_openai import OpenAIEmbeddings
-from tqdm import tqdm
 from unstructured.chunking.title import chunk_by_title
 from unstructured.documents.elements import Element
 from unstructured.partition.pdf import partition_pdf
-from unstructured.staging.base import elements_from_json, elements_to_json
+
+# Allow `python backend/ingestion/preprocess.py` to import the project package.
+_ROOT = Path(__file__).resolve().parents[2]
+if str(_ROOT) not in sys.path:
+    sys.path.insert(0, str(_ROOT))
+
+from backend import ROOT_DIR  # noqa: E402
+from backend.ingestion.embedding_scheduler import (  # noqa: E402
+    DEFAULT_SCHEDULER_CFG, EmbeddingScheduler, SchedulerStats, chroma_upsert)
+from backend.ingestion.manifest import (  # noqa: E402
+    FileEntry, FilePlan, IngestionManifest, page_hashes, plan_folder)
+from backend.ingestion.page_strategy import (  # noqa: E402
+    DEFAULT_ADAPTIVE_CFG, PartitionReport, plan_strategies)
+from backend.ingestion.partition_cache import (  # noqa: E402
+    DEFAULT_PARTITION_CACHE_CFG, open_partition_cache)
+from backend.utils.families import DEFAULT_FAMILY_CFG, chunk_family, family_cfg  # noqa: E402
+from backend.utils.highlights import DEFAULT_HIGHLIGHT_CFG, chunk_highlight  # noqa: E402
+from backend.utils.metrics import observe, observe_stage  # noqa: E402
+from backend.utils.timing import Timings  # noqa: E402
+from backend.vectorstore import (  # noqa: E402
+    DEFAULT_LEXICAL_CFG, DEFAULT_VECTOR_STORE_CFG, LexicalIndex, VectorStore, corpus_fingerprint,
+    open_lexical_index, open_vector_store, target_name, write_corpus_version)
 
 _DEFAULT_CFG: dict[str, Any] = {
-    "partition_strategy": "hi_res",
-    "save_elements": True,
-    "save_folder": "cache/partitioned_elements/hi_res",
+    # "adaptive" partitions pages with a clean text layer with "fast" and
+    # only scanned or table-heavy pages with "hi_res"; any unstructured
+    # strategy name applies that strategy to every page.
+    "partition_strategy": "adaptive",
+    "adaptive_partition": dict(DEFAULT_ADAPTIVE_CFG),
+    # partition_pdf output keyed by pdf_hash + strategy + unstructured
+    # version (see backend/ingestion/partition_cache.py).
+    "partition_cache": dict(DEFAULT_PARTITION_CACHE_CFG),
     "chunking": {
         "strategy": "by_title",
         "max_characters": 1000,
@@ -30,25 +62,128 @@ _DEFAULT_CFG: dict[str, Any] = {
         "embedding_model": "text-embedding-3-large",
         "collection_name": "documents",
     },
+    # "chroma" writes to the Chroma server; "local" builds the embedded
+    # memory-mapped index under `path` for the API to load read-only.
+    "vector_store": dict(DEFAULT_VECTOR_STORE_CFG),
+    # BM25 index over the same chunk ids, used for hybrid retrieval.
+    "lexical_index": dict(DEFAULT_LEXICAL_CFG),
+    # Document family (leave, pay, sickness, …) of each chunk, from the file
+    # name and section headings; used by the query router and
+    # vector_store.shard_by_family (see backend/utils/families.py).
+    "families": dict(DEFAULT_FAMILY_CFG),
+    "pipeline": {
+        "partition_workers": None,  # None → one per CPU core
+        "upsert_workers": 2,
+        "queue_size": 4,  # partitioned page windows allowed to wait for upsert
+        # Larger PDFs are partitioned, chunked and embedded this many pages
+        # at a time, so memory does not grow with document size.
+        "window_pages": 50,
+    },
+    # Token packing, rate limiting, retries and checkpointing for embeddings;
+    # see backend/ingestion/embedding_scheduler.py for the available keys.
+    # `{target}` in the checkpoint and manifest paths is replaced by the
+    # vector store being written, so each store tracks its own progress.
+    "embedding_scheduler": {
+        **DEFAULT_SCHEDULER_CFG,
+        "checkpoint_path": "local/cache/embedding_checkpoint-{target}.jsonl",
+    },
+    # Page, bounding boxes and snippet per chunk, stored in its metadata for
+    # highlighting cited passages (see backend/utils/highlights.py).
+    "highlights": dict(DEFAULT_HIGHLIGHT_CFG),
+    "incremental": {
+        "manifest_path": "local/cache/ingest_manifest-{target}.json",
+        "dry_run": False,  # print the add/delete plan and stop
+        "max_changed_page_ratio": 0.5,  # above this, re-ingest the whole file
+        # "...-V3.pdf" replaces "...-V2.pdf" and deletes its chunks; opt-in
+        # (`--supersede`) as a wrong guess drops a live document.
+        "supersede_versions": False,
+    },
 }
 
-def _cache_path(pdf_path: Path, save_folder: Path) -> Path:
-    save_folder.mkdir(parents=True, exist_ok=True)
-    return save_folder / f"{pdf_path.stem}.json"
+def _adaptive_cfg(cfg: dict[str, Any]) -> dict[str, Any]:
+    return {**DEFAULT_ADAPTIVE_CFG, **cfg.get("adaptive_partition", {})}
+
+
+def _cache_strategy(cfg: dict[str, Any]) -> str:
+    """Strategy part of partition cache keys; adaptive runs include their thresholds."""
+    strategy = cfg["partition_strategy"]
+    if strategy == "adaptive":
+        thresholds = {k: v for k, v in _adaptive_cfg(cfg).items() if k != "hi_res_page_s"}
+        strategy += "-" + hashlib.sha256(json.dumps(thresholds, sort_keys=True).encode()).hexdigest()[:8]
+    return strategy
+
+
+def _partition_subset(pdf_path: Path, pages: list[int], strategy: str) -> List[Element]:
+    """Partition *pages* (0-based) of *pdf_path* with *strategy*, keeping original page numbers."""
+    with fitz.open(pdf_path) as src, fitz.open() as subset, tempfile.TemporaryDirectory() as tmp:
+        for page in pages:
+            subset.insert_pdf(src, from_page=page, to_page=page)
+        sub_path = Path(tmp) / pdf_path.name
+        subset.save(sub_path)
+        elements = partition_pdf(filename=str(sub_path), strategy=strategy, metadata_filename=pdf_path.name)
+    for el in elements:
+        if el.metadata.page_number:
+            el.metadata.page_number = pages[el.metadata.page_number - 1] + 1
+    return elements
+
 
-def preprocess_pdf(pdf_path: Path, cfg: dict[str, Any]) -> List[Element]:
-    save_folder = Path("/app") / cfg["save_folder"]
-    cache_file = _cache_path(pdf_path, save_folder)
+def _partition(
+    pdf_path: Path, cfg: dict[str, Any], pages: list[int] | None = None, report: PartitionReport | None = None
+) -> List[Element]:
+    """Partition *pages* (0-based; default all) of *pdf_path* with the configured strategy.
 
-    if cfg.get("save_elements", False) and cache_file.exists():
-        print(f"Loading cached elements from {cache_file}")
-        return elements_from_json(cache_file)
+    With ``adaptive`` every page is classified first (see
+    ``backend/ingestion/page_strategy.py``) and each group of pages is
+    partitioned with its own strategy; the elements are merged back in page
+    order.
+    """
+    strategy = cfg["partition_strategy"]
+    with fitz.open(pdf_path) as doc:
+        page_count = doc.page_count
+    if strategy == "adaptive":
+        plan = plan_strategies(pdf_path, _adaptive_cfg(cfg), pages)
+    else:
+        plan = {strategy: list(range(page_count)) if pages is None else pages}
+    print(
+        f"Partitioning {pdf_path.name}: "
+        + ", ".join(f"{len(group)} pages {name}" for name, group in plan.items())
+    )
+
+    elements: List[Element] = []
+    for name, group in plan.items():
+        t0 = time.perf_counter()
+        if len(group) == page_count:
+            elements.extend(partition_pdf(filename=str(pdf_path), strategy=name))
+        else:
+            elements.extend(_partition_subset(pdf_path, group, name))
+        if report is not None:
+            report.record(name, len(group), time.perf_counter() - t0)
+    if len(plan) > 1:
+        elements.sort(key=lambda el: el.metadata.page_number or 0)  # stable: keeps reading order
+    return elements
 
-    print(f"Partitioning PDF: {pdf_path.name}")
-    elements = partition_pdf(filename=str(pdf_path), strategy=cfg["partition_strategy"])
 
-    if cfg.get("save_elements", False):
-        elements_to_json(elements, cache_file)
+def preprocess_pdf(
+    pdf_path: Path, cfg: dict[str, Any], pdf_hash: str | None = None, report: PartitionReport | None = None
+) -> List[Element]:
+    """Partition *pdf_path*, reusing the partition cache when it has this exact file."""
+    strategy = _cache_strategy(cfg)
+    cache = open_partition_cache(cfg, ROOT_DIR)
+    if cache is not None:
+        pdf_hash = pdf_hash or _compute_hash(pdf_path)
+        t0 = time.perf_counter()
+        elements = cache.load(pdf_hash, strategy)
+        if elements is not None:
+            print(f"Loaded cached elements of {pdf_path.name}")
+            if report is not None:
+                pages = {el.metadata.page_number for el in elements if el.metadata.page_number}
+                report.record("cache", len(pages), time.perf_counter() - t0)
+            return elements
+
+    elements = _partition(pdf_path, cfg, report=report)
+
+    if cache is not None:
+        cache.store(pdf_hash, strategy, elements)
 
     return elements
 
@@ -69,7 +204,552 @@ def chunk_elements(elements: List[Element], cfg: dict[str, Any]):
 
     return chunks
 
-def process_folder(folder: Path, cfg: dict[str, Any]) -> None:
+def _compute_hash(path: Path) -> str:
+    sha = hashlib.sha256()
+    with path.open("rb") as fh:
+        for chunk in iter(lambda: fh.read(8192), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _existing_chunks(collection, pdf_hash: str, filename: str) -> dict[str, list[int]]:
+    """Return ``{chunk id: [page, page]}`` for chunks already stored for *pdf_hash* under *filename*.
+
+    Chunks of another file with the same bytes (a renamed or duplicate copy)
+    are not adopted: the plan would keep them under the wrong filename.
+    """
+    try:
+        res = collection.get(where={"pdf_hash": pdf_hash}, include=["metadatas"])
+    except Exception:
+        return {}
+    chunks: dict[str, list[int]] = {}
+    for chunk_id, meta in zip(res.get("ids") or [], res.get("metadatas") or []):
+        if (meta or {}).get("filename") != filename:
+            continue
+        page = (meta or {}).get("page_number")
+        chunks[chunk_id] = [page, page] if page else []
+    return chunks
+
+
+def _chunk_span(chunk: Element) -> list[int]:
+    pages = [el.metadata.page_number for el in (chunk.metadata.orig_elements or []) if el.metadata.page_number]
+    first = chunk.metadata.page_number
+    if pages:
+        return [min(pages), max(pages)]
+    return [first, first] if first else []
+
+
+def _page_runs(pages: list[int]) -> list[list[int]]:
+    """Split sorted 0-based page indices into runs of consecutive pages."""
+    runs: list[list[int]] = []
+    for page in pages:
+        if runs and page == runs[-1][-1] + 1:
+            runs[-1].append(page)
+        else:
+            runs.append([page])
+    return runs
+
+
+def _partition_pages(
+    pdf_path: Path,
+    pages: list[int],
+    cfg: dict[str, Any],
+    pdf_hash: str | None = None,
+    report: PartitionReport | None = None,
+) -> List[Element]:
+    """Partition only *pages* (0-based) of *pdf_path*, keeping original page numbers.
+
+    If the whole file is in the partition cache (e.g. after ``--warm``),
+    just those pages are read from it instead.
+    """
+    cache = open_partition_cache(cfg, ROOT_DIR)
+    if cache is not None and pdf_hash:
+        t0 = time.perf_counter()
+        elements = cache.load(pdf_hash, _cache_strategy(cfg), [page + 1 for page in pages])
+        if elements is not None:
+            print(f"Loaded {len(pages)} pages of {pdf_path.name} from the partition cache")
+            if report is not None:
+                report.record("cache", len(pages), time.perf_counter() - t0)
+            return elements
+
+    return _partition(pdf_path, cfg, pages, report)
+
+# ---------------------------------------------------------------------------
+# Pipeline stages
+# ---------------------------------------------------------------------------
+
+
+@dataclass
+class _StageStats:
+    """Throughput bookkeeping for one pipeline stage."""
+
+    name: str
+    unit: str
+    items: int = 0
+    busy_s: float = 0.0
+    first_start: float | None = None
+    last_end: float | None = None
+
+    def record(self, started: float, ended: float, items: int = 1) -> None:
+        observe_stage("ingest", self.name, ended - started)
+        self.items += items
+        self.busy_s += ended - started
+        self.first_start = started if self.first_start is None else min(self.first_start, started)
+        self.last_end = ended if self.last_end is None else max(self.last_end, ended)
+
+    def as_dict(self) -> dict[str, Any]:
+        span = (self.last_end - self.first_start) if self.items else 0.0
+        return {
+            "items": self.items,
+            "unit": self.unit,
+            "busy_s": round(self.busy_s, 3),
+            "span_s": round(span, 3),
+            "rate": round(self.items / span, 2) if span > 0 else 0.0,
+        }
+
+    def summary(self) -> str:
+        span = (self.last_end - self.first_start) if self.items else 0.0
+        rate = self.items / span if span > 0 else 0.0
+        return (
+            f"  {self.name:<10} {self.items:>6} {self.unit:<7}"
+            f" busy {self.busy_s:8.1f}s  span {span:8.1f}s  {rate:8.1f} {self.unit}/s"
+        )
+
+
+@dataclass
+class _PreparedPdf:
+    """Chunks of one page window of a PDF, ready for embedding and upsert."""
+
+    name: str
+    pdf_hash: str
+    texts: list[str]
+    metadatas: list[dict[str, Any]]
+    ids: list[str]
+    spans: list[list[int]]
+    partition_s: tuple[float, float]
+    chunk_s: tuple[float, float]
+    partitions: PartitionReport
+    window: int = 0
+    final: bool = True  # last window of the file
+
+
+@dataclass
+class _Window:
+    """Pages (0-based) partitioned and chunked together."""
+
+    pages: list[int]
+    prefix: str  # chunk id prefix of the page run the window belongs to
+    starts_run: bool
+    ends_run: bool
+    whole_file: bool  # the runs cover every page (a full ingest)
+
+
+def _plan_windows(pdf_path: Path, pdf_hash: str, pages: list[int] | None, window_pages: int | None) -> list[_Window]:
+    """Split a full ingest, or each run of changed *pages*, into page windows."""
+    if pages is None:
+        with fitz.open(pdf_path) as doc:
+            runs = [(list(range(doc.page_count)), f"{pdf_hash}-")]
+    else:
+        runs = [(run, f"{pdf_hash}-p{run[0] + 1}-") for run in _page_runs(pages)]
+    windows: list[_Window] = []
+    for run, prefix in runs:
+        size = window_pages or len(run) or 1
+        for start in range(0, len(run), size):
+            windows.append(
+                _Window(run[start:start + size], prefix, start == 0, start + size >= len(run), pages is None)
+            )
+    return windows
+
+
+def _window_elements(
+    pdf_path: Path, pdf_hash: str, cfg: dict[str, Any], window: _Window, first: bool, last: bool,
+    report: PartitionReport,
+) -> List[Element]:
+    """Elements of *window*, from the partition cache or freshly partitioned.
+
+    A full ingest also builds the cache entry window by window.
+    """
+    if not window.whole_file:
+        return _partition_pages(pdf_path, window.pages, cfg, pdf_hash, report)
+    cache = open_partition_cache(cfg, ROOT_DIR)
+    strategy = _cache_strategy(cfg)
+    if cache is not None and cache.has(pdf_hash, strategy):
+        return _partition_pages(pdf_path, window.pages, cfg, pdf_hash, report)
+    elements = _partition(pdf_path, cfg, window.pages, report)
+    if cache is not None:
+        cache.store_pages(
+            pdf_hash, strategy, elements, first=first, last=last,
+            writer=pdf_path.name, default_page=window.pages[0] + 1,
+        )
+    return elements
+
+
+def _hold_back(chunks: list[Element], elements: list[Element]) -> tuple[list[Element], list[Element]]:
+    """Split off the last chunk of a window, which may continue in the next one.
+
+    Returns the finished chunks and the elements to carry over: everything
+    from the first element of the last chunk on.  ``chunk_by_title`` only
+    looks forward, so re-chunking those elements together with the next
+    window gives the chunks a single pass over the whole file would.
+    """
+    position = {id(el): i for i, el in enumerate(elements)}
+
+    def indices(chunk: Element) -> list[int]:
+        return [position[id(el)] for el in chunk.metadata.orig_elements or [] if id(el) in position]
+
+    cut = min(indices(chunks[-1]), default=len(elements))
+    done = [chunk for chunk in chunks if max(indices(chunk), default=0) < cut]
+    return done, elements[cut:]
+
+
+@dataclass
+class _RunState:
+    """What one window of a page run hands to the next."""
+
+    carry: list[Element] = field(default_factory=list)  # elements of the unfinished last chunk
+    next_id: int = 0  # next chunk number of the run
+    heading: str = ""  # last section heading seen, for chunks without one
+
+
+def _headings(chunk: Element) -> list[str]:
+    return [el.text for el in chunk.metadata.orig_elements or [] if getattr(el, "category", None) == "Title"]
+
+
+def _prepare_window(
+    pdf_path: Path,
+    pdf_hash: str,
+    cfg: dict[str, Any],
+    window: _Window,
+    index: int,
+    final: bool,
+    state: _RunState,
+) -> tuple[_PreparedPdf, _RunState]:
+    """Partition and chunk one page window of a PDF (runs inside a worker process).
+
+    *state* comes from the previous window of the same run.  Each run of
+    consecutive pages is chunked on its own so no chunk bridges a gap of
+    unchanged pages.  Returns the prepared chunks and the state for the
+    next window.
+    """
+    t0 = time.time()
+    report = PartitionReport()
+    if window.starts_run:
+        state = _RunState()
+    elements = state.carry + _window_elements(pdf_path, pdf_hash, cfg, window, index == 0, final, report)
+    t1 = time.time()
+
+    chunks = chunk_elements(elements, cfg) if elements else []
+    carry: list[Element] = []
+    if chunks and not window.ends_run:
+        chunks, carry = _hold_back(chunks, elements)
+    next_id, heading = state.next_id, state.heading
+
+    texts: list[str] = []
+    metadatas: list[dict[str, Any]] = []
+    ids: list[str] = []
+    spans: list[list[int]] = []
+    hl_cfg = {**DEFAULT_HIGHLIGHT_CFG, **cfg.get("highlights", {})}
+    fam_cfg = family_cfg(cfg)
+
+    for chunk in chunks:
+        texts.append(chunk.text)
+        meta = chunk.metadata.to_dict()
+        chunk_meta = {
+            "filename": meta.get("filename", pdf_path.name),
+            "page_number": meta.get("page_number"),
+            "pdf_hash": pdf_hash,
+        }
+        titles = _headings(chunk)
+        if fam_cfg["enabled"]:
+            chunk_meta["family"] = chunk_family(pdf_path.name, [heading, *titles], fam_cfg)
+        heading = titles[-1] if titles else heading
+        if hl_cfg["enabled"]:
+            chunk_meta["highlight"] = chunk_highlight(
+                chunk.text,
+                chunk_meta["page_number"],
+                [el.metadata.to_dict() for el in chunk.metadata.orig_elements or []],
+                hl_cfg,
+            )
+        metadatas.append(chunk_meta)
+        ids.append(f"{window.prefix}{next_id}")
+        spans.append(_chunk_span(chunk))
+        next_id += 1
+
+    prepared = _PreparedPdf(
+        pdf_path.name, pdf_hash, texts, metadatas, ids, spans, (t0, t1), (t1, time.time()), report, index, final
+    )
+    return prepared, _RunState(carry, next_id, heading)
+
+
+@dataclass
+class _FileProgress:
+    """Windows of one file upserted so far; the file is finalised after the last."""
+
+    ids: list[str]
+    spans: list[list[int]]
+    added: int = 0
+    done: int = 0
+    total: int | None = None
+
+
+def _sync_lexical(lexical: LexicalIndex, collection, manifest: IngestionManifest) -> tuple[int, int]:
+    """Make *lexical* hold exactly the chunks listed in *manifest*.
+
+    Chunks the index has never seen (ingested before it existed, or while a
+    previous run crashed before saving) are read back from the vector store.
+    Returns ``(added, removed)``.
+    """
+    expected = {cid for entry in manifest.entries.values() for cid in entry.chunks}
+    present = lexical.ids()
+    stale = present - expected
+    lexical.delete(stale)
+    missing = sorted(expected - present)
+    for start in range(0, len(missing), 500):
+        res = collection.get(ids=missing[start:start + 500], include=["documents", "metadatas"])
+        lexical.upsert(res["ids"], res["documents"], res["metadatas"])
+    return len(missing), len(stale)
+
+
+def _timed_hash(pdf_path: Path) -> tuple[str, list[str], float, float]:
+    t0 = time.time()
+    return _compute_hash(pdf_path), page_hashes(pdf_path), t0, time.time()
+
+
+def _restamp(collection, ids: list[str], pdf_hash: str) -> None:
+    """Point retained chunks of an updated file at its new ``pdf_hash``."""
+    if not ids:
+        return
+    res = collection.get(ids=ids, include=["metadatas"])
+    metadatas = [{**(meta or {}), "pdf_hash": pdf_hash} for meta in res["metadatas"]]
+    collection.update(ids=res["ids"], metadatas=metadatas)
+
+
+@dataclass
+class _PipelineResult:
+    """What one :func:`_run_pipeline` call did, for callers and benchmarks."""
+
+    total_chunks: int
+    stages: dict[str, _StageStats]
+    timings: Timings
+    embedding: SchedulerStats
+    partitions: PartitionReport
+
+
+async def _run_pipeline(
+    pdf_files: list[Path], collection: VectorStore, embeddings: Any, cfg: dict[str, Any]
+) -> _PipelineResult:
+    """Hash → plan → partition/chunk (process pool) → embed/upsert (async), overlapped.
+
+    The plan compares per-page hashes with the ingestion manifest (see
+    ``backend/ingestion/manifest.py``): unchanged files are skipped, changed
+    files only have their changed pages re-partitioned, and chunks of
+    replaced pages, superseded versions (if enabled), duplicate copies and
+    removed files are deleted once their replacements are written.
+
+    Each PDF is partitioned, chunked and upserted ``window_pages`` pages at
+    a time, so memory is bounded by the window rather than the document; a
+    file's old chunks are retired and its manifest entry written once its
+    last window has landed.  At most ``partition_workers + queue_size``
+    windows are prepared ahead of the upsert stage; once the bounded queue
+    is full the producers wait until the consumers catch up.
+    """
+    p_cfg = cfg.get("pipeline", {})
+    inc_cfg = {**_DEFAULT_CFG["incremental"], **cfg.get("incremental", {})}
+    partition_workers = p_cfg.get("partition_workers") or os.cpu_count() or 1
+    window_pages = p_cfg.get("window_pages", _DEFAULT_CFG["pipeline"]["window_pages"])
+    upsert_workers = max(1, p_cfg.get("upsert_workers", 2))
+    queue: asyncio.Queue[_PreparedPdf | None] = asyncio.Queue(maxsize=max(1, p_cfg.get("queue_size", 4)))
+
+    stats = {
+        name: _StageStats(name, unit)
+        for name, unit in (("hash", "pdfs"), ("partition", "pdfs"), ("chunk", "chunks"), ("upsert", "chunks"))
+    }
+    # Sequential phases; the overlapped per-PDF stages are in `stats`.
+    timings = Timings()
+    partitions = PartitionReport()
+    loop = asyncio.get_running_loop()
+    total_chunks = 0
+    target = target_name(cfg)
+    manifest = IngestionManifest(ROOT_DIR / inc_cfg["manifest_path"].format(target=target))
+    plans: dict[str, FilePlan] = {}
+    in_flight: dict[str, _FileProgress] = {}
+    sched_cfg = dict(cfg.get("embedding_scheduler") or {})
+    if sched_cfg.get("checkpoint_path"):
+        sched_cfg["checkpoint_path"] = sched_cfg["checkpoint_path"].format(target=target)
+    scheduler = EmbeddingScheduler(embeddings, sched_cfg, root=ROOT_DIR)
+    upsert = chroma_upsert(collection)
+    lexical = None if inc_cfg["dry_run"] else open_lexical_index(cfg)
+
+    async def produce(pool: ProcessPoolExecutor) -> None:
+        plan_started = time.perf_counter()
+        hashes = await asyncio.gather(*(loop.run_in_executor(pool, _timed_hash, p) for p in pdf_files))
+        files: dict[str, tuple[str, list[str]]] = {}
+        for pdf_path, (pdf_hash, pages, t0, t1) in zip(pdf_files, hashes):
+            stats["hash"].record(t0, t1)
+            files[pdf_path.name] = (pdf_hash, pages)
+            if pdf_path.name not in manifest.entries and not scheduler.checkpoint.is_incomplete(pdf_hash):
+                # Ingested before the manifest existed: adopt the stored chunks.
+                existing = await asyncio.to_thread(_existing_chunks, collection, pdf_hash, pdf_path.name)
+                if existing:
+                    manifest.entries[pdf_path.name] = FileEntry(pdf_path.name, pdf_hash, pages, existing)
+
+        plan = plan_folder(
+            files,
+            manifest,
+            max_changed_page_ratio=inc_cfg["max_changed_page_ratio"],
+            supersede=inc_cfg["supersede_versions"],
+        )
+        timings.add("plan", time.perf_counter() - plan_started)
+        print(plan.report())
+        if inc_cfg["dry_run"]:
+            return
+        plans.update((fp.filename, fp) for fp in plan.files)
+
+        todo: list[tuple[Path, FilePlan]] = []
+        for pdf_path in pdf_files:
+            fp = plans[pdf_path.name]
+            if fp.action in ("add", "update"):
+                if scheduler.checkpoint.is_incomplete(fp.pdf_hash):
+                    print(f"[preprocess] Resuming {pdf_path.name} from checkpoint")
+                todo.append((pdf_path, fp))
+
+        slots = asyncio.Semaphore(partition_workers)
+
+        async def prepare_file(pdf_path: Path, fp: FilePlan) -> None:
+            # Windows of one file run in order (each carries its last chunk
+            # into the next); different files run in parallel.
+            async with slots:
+                windows = await asyncio.to_thread(_plan_windows, pdf_path, fp.pdf_hash, fp.pages, window_pages)
+                state = _RunState()
+                for index, window in enumerate(windows):
+                    final = index == len(windows) - 1
+                    prepared, state = await loop.run_in_executor(
+                        pool, _prepare_window, pdf_path, fp.pdf_hash, cfg, window, index, final, state
+                    )
+                    stats["partition"].record(*prepared.partition_s, items=int(final))
+                    stats["chunk"].record(*prepared.chunk_s, items=len(prepared.texts))
+                    partitions.merge(prepared.partitions)
+                    # Queued even when empty so stale chunks still get deleted.
+                    await queue.put(prepared)  # blocks while the queue is full
+
+        await asyncio.gather(*(prepare_file(pdf_path, fp) for pdf_path, fp in todo))
+
+    async def finish_file(name: str, pdf_hash: str, progress: _FileProgress) -> None:
+        nonlocal total_chunks
+        fp = plans[name]
+        if not progress.ids:
+            print(f"[preprocess] Warning: No chunks found for {name}")
+        scheduler.checkpoint.mark_finished(pdf_hash)
+        # New chunks are in place: only now retire the ones they replace.
+        with timings.span("retire"):
+            await asyncio.to_thread(_restamp, collection, fp.keep_ids, fp.pdf_hash)
+            if fp.delete_ids:
+                await asyncio.to_thread(collection.delete, ids=fp.delete_ids)
+        if lexical is not None:
+            lexical.update(fp.keep_ids, [{"pdf_hash": fp.pdf_hash}] * len(fp.keep_ids))
+            lexical.delete(fp.delete_ids)
+        previous = manifest.entries.get(name)
+        chunks = {cid: previous.chunks[cid] for cid in fp.keep_ids} if previous else {}
+        chunks.update(zip(progress.ids, progress.spans))
+        manifest.entries[name] = FileEntry(name, pdf_hash, fp.page_hashes, chunks)
+        manifest.save()
+        total_chunks += progress.added
+        print(
+            f"[preprocess] Added {progress.added} chunks from {name}"
+            f" (kept {len(fp.keep_ids)}, deleted {len(fp.delete_ids)})"
+        )
+
+    async def consume() -> None:
+        while (prepared := await queue.get()) is not None:
+            t0 = time.time()
+            added = await scheduler.run(
+                prepared.pdf_hash, prepared.texts, prepared.metadatas, prepared.ids, upsert, finish=False
+            )
+            stats["upsert"].record(t0, time.time(), items=added)
+            if lexical is not None:
+                lexical.upsert(prepared.ids, prepared.texts, prepared.metadatas)
+            progress = in_flight.setdefault(prepared.name, _FileProgress([], []))
+            progress.ids += prepared.ids
+            progress.spans += prepared.spans
+            progress.added += added
+            progress.done += 1
+            if prepared.final:
+                progress.total = prepared.window + 1
+            # Windows may finish out of order across consumers.
+            if progress.done == progress.total:
+                del in_flight[prepared.name]
+                await finish_file(prepared.name, prepared.pdf_hash, progress)
+
+    print(
+        f"[preprocess] Pipeline: {partition_workers} partition workers, "
+        f"{upsert_workers} upsert workers, queue size {queue.maxsize}"
+    )
+    started = time.time()
+    with ProcessPoolExecutor(max_workers=partition_workers) as pool:
+        # A failing stage cancels the others: nobody is left blocked on the
+        # bounded queue, and the first error is raised as is.
+        try:
+            async with asyncio.TaskGroup() as group:
+                for _ in range(upsert_workers):
+                    group.create_task(consume())
+
+                async def feed() -> None:
+                    await produce(pool)
+                    for _ in range(upsert_workers):
+                        await queue.put(None)
+
+                group.create_task(feed())
+        except BaseExceptionGroup as failed:
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise failed.exceptions[0]
+        finally:
+            scheduler.close()
+
+    # Removed, superseded and duplicate files go last, after their
+    # replacements landed.
+    for fp in plans.values():
+        if fp.action not in ("delete", "duplicate"):
+            continue
+        if fp.delete_ids:
+            with timings.span("retire"):
+                await asyncio.to_thread(collection.delete, ids=fp.delete_ids)
+            if lexical is not None:
+                lexical.delete(fp.delete_ids)
+        if manifest.entries.pop(fp.filename, None) is not None or fp.delete_ids:
+            print(f"[preprocess] Deleted {len(fp.delete_ids)} chunks of {fp.filename} ({fp.reason})")
+        manifest.save()
+
+    if inc_cfg["dry_run"]:
+        print("[preprocess] Dry run: nothing was written")
+        return _PipelineResult(0, stats, timings, scheduler.stats, partitions)
+    if lexical is not None:
+        with timings.span("lexical"):
+            added, removed = await asyncio.to_thread(_sync_lexical, lexical, collection, manifest)
+            await asyncio.to_thread(lexical.save)
+        print(
+            f"[preprocess] Lexical index: {len(lexical)} chunks"
+            f" ({added} backfilled from the vector store, {removed} stale removed)"
+        )
+    # Tells the retrieval answer cache that the corpus changed.
+    write_corpus_version(cfg, corpus_fingerprint(entry.pdf_hash for entry in manifest.entries.values()))
+    print(f"[preprocess] Embedding: {scheduler.stats.summary()}")
+    print(f"[preprocess] Stage summary (wall {time.time() - started:.1f}s)")
+    for stage in stats.values():
+        print(stage.summary())
+    print(f"  {'phases':<10} " + "  ".join(f"{name} {ms / 1000:.1f}s" for name, ms in timings.as_ms().items()))
+    adaptive = cfg["partition_strategy"] == "adaptive"
+    print(f"  {'pages':<10} " + partitions.summary(_adaptive_cfg(cfg) if adaptive else None))
+    observe("ingest", timings)
+    return _PipelineResult(total_chunks, stats, timings, scheduler.stats, partitions)
+
+
+def process_folder(
+    folder: Path, cfg: dict[str, Any], *, dry_run: bool | None = None, supersede: bool | None = None
+) -> None:
+    overrides = {"dry_run": dry_run, "supersede_versions": supersede}
+    overrides = {k: v for k, v in overrides.items() if v is not None}
+    if overrides:
+        cfg = {**cfg, "incremental": {**cfg.get("incremental", {}), **overrides}}
     pdf_files = sorted(folder.glob("*.pdf"))
     if not pdf_files:
         print(f"[preprocess] No PDF files found in {folder}")
@@ -77,77 +757,64 @@ def process_folder(folder: Path, cfg: dict[str, Any]) -> None:
 
     print(f"[preprocess] Found {len(pdf_files)} PDF files")
 
-    chroma_host = os.getenv("CHROMA_HOST", "localhost")
-    chroma_port = int(os.getenv("CHROMA_PORT", "8000"))
-
-    print(f"[preprocess] Connecting to ChromaDB at {chroma_host}:{chroma_port}")
-    client = chromadb.HttpClient(host=chroma_host, port=chroma_port)
-
-    chroma_cfg = cfg.get("chroma", {})
-    embedding_model: str = chroma_cfg["embedding_model"]
-    collection_name: str = chroma_cfg["collection_name"]
+    store_cfg = {**DEFAULT_VECTOR_STORE_CFG, **cfg.get("vector_store", {})}
+    if store_cfg["backend"] == "local":
+        print(f"[preprocess] Writing embedded vector index at {ROOT_DIR / store_cfg['path']}")
+    else:
+        print(
+            f"[preprocess] Connecting to ChromaDB at "
+            f"{os.getenv('CHROMA_HOST', 'localhost')}:{os.getenv('CHROMA_PORT', '8000')}"
+        )
+    collection = open_vector_store(cfg, read_only=False)
 
     embeddings = OpenAIEmbeddings(
-        model=embedding_model,
+        model=cfg.get("chroma", {})["embedding_model"],
         api_key=os.getenv("OPENAI_API_KEY"),
+        max_retries=0,  # retries are handled by EmbeddingScheduler
     )
 
-    vectordb = Chroma(
-        client=client,
-        collection_name=collection_name,
-        embedding_function=embeddings
-    )
-
-    total_chunks = 0
+    total_chunks = asyncio.run(_run_pipeline(pdf_files, collection, embeddings, cfg)).total_chunks
 
-    def _compute_hash(path: Path) -> str:
-        sha = hashlib.sha256()
-        with path.open("rb") as fh:
-            for chunk in iter(lambda: fh.read(8192), b""):
-                sha.update(chunk)
-        return sha.hexdigest()
+    print(f"[preprocess] COMPLETED: Added {total_chunks} total chunks to the {store_cfg['backend']} vector store")
 
-    def _pdf_embedding_exists(collection, pdf_hash: str) -> bool:
-        try:
-            res = collection.get(where={"pdf_hash": pdf_hash}, limit=1, include=["metadatas"])
-            return bool(res and res.get("ids"))
-        except Exception:
-            return False
+def _warm_one(pdf_path: Path, cfg: dict[str, Any]) -> tuple[str, PartitionReport, float]:
+    """Partition *pdf_path* into the cache unless it is there already (worker process)."""
+    t0 = time.time()
+    pdf_hash = _compute_hash(pdf_path)
+    report = PartitionReport()
+    if not open_partition_cache(cfg, ROOT_DIR).has(pdf_hash, _cache_strategy(cfg)):
+        preprocess_pdf(pdf_path, cfg, pdf_hash, report)
+    return pdf_path.name, report, time.time() - t0
 
-    for pdf_path in tqdm(pdf_files, desc="Processing PDFs", unit="pdf"):
-        pdf_hash = _compute_hash(pdf_path)
 
-        if _pdf_embedding_exists(vectordb._collection, pdf_hash):
-            print(f"[preprocess] Skipping {pdf_path.name} - already processed")
-            continue
-
-        elements = preprocess_pdf(pdf_path, cfg)
-        chunks = chunk_elements(elements, cfg)
-        if not chunks:
-            print(f"[preprocess] Warning: No chunks found for {pdf_path}")
-            continue
+def warm_partition_cache(folder: Path, cfg: dict[str, Any]) -> None:
+    """Partition every PDF in *folder* into the partition cache, in parallel.
 
-        texts: list[str] = []
-        metadatas: list[dict[str, Any]] = []
-        ids: list[str] = []
-
-        for idx, chunk in enumerate(chunks):
-            texts.append(chunk.text)
-            meta = chunk.metadata.to_dict()
-            metadatas.append(
-                {
-                    "filename": meta.get("filename", pdf_path.name),
-                    "page_number": meta.get("page_number"),
-                    "pdf_hash": pdf_hash,
-                }
-            )
-            ids.append(f"{pdf_hash}-{idx}")
-
-        vectordb.add_texts(texts=texts, metadatas=metadatas, ids=ids)
-        total_chunks += len(texts)
-        print(f"[preprocess] Added {len(texts)} chunks from {pdf_path.name}")
+    Nothing is embedded or written to the vector store; a later ingestion
+    run (or a partial re-ingest of a few changed pages) reads the cache.
+    """
+    cfg = {**cfg, "partition_cache": {**DEFAULT_PARTITION_CACHE_CFG, **cfg.get("partition_cache", {}), "enabled": True}}
+    pdf_files = sorted(folder.glob("*.pdf"))
+    workers = cfg.get("pipeline", {}).get("partition_workers") or os.cpu_count() or 1
+    print(f"[preprocess] Warming the partition cache: {len(pdf_files)} PDFs, {workers} workers")
+    started = time.time()
+    partitioned = 0
+    partitions = PartitionReport()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for name, report, seconds in pool.map(_warm_one, pdf_files, [cfg] * len(pdf_files)):
+            fresh = bool(report.pages)
+            partitioned += fresh
+            partitions.merge(report)
+            print(f"[preprocess] {'Partitioned' if fresh else 'Already cached'}: {name} ({seconds:.1f}s)")
+    cache = open_partition_cache(cfg, ROOT_DIR)
+    print(
+        f"[preprocess] Warm-up done in {time.time() - started:.1f}s: {partitioned} partitioned,"
+        f" {len(pdf_files) - partitioned} already cached; cache size {cache.size() / 1e6:.1f} MB"
+    )
+    if partitioned:
+        adaptive = cfg["partition_strategy"] == "adaptive"
+        print(f"[preprocess] Pages: {partitions.summary(_adaptive_cfg(cfg) if adaptive else None)}")
 
-    print(f"[preprocess] COMPLETED: Added {total_chunks} total chunks to ChromaDB")
 
 def load_config(default_cfg: dict, config_path: str | None = None) -> dict:
     cfg = default_cfg.copy()
@@ -158,18 +825,29 @@ def load_config(default_cfg: dict, config_path: str | None = None) -> dict:
     return cfg
 
 def main() -> None:
-    """Run the pre-processing pipeline without relying on CLI arguments.
+    """Ingest a folder of PDFs, or only pre-partition it with ``--warm``.
 
-    Edit the *pdfs_dir* and *config_path* variables below to match your
-    environment.  The function can still be called programmatically from other
-    modules.
+    Relative paths are resolved against the project root, so the defaults
+    work both locally and in the container.
     """
-    pdfs_dir: Path = Path("/app/local/shrewsbury_policies")
-
-    config_path: str | None = None  # or a YAML file path
-
-    cfg = load_config(_DEFAULT_CFG, config_path)
-    process_folder(pdfs_dir, cfg)
+    parser = argparse.ArgumentParser(description="Partition, chunk and embed a folder of policy PDFs.")
+    parser.add_argument(
+        "folder", nargs="?", type=Path, default=Path(os.getenv("MEDDOC_PDF_DIR", "local/shrewsbury_policies"))
+    )
+    parser.add_argument("--config", default=None, help="YAML overrides of the default config")
+    parser.add_argument("--warm", action="store_true", help="only fill the partition cache, in parallel")
+    parser.add_argument("--dry-run", action="store_true", help="print the ingestion plan and stop")
+    parser.add_argument(
+        "--supersede", action="store_true", help='delete older "...-V<n>.pdf" versions of a document in the folder'
+    )
+    args = parser.parse_args()
+
+    cfg = load_config(_DEFAULT_CFG, args.config and str(ROOT_DIR / args.config))
+    folder = ROOT_DIR / args.folder
+    if args.warm:
+        warm_partition_cache(folder, cfg)
+    else:
+        process_folder(folder, cfg, dry_run=args.dry_run or None, supersede=args.supersede or None)
 
 if __name__ == "__main__":
     main()
@@ -1,14 +1,35 @@
-from fastapi import FastAPI
+import sys
+from contextlib import asynccontextmanager
+from typing import Any
+
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
 
 # Import routers
 from backend.api.chat import router as chat_router
 from backend.api.files import router as files_router
+from backend.utils.metrics import metrics_available, render_metrics
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Close the shared client registry on shutdown.
+
+    The registry (and the LLM / vector store stack behind it) is created by
+    the first chat request rather than here, so a serverless cold start that
+    only answers a health check or serves a PDF never imports it.
+    """
+    yield
+    resources = sys.modules.get("backend.retrieval.resources")
+    if resources is not None:
+        await resources.ashutdown_registry()
+
 
 app = FastAPI(
     title="MedDoc HR Assistant",
     description="AI chatbot for hospital HR queries",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 # ---------------------------------------------------------------------------
@@ -28,6 +49,9 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Let the frontend read the per-stage latency breakdown, and PDF.js
+    # see that /api/pdf answers byte-range requests, cross-origin.
+    expose_headers=["Server-Timing", "Accept-Ranges", "Content-Range", "Content-Length", "ETag"],
 )
 
 app.include_router(chat_router, prefix="/api")
@@ -37,4 +61,21 @@ app.include_router(files_router, prefix="/api")
 @app.get("/", tags=["health"])
 async def health() -> dict[str, str]:
     """Simple health-check endpoint."""
-    return {"status": "ok"} 
\ No newline at end of file
+    return {"status": "ok"}
+
+
+@app.get("/api/stats/pool", tags=["health"])
+async def pool_stats() -> dict[str, Any]:
+    """Connection-pool usage and recent request latency (p50/p99)."""
+    from backend.retrieval.resources import get_registry
+
+    return get_registry().stats()
+
+
+@app.get("/metrics", tags=["health"], include_in_schema=False)
+async def metrics() -> Response:
+    """Prometheus stage-latency histograms (``meddoc_stage_seconds`` et al.)."""
+    if not metrics_available():
+        raise HTTPException(status_code=501, detail="prometheus-client is not installed")
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
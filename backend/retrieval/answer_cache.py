@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+"""Semantic cache of generated answers.
+
+Most staff questions are paraphrases of a few hundred recurring ones, and the
+LLM call dominates both latency and cost.  :class:`AnswerCache` keeps a small
+in-memory vector index of previously answered, history-free questions and
+returns the stored answer (plus its sources) when a new question's embedding
+is within a cosine-similarity threshold of a cached one.
+
+Entries expire after a TTL, the index is bounded in size (least recently
+used entries go first), and everything is dropped as soon as the set of
+``pdf_hash`` values in the collection changes – i.e. when the policies were
+re-ingested.  The version is re-read in the background, from the marker
+ingestion writes (see ``backend/vectorstore/factory.py``), so no request
+waits for it.
+"""
+
+import asyncio
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Sequence, Set, Tuple
+
+import numpy as np
+
+from backend.vectorstore.factory import corpus_fingerprint
+
+__all__ = ["AnswerCache", "CachedAnswer", "corpus_version"]
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    answer: str
+    sources: List[Dict[str, Any]]
+    created_at: float = field(default_factory=time.time)
+    last_hit: float = field(default_factory=time.time)
+    hits: int = 0
+
+    @property
+    def age_s(self) -> float:
+        return time.time() - self.created_at
+
+
+def corpus_version(metadatas: Sequence[Dict[str, Any] | None]) -> str:
+    """Return a fingerprint of the distinct ``pdf_hash`` values in *metadatas*."""
+    return corpus_fingerprint(m["pdf_hash"] for m in metadatas if m and m.get("pdf_hash"))
+
+
+class AnswerCache:
+    """Cosine-similarity lookup over a bounded set of cached answers."""
+
+    def __init__(
+        self,
+        *,
+        similarity_threshold: float = 0.95,
+        ttl_s: float = 24 * 3600,
+        max_entries: int = 512,
+        version_check_interval_s: float = 60.0,
+    ) -> None:
+        self.similarity_threshold = similarity_threshold
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.version_check_interval_s = version_check_interval_s
+        self._lock = threading.Lock()
+        self._entries: List[CachedAnswer] = []
+        self._matrix = np.empty((0, 0), dtype=np.float32)
+        self._version: str | None = None
+        self._version_checked = 0.0
+        self._refreshes: Set[asyncio.Task] = set()
+        self._counts = {"hits": 0, "misses": 0, "invalidations": 0}
+
+    # ------------------------------------------------------------------
+    # Corpus version
+    # ------------------------------------------------------------------
+
+    def version_is_stale(self) -> bool:
+        return time.time() - self._version_checked >= self.version_check_interval_s
+
+    def set_version(self, version: str) -> None:
+        """Record the current corpus version, clearing the cache if it moved."""
+        with self._lock:
+            self._version_checked = time.time()
+            if version != self._version:
+                if self._version is not None:
+                    self._counts["invalidations"] += 1
+                self._version = version
+                self._entries = []
+                self._matrix = np.empty((0, 0), dtype=np.float32)
+
+    def refresh_version(self, read_version: Callable[[], Awaitable[str]]) -> None:
+        """Start re-reading the corpus version in the background if the check is due.
+
+        The caller does not wait: lookups keep using the current entries
+        until *read_version* returns, and a failed read is retried at the
+        next check.
+        """
+        with self._lock:
+            if not self.version_is_stale() or self._refreshes:
+                return
+            self._version_checked = time.time()
+        task = asyncio.get_running_loop().create_task(self._arefresh(read_version))
+        self._refreshes.add(task)
+        task.add_done_callback(self._refreshes.discard)
+
+    async def _arefresh(self, read_version: Callable[[], Awaitable[str]]) -> None:
+        try:
+            self.set_version(await read_version())
+        except Exception:  # noqa: BLE001 – best effort, retried at the next check
+            pass
+
+    # ------------------------------------------------------------------
+    # Lookups and inserts
+    # ------------------------------------------------------------------
+
+    def lookup(self, vector: Sequence[float]) -> Tuple[CachedAnswer, float] | None:
+        """Return ``(entry, similarity)`` for the closest live entry, if any."""
+        query = _unit(vector)
+        with self._lock:
+            self._expire()
+            if not self._entries or self._matrix.shape[1] != query.shape[0]:
+                self._counts["misses"] += 1
+                return None
+            sims = self._matrix @ query
+            best = int(np.argmax(sims))
+            similarity = float(sims[best])
+            if similarity < self.similarity_threshold:
+                self._counts["misses"] += 1
+                return None
+            entry = self._entries[best]
+            entry.hits += 1
+            entry.last_hit = time.time()
+            self._counts["hits"] += 1
+            return entry, similarity
+
+    def store(self, question: str, vector: Sequence[float], answer: str, sources: List[Dict[str, Any]]) -> None:
+        row = _unit(vector)
+        with self._lock:
+            if self._entries and self._matrix.shape[1] != row.shape[0]:
+                return
+            self._entries.append(CachedAnswer(question, answer, sources))
+            rows = [self._matrix] if len(self._matrix) else []
+            self._matrix = np.vstack(rows + [row[None, :]])
+            if len(self._entries) > self.max_entries:
+                self._evict(len(self._entries) - self.max_entries)
+
+    def _expire(self) -> None:
+        now = time.time()
+        keep = [i for i, e in enumerate(self._entries) if now - e.created_at < self.ttl_s]
+        if len(keep) != len(self._entries):
+            self._entries = [self._entries[i] for i in keep]
+            self._matrix = self._matrix[keep]
+
+    def _evict(self, count: int) -> None:
+        order = sorted(range(len(self._entries)), key=lambda i: self._entries[i].last_hit)
+        drop = set(order[:count])
+        keep = [i for i in range(len(self._entries)) if i not in drop]
+        self._entries = [self._entries[i] for i in keep]
+        self._matrix = self._matrix[keep]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self._counts)
+            counts["entries"] = len(self._entries)
+            counts["corpus_version"] = self._version
+        lookups = counts["hits"] + counts["misses"]
+        counts["hit_rate"] = round(counts["hits"] / lookups, 3) if lookups else 0.0
+        return counts
+
+
+def _unit(vector: Sequence[float]) -> np.ndarray:
+    arr = np.asarray(vector, dtype=np.float32)
+    norm = float(np.linalg.norm(arr))
+    return arr / norm if norm else arr
@@ -0,0 +1,276 @@
+from __future__ import annotations
+
+"""Token-budgeted packing of retrieved chunks and chat history.
+
+Ingestion chunks with a 200-character overlap, and the search stages
+often return two neighbouring chunks of the same page, so the naive prompt
+repeats that text and a ``Document: …, Page: …`` header per chunk.
+:func:`pack_context` merges chunks that are adjacent in the source (same
+file, same or next page, and either consecutive chunk ids or a shared
+overlap span), strips the duplicated span, then fits the result into a
+token budget shared with the conversation history:
+
+* history gets at most ``history_share`` of ``max_tokens``; the most
+  recent turns are kept and the oldest dropped first;
+* context gets the rest, filled with blocks in retrieval-rank order; a
+  block that does not fit is cut down if enough room remains, otherwise
+  skipped.
+
+The returned :class:`PackedContext` records the token count of the naive
+prompt sections as well, so the saving can be traced per request.
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Sequence
+
+from langchain.schema import Document
+
+from backend.utils.tokens import count_tokens, truncate_to_tokens
+
+__all__ = ["DEFAULT_CONTEXT_CFG", "ContextBlock", "PackedContext", "format_history", "pack_context"]
+
+DEFAULT_CONTEXT_CFG: Dict[str, Any] = {
+    "enabled": True,
+    # Budget for the context and history sections together (system prompt
+    # and question excluded).
+    "max_tokens": 4000,
+    "history_share": 0.3,
+    # Shortest suffix/prefix match treated as chunk overlap rather than
+    # coincidence.
+    "min_overlap_chars": 32,
+    # A block cut to fit must keep at least this many tokens, else skip it.
+    "min_block_tokens": 64,
+}
+
+_SEQ_RE = re.compile(r"^(.*)-(\d+)$")
+
+
+@dataclass
+class ContextBlock:
+    """One or more merged chunks of a single file, shown under one header."""
+
+    filename: str
+    first_page: Any
+    last_page: Any
+    text: str
+    chunk_ids: List[str | None] = field(default_factory=list)
+    # Best (lowest) retrieval rank among the merged chunks.
+    rank: int = 0
+
+    def render(self) -> str:
+        page = self.first_page
+        if self.last_page != self.first_page:
+            page = f"{self.first_page}-{self.last_page}"
+        return f"Document: {self.filename}, Page: {page}\nContent: {self.text}"
+
+
+@dataclass
+class PackedContext:
+    blocks: List[ContextBlock]
+    history: List[Dict[str, Any]]
+    context: str
+    history_text: str
+    # Tokens of the unpacked context + history, and of the packed ones.
+    tokens_in: int
+    tokens_out: int
+    chunks: int = 0
+    dropped_chunks: int = 0
+    dropped_turns: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return max(0, self.tokens_in - self.tokens_out)
+
+    def info(self) -> Dict[str, Any]:
+        return {
+            "chunks": self.chunks,
+            "blocks": len(self.blocks),
+            "dropped_chunks": self.dropped_chunks,
+            "dropped_turns": self.dropped_turns,
+            "tokens": self.tokens_out,
+        }
+
+
+def format_history(history: Sequence[Dict[str, Any]] | None) -> str:
+    """Format the message history into a readable context string."""
+    return "\n".join(_format_turn(msg) for msg in history or ())
+
+
+_ROLE_PREFIX = {"user": "User", "summary": "Summary of earlier conversation"}
+
+
+def _format_turn(msg: Dict[str, Any]) -> str:
+    prefix = _ROLE_PREFIX.get(msg.get("role", "user"), "Assistant")
+    return f"{prefix}: {msg.get('content', '')}"
+
+
+# ---------------------------------------------------------------------------
+# Merging
+# ---------------------------------------------------------------------------
+
+
+def _overlap(a: str, b: str, min_chars: int) -> int:
+    """Length of the longest suffix of *a* that is also a prefix of *b*."""
+    probe = b[:min_chars]
+    if len(probe) < min_chars:
+        return 0
+    start = a.find(probe, max(0, len(a) - len(b)))
+    while start != -1:
+        if b.startswith(a[start:]):
+            return len(a) - start
+        start = a.find(probe, start + 1)
+    return 0
+
+
+def _sequence(chunk_id: str | None) -> tuple[str, int] | None:
+    """Split ``{hash}-{idx}`` / ``{hash}-p{page}-{idx}`` ids into (prefix, idx)."""
+    match = _SEQ_RE.match(chunk_id or "")
+    return (match.group(1), int(match.group(2))) if match else None
+
+
+def _page(block: ContextBlock) -> int | None:
+    return block.last_page if isinstance(block.last_page, int) else None
+
+
+def _try_merge(a: ContextBlock, b: ContextBlock, min_chars: int) -> bool:
+    """Append *b* to *a* if it continues it in the source document."""
+    a_page, b_page = _page(a), b.first_page if isinstance(b.first_page, int) else None
+    if a_page is not None and b_page is not None and not 0 <= b_page - a_page <= 1:
+        return False
+    if b.text in a.text:
+        a.chunk_ids.extend(b.chunk_ids)
+        a.rank = min(a.rank, b.rank)
+        return True
+    cut = _overlap(a.text, b.text, min_chars)
+    if not cut:
+        seq_a, seq_b = _sequence(a.chunk_ids[-1]), _sequence(b.chunk_ids[0])
+        if not (seq_a and seq_b and seq_a[0] == seq_b[0] and seq_b[1] == seq_a[1] + 1):
+            return False
+    a.text = a.text + b.text[cut:] if cut else f"{a.text}\n{b.text}"
+    a.last_page = b.last_page if b.last_page is not None else a.last_page
+    a.chunk_ids.extend(b.chunk_ids)
+    a.rank = min(a.rank, b.rank)
+    return True
+
+
+def _merge(docs: Sequence[Document], min_chars: int) -> List[ContextBlock]:
+    by_file: Dict[str, List[ContextBlock]] = {}
+    for rank, doc in enumerate(docs):
+        page = doc.metadata.get("page_number", "unknown")
+        block = ContextBlock(
+            filename=doc.metadata.get("filename", "unknown"),
+            first_page=page,
+            last_page=page,
+            text=doc.page_content,
+            chunk_ids=[getattr(doc, "id", None)],
+            rank=rank,
+        )
+        by_file.setdefault(block.filename, []).append(block)
+
+    merged: List[ContextBlock] = []
+    for blocks in by_file.values():
+        blocks.sort(
+            key=lambda blk: (
+                _page(blk) if _page(blk) is not None else -1,
+                (_sequence(blk.chunk_ids[0]) or ("", blk.rank))[1],
+            )
+        )
+        current = blocks[0]
+        for block in blocks[1:]:
+            if not _try_merge(current, block, min_chars):
+                merged.append(current)
+                current = block
+        merged.append(current)
+    merged.sort(key=lambda blk: blk.rank)
+    return merged
+
+
+# ---------------------------------------------------------------------------
+# Budgeting
+# ---------------------------------------------------------------------------
+
+
+def _fit_history(history: Sequence[Dict[str, Any]], budget: int) -> tuple[List[Dict[str, Any]], int]:
+    """Keep the most recent turns that fit in *budget* tokens."""
+    kept: List[Dict[str, Any]] = []
+    used = 0
+    for msg in reversed(history):
+        cost = count_tokens(_format_turn(msg)) + 1
+        if used + cost > budget:
+            if not kept and budget > 0:
+                # The latest turn alone is over budget: keep its beginning.
+                content = truncate_to_tokens(str(msg.get("content", "")), budget)
+                kept.append({**msg, "content": content})
+                used = budget
+            break
+        kept.append(msg)
+        used += cost
+    kept.reverse()
+    return kept, used
+
+
+def pack_context(
+    docs: Sequence[Document], history: Sequence[Dict[str, Any]] | None, cfg: Dict[str, Any]
+) -> PackedContext:
+    """Merge, de-duplicate and budget *docs* and *history* for the prompt.
+
+    Parameters
+    ----------
+    docs: Sequence[Document]
+        Retrieved chunks, best first.
+    history: Sequence[dict] | None
+        ``{"role", "content"}`` turns, oldest first.
+    cfg: dict
+        A :data:`DEFAULT_CONTEXT_CFG`-shaped block.
+    """
+    history = list(history or [])
+    naive = [
+        ContextBlock(
+            d.metadata.get("filename", "unknown"),
+            d.metadata.get("page_number", "unknown"),
+            d.metadata.get("page_number", "unknown"),
+            d.page_content,
+        )
+        for d in docs
+    ]
+    naive_context = "\n\n".join(blk.render() for blk in naive)
+    naive_history = format_history(history)
+    tokens_in = count_tokens(naive_context) + (count_tokens(naive_history) if history else 0)
+    if not cfg.get("enabled", True):
+        return PackedContext(naive, history, naive_context, naive_history, tokens_in, tokens_in, len(docs))
+
+    max_tokens = int(cfg["max_tokens"])
+    kept_history, history_tokens = _fit_history(history, int(max_tokens * cfg["history_share"]))
+
+    # Unused history budget goes to the context.
+    remaining = max_tokens - history_tokens
+    blocks: List[ContextBlock] = []
+    dropped = 0
+    for block in _merge(docs, int(cfg["min_overlap_chars"])):
+        cost = count_tokens(block.render()) + 1
+        if cost <= remaining:
+            blocks.append(block)
+            remaining -= cost
+        elif remaining >= cfg["min_block_tokens"]:
+            header = count_tokens(block.render()) - count_tokens(block.text)
+            block.text = truncate_to_tokens(block.text, remaining - header - 1)
+            blocks.append(block)
+            remaining = 0
+        else:
+            dropped += len(block.chunk_ids)
+
+    context = "\n\n".join(blk.render() for blk in blocks)
+    history_text = format_history(kept_history)
+    tokens_out = count_tokens(context) + (count_tokens(history_text) if kept_history else 0)
+    return PackedContext(
+        blocks=blocks,
+        history=kept_history,
+        context=context,
+        history_text=history_text,
+        tokens_in=tokens_in,
+        tokens_out=tokens_out,
+        chunks=len(docs),
+        dropped_chunks=dropped,
+        dropped_turns=len(history) - len(kept_history),
+    )
@@ -0,0 +1,585 @@
+from __future__ import annotations
+
+"""Process-wide pool of long-lived clients for the retrieval path.
+
+Building an ``OpenAIEmbeddings`` instance, a ``chromadb.HttpClient`` and a
+chat model is cheap in CPU terms but each one opens its own HTTP connection
+pool, so creating them per request means every staff question pays for a new
+TCP/TLS handshake.  The :class:`ResourceRegistry` below builds them once per
+*configuration* and hands out the same objects to every caller.
+
+The registry is created in the FastAPI lifespan hook (see ``backend/main.py``)
+and closed on shutdown.  Scripts and notebooks that import
+:func:`backend.retrieval.retrieval.get_answer` directly get a lazily created
+registry instead, so nothing has to be wired up by hand.
+
+Async HTTP clients are bound to the event loop that opened their connections,
+so each bundle keeps one :class:`AsyncResources` per running loop.  Blocking
+callers are routed through a single long-lived "portal" loop owned by the
+registry (:meth:`ResourceRegistry.run_sync`) so they, too, reuse one pool.
+
+chromadb, LangChain and the OpenAI SDK are imported by the builders, not
+at module import, so processes that never build a bundle never load them.
+"""
+
+import asyncio
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+import weakref
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Awaitable, Deque, Dict, Tuple, TypeVar
+
+import httpx
+
+from backend import ROOT_DIR
+from backend.config import OPENAI_API_KEY, require_env
+from backend.retrieval.answer_cache import AnswerCache
+from backend.retrieval.sessions import SessionStore, open_session_store
+from backend.retrieval.trace_writer import TraceWriter
+from backend.utils.config_utils import load_config
+from backend.utils.embedding_cache import EmbeddingCache
+from backend.utils.timing import percentiles
+from backend.vectorstore import (
+    LexicalIndex, VectorStore, aopen_vector_store, collection_name, open_lexical_index, open_vector_store)
+
+if TYPE_CHECKING:
+    from langchain.vectorstores import Chroma
+    from langchain_openai import OpenAIEmbeddings
+
+__all__ = [
+    "AsyncResources",
+    "ResourceRegistry",
+    "RetrievalResources",
+    "ashutdown_registry",
+    "get_registry",
+    "install_registry",
+    "shutdown_registry",
+]
+
+T = TypeVar("T")
+
+# Number of recent request latencies kept for the p50/p99 statistics.
+_LATENCY_WINDOW = 1024
+
+
+@dataclass
+class AsyncResources:
+    """Async clients bound to one event loop."""
+
+    embeddings: OpenAIEmbeddings
+    chat_model: Any
+    collection: Any  # AsyncVectorStore: chromadb AsyncCollection or local index
+    http_client: httpx.AsyncClient
+
+    async def aclose(self) -> None:
+        await self.http_client.aclose()
+
+
+@dataclass
+class RetrievalResources:
+    """Everything needed to answer a question for one configuration."""
+
+    key: str
+    cfg: Dict[str, Any]
+    embeddings: OpenAIEmbeddings
+    store: VectorStore
+    vectordb: Chroma | None  # LangChain wrapper; only for the Chroma backend
+    chat_model: Any
+    http_client: httpx.Client
+    created_at: float = field(default_factory=time.time)
+    uses: int = 0
+    _loop_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncResources]" = field(
+        default_factory=weakref.WeakKeyDictionary, repr=False
+    )
+
+    async def async_clients(self) -> AsyncResources:
+        """Return the async clients for the running loop, creating them once."""
+        loop = asyncio.get_running_loop()
+        clients = self._loop_clients.get(loop)
+        if clients is None:
+            built = await _build_async_resources(self.cfg, self.store)
+            # Two first requests on the same loop may race; keep the winner.
+            clients = self._loop_clients.setdefault(loop, built)
+            if clients is not built:
+                await built.aclose()
+        return clients
+
+    async def aclose(self) -> None:
+        """Close the async clients bound to the running loop."""
+        clients = self._loop_clients.pop(asyncio.get_running_loop(), None)
+        if clients is not None:
+            await clients.aclose()
+
+    def close(self) -> None:
+        """Release the pooled HTTP connections held by this bundle.
+
+        Async clients living on another running loop (e.g. the portal) are
+        closed on that loop; clients of loops that are already gone are
+        simply dropped.
+        """
+        self.http_client.close()
+        for loop, clients in list(self._loop_clients.items()):
+            if loop.is_running() and not _is_current_loop(loop):
+                future = asyncio.run_coroutine_threadsafe(clients.aclose(), loop)
+                try:
+                    future.result(timeout=5)
+                except Exception:  # noqa: BLE001
+                    pass
+        self._loop_clients.clear()
+
+
+def _is_current_loop(loop: asyncio.AbstractEventLoop) -> bool:
+    try:
+        return asyncio.get_running_loop() is loop
+    except RuntimeError:
+        return False
+
+
+def _resource_key(cfg: Dict[str, Any]) -> str:
+    """Return a stable key for the parts of *cfg* that shape the clients."""
+    relevant = {
+        "embedding_model": cfg["embedding_model"],
+        "llm": cfg["llm"],
+        "chroma": cfg.get("chroma", {}),
+        "vector_store": cfg.get("vector_store", {}),
+        "lexical_index": cfg.get("lexical_index", {}),
+        "http_pool": cfg.get("http_pool", {}),
+        "chroma_host": os.getenv("CHROMA_HOST", "localhost"),
+        "chroma_port": os.getenv("CHROMA_PORT", "8000"),
+    }
+    blob = json.dumps(relevant, sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()[:16]
+
+
+def _http_limits(cfg: Dict[str, Any]) -> Tuple[httpx.Limits, float]:
+    pool_cfg = cfg.get("http_pool", {})
+    limits = httpx.Limits(
+        max_connections=pool_cfg.get("max_connections", 20),
+        max_keepalive_connections=pool_cfg.get("max_keepalive_connections", 10),
+        keepalive_expiry=pool_cfg.get("keepalive_expiry", 60.0),
+    )
+    return limits, pool_cfg.get("timeout", 60.0)
+
+
+def _build_http_client(cfg: Dict[str, Any]) -> httpx.Client:
+    """Create a keep-alive HTTP client shared by the embedding and chat model."""
+    limits, timeout = _http_limits(cfg)
+    return httpx.Client(limits=limits, timeout=timeout)
+
+
+async def _build_async_resources(cfg: Dict[str, Any], store: VectorStore) -> AsyncResources:
+    from langchain.chat_models import init_chat_model
+    from langchain_openai import OpenAIEmbeddings
+
+    api_key = require_env("OPENAI_API_KEY", OPENAI_API_KEY)
+    limits, timeout = _http_limits(cfg)
+    http_client = httpx.AsyncClient(limits=limits, timeout=timeout)
+
+    embeddings = OpenAIEmbeddings(
+        model=cfg["embedding_model"],
+        openai_api_key=api_key,
+        http_async_client=http_client,
+        # Questions are far below the context limit: skip client-side tokenising.
+        check_embedding_ctx_length=False,
+    )
+    chat_model = init_chat_model(
+        cfg["llm"]["model"],
+        model_provider="openai",
+        api_key=api_key,
+        http_async_client=http_client,
+    )
+
+    collection = await aopen_vector_store(cfg, store)
+
+    return AsyncResources(
+        embeddings=embeddings,
+        chat_model=chat_model,
+        collection=collection,
+        http_client=http_client,
+    )
+
+
+def _build_resources(key: str, cfg: Dict[str, Any]) -> RetrievalResources:
+    from langchain.chat_models import init_chat_model
+    from langchain_openai import OpenAIEmbeddings
+
+    api_key = require_env("OPENAI_API_KEY", OPENAI_API_KEY)
+    http_client = _build_http_client(cfg)
+
+    embeddings = OpenAIEmbeddings(
+        model=cfg["embedding_model"],
+        openai_api_key=api_key,
+        http_client=http_client,
+        check_embedding_ctx_length=False,
+    )
+
+    vectordb = None
+    store_cfg = cfg.get("vector_store", {})
+    if store_cfg.get("backend", "chroma") != "chroma" or store_cfg.get("shard_by_family"):
+        # Embedded index or per-family shards: opened read-only and shared
+        # by every request.
+        store = open_vector_store(cfg, read_only=True)
+    else:
+        import chromadb
+        from langchain.vectorstores import Chroma
+
+        vectordb = Chroma(
+            client=chromadb.HttpClient(
+                host=os.getenv("CHROMA_HOST", "localhost"),
+                port=int(os.getenv("CHROMA_PORT", "8000")),
+            ),
+            collection_name=collection_name(cfg),
+            embedding_function=embeddings,
+        )
+        store = vectordb._collection
+
+    chat_model = init_chat_model(
+        cfg["llm"]["model"],
+        model_provider="openai",
+        api_key=api_key,
+        http_client=http_client,
+    )
+
+    return RetrievalResources(
+        key=key,
+        cfg=cfg,
+        embeddings=embeddings,
+        store=store,
+        vectordb=vectordb,
+        chat_model=chat_model,
+        http_client=http_client,
+    )
+
+
+class ResourceRegistry:
+    """Thread-safe cache of :class:`RetrievalResources`, keyed by config.
+
+    Two requests using the same configuration share one bundle; a request
+    with a different YAML override (other embedding model, LLM, Chroma
+    collection…) gets its own bundle, built on first use.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._bundles: Dict[str, RetrievalResources] = {}
+        self._embedding_caches: Dict[str, EmbeddingCache] = {}
+        self._answer_caches: Dict[str, AnswerCache] = {}
+        self._lexical: Dict[str, LexicalIndex | None] = {}
+        self._sessions: Dict[str, SessionStore] = {}
+        self._trace_writers: Dict[str, TraceWriter] = {}
+        self._configs: Dict[Tuple[str, int], Dict[str, Any]] = {}
+        self._latencies: Deque[float] = deque(maxlen=_LATENCY_WINDOW)
+        self._requests = 0
+        self._closed = False
+        self._portal: Tuple[asyncio.AbstractEventLoop, threading.Thread] | None = None
+
+    # ------------------------------------------------------------------
+    # Configuration
+    # ------------------------------------------------------------------
+
+    def config(self, defaults: Dict[str, Any], path: str | Path | None = None) -> Dict[str, Any]:
+        """Return the merged config, re-reading the YAML only when it changes.
+
+        The returned dict is shared between callers and must be treated as
+        read-only.
+        """
+        mtime = Path(path).expanduser().stat().st_mtime_ns if path else 0
+        cache_key = (f"{id(defaults)}:{path or ''}", mtime)
+        with self._lock:
+            cfg = self._configs.get(cache_key)
+            if cfg is None:
+                cfg = load_config(copy.deepcopy(defaults), path)
+                self._configs[cache_key] = cfg
+            return cfg
+
+    # ------------------------------------------------------------------
+    # Resources
+    # ------------------------------------------------------------------
+
+    def _cached_bundle(self, key: str) -> RetrievalResources | None:
+        with self._lock:
+            self._check_open()
+            bundle = self._bundles.get(key)
+            if bundle is not None:
+                bundle.uses += 1
+            return bundle
+
+    def resources(self, cfg: Dict[str, Any]) -> RetrievalResources:
+        """Return the shared bundle for *cfg*, building it on first use.
+
+        The build (HTTP clients, opening the vector store) runs outside the
+        registry lock, so a slow Chroma server only holds up the requests
+        that need this bundle.  Two concurrent first uses may both build;
+        the first to finish is kept and the other closed.
+        """
+        key = _resource_key(cfg)
+        bundle = self._cached_bundle(key)
+        if bundle is not None:
+            return bundle
+        built = self._build(key, cfg)
+        with self._lock:
+            if not self._closed:
+                bundle = self._bundles.setdefault(key, built)
+                bundle.uses += 1
+        if bundle is not built:
+            built.close()
+        self._check_open()  # shut down while building
+        return bundle
+
+    async def aresources(self, cfg: Dict[str, Any]) -> RetrievalResources:
+        """:meth:`resources` for the event loop: a first-use build runs in a worker thread."""
+        bundle = self._cached_bundle(_resource_key(cfg))
+        if bundle is not None:
+            return bundle
+        return await asyncio.to_thread(self.resources, cfg)
+
+    def embedding_cache(self, cfg: Dict[str, Any]) -> EmbeddingCache | None:
+        """Return the shared query-embedding cache, or ``None`` if disabled."""
+        cache_cfg = cfg.get("embedding_cache", {})
+        if not cache_cfg.get("enabled", False):
+            return None
+        path = cache_cfg.get("path")
+        key = str(ROOT_DIR / path) if path else ":memory:"
+        with self._lock:
+            cache = self._embedding_caches.get(key)
+            if cache is None:
+                cache = EmbeddingCache(
+                    ROOT_DIR / path if path else None,
+                    max_entries=cache_cfg.get("max_entries", 2048),
+                )
+                self._embedding_caches[key] = cache
+            return cache
+
+    def answer_cache(self, cfg: Dict[str, Any]) -> AnswerCache | None:
+        """Return the semantic answer cache for *cfg*, or ``None`` if disabled.
+
+        One cache exists per resource key, so answers are never shared across
+        collections or embedding models.
+        """
+        cache_cfg = cfg.get("answer_cache", {})
+        if not cache_cfg.get("enabled", False):
+            return None
+        key = _resource_key(cfg)
+        with self._lock:
+            cache = self._answer_caches.get(key)
+            if cache is None:
+                cache = AnswerCache(
+                    similarity_threshold=cache_cfg.get("similarity_threshold", 0.95),
+                    ttl_s=cache_cfg.get("ttl_s", 24 * 3600),
+                    max_entries=cache_cfg.get("max_entries", 512),
+                    version_check_interval_s=cache_cfg.get("version_check_interval_s", 60.0),
+                )
+                self._answer_caches[key] = cache
+            return cache
+
+    def lexical_index(self, cfg: Dict[str, Any]) -> LexicalIndex | None:
+        """Return the shared BM25 index for *cfg*, or ``None`` if unavailable.
+
+        Must be called on the event loop: a due mtime check is started in
+        the background and a rewritten index is swapped in when it has
+        loaded.  Until the first ingestion has written one, retrieval falls
+        back to vector search.
+        """
+        key = _resource_key(cfg)
+        with self._lock:
+            if key not in self._lexical:
+                self._lexical[key] = open_lexical_index(cfg)
+            index = self._lexical[key]
+        if index is None:
+            return None
+        index.refresh_in_background()
+        return index if len(index) else None
+
+    def session_store(self, cfg: Dict[str, Any]) -> SessionStore:
+        """Return the conversation session store for *cfg*.
+
+        Sessions are independent of the collection, so one store exists per
+        backend location rather than per resource key.
+        """
+        session_cfg = cfg["sessions"]
+        key = f"{session_cfg['backend']}:{session_cfg.get('path')}"
+        with self._lock:
+            store = self._sessions.get(key)
+            if store is None:
+                store = open_session_store(session_cfg, ROOT_DIR)
+                self._sessions[key] = store
+            return store
+
+    def trace_writer(self, cfg: Dict[str, Any]) -> TraceWriter:
+        """Return the background writer for ``cfg["trace_path"]``."""
+        path = ROOT_DIR / cfg["trace_path"]
+        key = str(path)
+        with self._lock:
+            self._check_open()
+            writer = self._trace_writers.get(key)
+            if writer is None:
+                tracing = cfg["tracing"]
+                writer = TraceWriter(
+                    path,
+                    max_bytes=tracing["max_bytes"],
+                    rotate_daily=tracing["rotate_daily"],
+                    compress=tracing["compress"],
+                    queue_size=tracing["queue_size"],
+                    batch_size=tracing["batch_size"],
+                    flush_interval_s=tracing["flush_interval_s"],
+                )
+                self._trace_writers[key] = writer
+            return writer
+
+    def _check_open(self) -> None:
+        if self._closed:
+            raise RuntimeError("ResourceRegistry has been shut down")
+
+    def _build(self, key: str, cfg: Dict[str, Any]) -> RetrievalResources:
+        """Construct a bundle; overridden by benchmarks to inject fakes."""
+        return _build_resources(key, cfg)
+
+    # ------------------------------------------------------------------
+    # Blocking entry points
+    # ------------------------------------------------------------------
+
+    def _portal_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._portal is None:
+                loop = asyncio.new_event_loop()
+                thread = threading.Thread(
+                    target=loop.run_forever, name="meddoc-portal", daemon=True
+                )
+                thread.start()
+                self._portal = (loop, thread)
+            return self._portal[0]
+
+    def run_sync(self, coro: Awaitable[T]) -> T:
+        """Run *coro* on the registry's portal loop and block for the result.
+
+        Works both from plain scripts and from threads that already run an
+        event loop (e.g. Jupyter), where ``asyncio.run`` would refuse.
+        """
+        loop = self._portal_loop()
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    # ------------------------------------------------------------------
+    # Monitoring
+    # ------------------------------------------------------------------
+
+    def record_latency(self, seconds: float) -> None:
+        """Record the end-to-end latency of one answered question."""
+        with self._lock:
+            self._requests += 1
+            self._latencies.append(seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return pool and latency statistics for monitoring."""
+        with self._lock:
+            latencies = list(self._latencies)
+            bundles = [
+                {
+                    "key": b.key,
+                    "uses": b.uses,
+                    "age_s": round(time.time() - b.created_at, 1),
+                }
+                for b in self._bundles.values()
+            ]
+            requests = self._requests
+            caches = {path: c.stats() for path, c in self._embedding_caches.items()}
+            answer_caches = {key: c.stats() for key, c in self._answer_caches.items()}
+            lexical = {key: len(index) for key, index in self._lexical.items() if index is not None}
+            sessions = {key: len(store) for key, store in self._sessions.items()}
+            traces = {key: writer.stats() for key, writer in self._trace_writers.items()}
+
+        return {
+            "bundles": bundles,
+            "requests": requests,
+            "latency_ms": {"window": len(latencies), **percentiles(latencies, (50, 99))},
+            "embedding_cache": caches,
+            "answer_cache": answer_caches,
+            "lexical_index_chunks": lexical,
+            "sessions": sessions,
+            "trace_writer": traces,
+        }
+
+    async def aclose(self) -> None:
+        """Async variant of :meth:`close` that also closes this loop's clients."""
+        with self._lock:
+            bundles = list(self._bundles.values())
+        for bundle in bundles:
+            await bundle.aclose()
+        self.close()
+
+    def close(self) -> None:
+        """Close every pooled connection; further use raises ``RuntimeError``."""
+        with self._lock:
+            bundles = list(self._bundles.values())
+            self._bundles.clear()
+            self._configs.clear()
+            caches = list(self._embedding_caches.values())
+            self._embedding_caches.clear()
+            self._answer_caches.clear()
+            self._lexical.clear()
+            session_stores = list(self._sessions.values())
+            self._sessions.clear()
+            trace_writers = list(self._trace_writers.values())
+            self._trace_writers.clear()
+            self._closed = True
+            portal, self._portal = self._portal, None
+        for bundle in bundles:
+            bundle.close()
+        for cache in caches:
+            cache.close()
+        for store in session_stores:
+            store.close()
+        for writer in trace_writers:
+            writer.close()
+        if portal is not None:
+            loop, thread = portal
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join(timeout=5)
+            loop.close()
+
+
+# ---------------------------------------------------------------------------
+# Process-wide singleton
+# ---------------------------------------------------------------------------
+
+_registry: ResourceRegistry | None = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ResourceRegistry:
+    """Return the process-wide registry, creating it if necessary."""
+    global _registry
+    with _registry_lock:
+        if _registry is None or _registry._closed:
+            _registry = ResourceRegistry()
+        return _registry
+
+
+def install_registry(registry: ResourceRegistry) -> None:
+    """Replace the process-wide registry (used by benchmarks with fakes)."""
+    global _registry
+    with _registry_lock:
+        _registry = registry
+
+
+def shutdown_registry() -> None:
+    """Close the process-wide registry from synchronous code."""
+    global _registry
+    with _registry_lock:
+        registry, _registry = _registry, None
+    if registry is not None:
+        registry.close()
+
+
+async def ashutdown_registry() -> None:
+    """Close the process-wide registry (called from the FastAPI lifespan)."""
+    global _registry
+    with _registry_lock:
+        registry, _registry = _registry, None
+    if registry is not None:
+        await registry.aclose()
@@ -3,34 +3,47 @@ from __future__ import annotations
 """Retrieval-augmented generator for MedDoc.
 
 This module wraps three concerns:
-1. Fetching relevant chunks from the local Chroma vector store.
+1. Fetching relevant chunks from the vector store (Chroma or the embedded
+   index, see :mod:`backend.vectorstore`).
 2. Calling the chosen LLM with the chunks + user question.
 3. (Optional) capturing a *trace* of the whole interaction so that
    we can evaluate the pipeline later on.
 
-The public entry-point is :func:`get_answer`.
+The public entry-points are :func:`aget_answer`, its blocking wrapper
+:func:`get_answer`, the token-streaming :func:`astream_answer`, and
+:func:`abatch_answers` / :func:`batch_answers` for many questions at once.
 """
 
-import chromadb
+import asyncio
 import json
 import os
+import random
 import re
 import textwrap
-from dataclasses import asdict, dataclass
-from datetime import datetime
+import time
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import Any, AsyncIterator, Dict, List, Sequence, Tuple
 
-from langchain.chat_models import init_chat_model
-from langchain.schema import HumanMessage, SystemMessage
-from langchain.vectorstores import Chroma
+from langchain.schema import Document, HumanMessage, SystemMessage
 from langchain_core.messages.utils import count_tokens_approximately
-from langchain_openai import OpenAIEmbeddings
 
 from backend import ROOT_DIR
-from backend.config import (CHROMA_PATH, OPENAI_API_KEY, OPENAI_MODEL,
-                            require_env)
-from backend.utils.config_utils import load_config
+from backend.config import CHROMA_PATH, OPENAI_MODEL
+from backend.retrieval.answer_cache import AnswerCache, CachedAnswer, corpus_version
+from backend.retrieval.context_packer import DEFAULT_CONTEXT_CFG, PackedContext, pack_context
+from backend.retrieval.resources import AsyncResources, ResourceRegistry, get_registry
+from backend.retrieval.router import DEFAULT_ROUTER_CFG, Route, route_question
+from backend.retrieval.sessions import DEFAULT_SESSION_CFG, Session
+from backend.retrieval.trace_writer import DEFAULT_TRACE_CFG, prompt_hash
+from backend.utils.families import DEFAULT_FAMILY_CFG, family_cfg
+from backend.utils.highlights import attach_highlights
+from backend.utils.metrics import observe
+from backend.utils.timing import Timings
+from backend.vectorstore import (
+    DEFAULT_LEXICAL_CFG, DEFAULT_VECTOR_STORE_CFG, LexicalHit, LexicalIndex, VectorStore, read_corpus_version,
+    tokenize)
 
 # ---------------------------------------------------------------------------
 # Configuration helpers (mirrors backend/ingestion/preprocess.py style)
@@ -38,13 +51,80 @@ from backend.utils.config_utils import load_config
 
 _DEFAULT_CFG: Dict[str, Any] = {
     "chroma": {"persist_dir": CHROMA_PATH},
+    # "chroma" queries the Chroma server; "local" memory-maps the index that
+    # ingestion built under `path` (read-only, shared by all workers).
+    "vector_store": dict(DEFAULT_VECTOR_STORE_CFG),
+    # BM25 index written by ingestion next to the vector store.
+    "lexical_index": dict(DEFAULT_LEXICAL_CFG),
+    # "vector": dense search only; "hybrid": dense + BM25 fused with
+    # reciprocal rank fusion; "lexical": BM25 only.  With
+    # `lexical_fast_path`, a short keyword question with a rare term whose
+    # terms all appear in the best BM25 hit skips the embedding call.  Without a lexical index
+    # every mode falls back to "vector".
+    "search": {
+        "mode": "hybrid",
+        "candidates": 20,
+        "rrf_k": 60,
+        "lexical_fast_path": True,
+        "fast_path_max_terms": 6,
+        "fast_path_min_idf": 2.0,
+    },
+    # Search only the document families a question is about (see
+    # backend/retrieval/router.py); `families` must match the ingestion config.
+    "routing": dict(DEFAULT_ROUTER_CFG),
+    "families": dict(DEFAULT_FAMILY_CFG),
     "embedding_model": "text-embedding-3-large",
     "top_k": 4,
+    # Merge adjacent / overlapping chunks and fit context + history into a
+    # token budget (see backend/retrieval/context_packer.py).
+    "context_packing": dict(DEFAULT_CONTEXT_CFG),
+    # Server-side conversations for requests that pass a `session_id`
+    # (see backend/retrieval/sessions.py).
+    "sessions": dict(DEFAULT_SESSION_CFG),
     "llm": {"model": OPENAI_MODEL},
     "enable_tracing": True,
     "trace_path": "local/traces/query_traces.jsonl",
+    # Sampling, rotation and batching of the background trace writer.
+    "tracing": dict(DEFAULT_TRACE_CFG),
+    # Query embeddings keyed on (model, normalised question): an in-memory LRU
+    # in front of a SQLite file.  Set `path: null` for memory only.
+    "embedding_cache": {
+        "enabled": True,
+        "max_entries": 2048,
+        "path": "local/cache/query_embeddings.sqlite3",
+    },
+    # Semantic answer cache for history-free questions.  Cleared automatically
+    # when the set of `pdf_hash` values in the collection changes, as recorded
+    # in `vector_store.version_path` (re-read in the background every
+    # `version_check_interval_s`).
+    "answer_cache": {
+        "enabled": True,
+        "similarity_threshold": 0.95,
+        "ttl_s": 86400,
+        "max_entries": 512,
+        "version_check_interval_s": 60,
+    },
+    # Keep-alive connection pool shared by the embedding and chat clients.
+    "http_pool": {
+        "max_connections": 20,
+        "max_keepalive_connections": 10,
+        "keepalive_expiry": 60.0,
+        "timeout": 60.0,
+    },
+    # abatch_answers / POST /api/chat/batch: all questions are embedded in
+    # one request, then searched and answered with these concurrency limits.
+    "batch": {
+        "max_questions": 1000,
+        "search_concurrency": 16,
+        "llm_concurrency": 8,
+    },
 }
 
+
+def _config_path(cfg_path: str | Path | None) -> str | Path | None:
+    """*cfg_path*, else the YAML named by ``MEDDOC_RETRIEVAL_CONFIG`` (if set)."""
+    return cfg_path or os.getenv("MEDDOC_RETRIEVAL_CONFIG") or None
+
 # ---------------------------------------------------------------------------
 # Tracing utilities
 # ---------------------------------------------------------------------------
@@ -52,7 +132,11 @@ _DEFAULT_CFG: Dict[str, Any] = {
 
 @dataclass
 class QueryTrace:
-    """Container for everything we need to evaluate an answer."""
+    """Container for everything we need to evaluate an answer.
+
+    ``prompt`` holds the user message only; the system prompt is identified
+    by ``system_prompt_hash`` (see :mod:`.trace_writer`).
+    """
 
     question: str
     retrieved_docs: List[Dict[str, Any]]
@@ -60,16 +144,19 @@ class QueryTrace:
     raw_llm_response: str
     final_answer: str
     num_tokens: int
-    ts: str = datetime.utcnow().isoformat()
+    ts: str = field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+    answer_cache: Dict[str, Any] | None = None
+    search: Dict[str, Any] | None = None
+    # Context + history tokens removed by the packer, and what it kept.
+    num_tokens_saved: int = 0
+    context: Dict[str, Any] | None = None
+    # Stage name → milliseconds (see backend/utils/timing.py).
+    timings_ms: Dict[str, float] | None = None
 
 
-def _persist_trace(trace: QueryTrace, cfg: Dict[str, Any]) -> None:
-    """Append *trace* as a JSON-line to the configured file."""
-    path = ROOT_DIR / cfg["trace_path"]
-    path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("a", encoding="utf-8") as fh:
-        json.dump(asdict(trace), fh, ensure_ascii=False)
-        fh.write("\n")
+def _persist_trace(trace: QueryTrace, cfg: Dict[str, Any], registry: ResourceRegistry) -> None:
+    """Queue *trace* for the background writer of the configured file."""
+    registry.trace_writer(cfg).submit(trace, system_prompt=_SYSTEM_PROMPT)
 
 
 # ---------------------------------------------------------------------------
@@ -77,215 +164,775 @@ def _persist_trace(trace: QueryTrace, cfg: Dict[str, Any]) -> None:
 # ---------------------------------------------------------------------------
 
 
-def _get_vector_store(cfg: Dict[str, Any]) -> Chroma:
-    """Open the persisted ChromaDB instance in read-only mode."""
-    embeddings = OpenAIEmbeddings(
-        model=cfg["embedding_model"],
-        openai_api_key=require_env("OPENAI_API_KEY", OPENAI_API_KEY),
-    )
+def _get_vector_store(cfg: Dict[str, Any]) -> VectorStore:
+    """Return the pooled vector store for *cfg* (see :mod:`.resources`)."""
+    return get_registry().resources(cfg).store
 
-    client = chromadb.HttpClient(
-        host=os.getenv("CHROMA_HOST", "localhost"),
-        port=int(os.getenv("CHROMA_PORT", "8000"))
+
+async def _asearch_by_vector(
+    collection: Any, vector: List[float], k: int, where: Dict[str, Any] | None = None
+) -> List[Document]:
+    """Query an async vector store *collection* and wrap the hits as Documents."""
+    res = await collection.query(
+        query_embeddings=[vector],
+        n_results=k,
+        where=where,
+        include=["documents", "metadatas"],
     )
+    ids = (res.get("ids") or [[]])[0]
+    documents = (res.get("documents") or [[]])[0]
+    metadatas = (res.get("metadatas") or [[]])[0]
+    return [
+        Document(id=chunk_id, page_content=text or "", metadata=dict(meta or {}))
+        for chunk_id, text, meta in zip(ids, documents, metadatas)
+    ]
+
+
+async def _afetch_chunks(collection: Any, ids: List[str]) -> List[Document]:
+    """Load chunks by id (in the given order) from an async vector store."""
+    if not ids:
+        return []
+    res = await collection.get(ids=ids, include=["documents", "metadatas"])
+    found = {
+        chunk_id: Document(id=chunk_id, page_content=text or "", metadata=dict(meta or {}))
+        for chunk_id, text, meta in zip(res["ids"], res["documents"], res["metadatas"])
+    }
+    return [found[chunk_id] for chunk_id in ids if chunk_id in found]
+
+
+def _reciprocal_rank_fusion(rankings: List[List[str]], k: int) -> List[str]:
+    """Fuse ranked id lists: ``score(d) = sum(1 / (k + rank))`` over lists."""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, start=1):
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.__getitem__, reverse=True)
+
+
+def _lexical_is_confident(
+    question: str, hits: List[LexicalHit], lexical: LexicalIndex, cfg: Dict[str, Any]
+) -> bool:
+    """True when BM25 alone is trustworthy for *question*.
+
+    The question must be short and keyword-like, contain at least one
+    discriminative (high-idf) term, and the best hit must contain all of its
+    terms.
+    """
+    search_cfg = cfg["search"]
+    terms = set(tokenize(question))
+    if not hits or not terms or len(terms) > search_cfg["fast_path_max_terms"]:
+        return False
+    if max(lexical.idf(t) for t in terms) < search_cfg["fast_path_min_idf"]:
+        return False
+    return hits[0].coverage == 1.0
+
+# ---------------------------------------------------------------------------
+# Prompt construction
+# ---------------------------------------------------------------------------
+
+_SYSTEM_PROMPT = (
+    "You are Ello AI — a trusted HR assistant for NHS staff.\n"
+    "Your goal: Provide clear, accurate answers about HR policies using the uploaded documents as your only factual source. "
+    "You may interpret natural language questions flexibly, but every factual statement must be supported by information in the provided context.\n\n"
+    "Behaviour rules:\n\n"
+    "1. Evidence-based reasoning\n"
+    "   • Use the uploaded documents as your source of truth.\n"
+    "   • You may restate, summarise, or infer meaning *if it is clearly supported* by the context (e.g. synonymous phrasing or paraphrased intent).\n"
+    "   • Do *not* invent or guess data that cannot be reasonably inferred.\n"
+    "   • If genuinely no relevant material exists, say so.\n\n"
+    "2. Handling natural language\n"
+    "   • Understand everyday NHS staff phrasing (e.g. 'How long can I be off sick?' → sickness absence entitlement).\n"
+    "   • If the meaning is clear, proceed to answer even if wording differs from the text.\n"
+    "   • If the question could mean several different things, or key details are missing, ask up to *three concise clarifying questions* before answering.\n\n"
+    "3. Clarify-first logic\n"
+    "   • Examples of vague questions: 'What is my pay?', 'Am I entitled?', 'What leave do I get?'.\n"
+    "   • Ask only for the minimum details needed (band, role, type of leave, etc.).\n"
+    "   • Once clarified, use retrieved content to form the final answer.\n\n"
+    "4. Citations\n"
+    "   • Support each factual statement with at least one citation referencing the document name and, if possible, page or section.\n"
+    "   • Paraphrased sentences still require a citation to their source material.\n\n"
+    "5. Style & tone\n"
+    "   • Write in clear, concise, professional English suitable for NHS staff.\n"
+    "   • Use bullet points for key items.\n"
+    "   • Separate multiple documents clearly (e.g. 'According to Maternity Policy v1.4…').\n"
+    "   • Avoid speculative phrases ('probably', 'might').\n\n"
+    "Output format – critical for parsing:\n\n"
+    "If you provide an answer (not a clarification question), add a single blank line followed by a JSON object "
+    "*on a single line* with the key 'sources'. "
+    "Note that the sources MUST come from the context, and not generated or made up. "
+    "The sources must also be relevant to the answer that you provided. "
+    "The value of 'sources' must be an array of objects, each having:\n"
+    "  • file – the document name (string)\n"
+    "  • page – page number as an integer (omit if unknown)\n\n"
+    "Examples:\n\n"
+    "Example of a complete answer:\n"
+    "Employees are entitled to take 52 weeks' adoption leave. …\n\n"
+    '{"sources":[{"file":"Policy-Handbook.pdf","page":37}]}\n\n'
+    "Example of asking for clarification (no sources needed):\n"
+    "Could you please specify which type of leave you're asking about? "
+    "For example: annual leave, sick leave, maternity leave, or adoption leave?\n"
+)
+
+
+def _build_messages(question: str, packed: PackedContext) -> Tuple[str, List[Any]]:
+    """Return ``(prompt_content, messages)`` for *question* and its packed context."""
+    prompt_content = textwrap.dedent(
+        f"""
+        Context:
+        {packed.context}
 
-    return Chroma(
-        client=client,
-        collection_name="documents",
-        embedding_function=embeddings
+        {f'''
+        Previous Conversation:
+        {packed.history_text}
+        ''' if packed.history else ''}
+
+        Current Question: {question}
+        """
     )
 
+    messages = [
+        SystemMessage(content=_SYSTEM_PROMPT),
+        HumanMessage(content=prompt_content),
+    ]
+    return prompt_content, messages
+
 # ---------------------------------------------------------------------------
-# Chat history formatting
+# Pipeline stages shared by the public entry-points
 # ---------------------------------------------------------------------------
 
-def _format_chat_history(history):
-    """Format the message history into a readable context string."""
+_NO_INFO_MSG = "I couldn't find the relevant information."
+
+
+@dataclass
+class _Turn:
+    """Per-request state shared by the blocking, async and streaming paths."""
+
+    question: str
+    history: list[dict] | None
+    registry: ResourceRegistry
+    cfg: Dict[str, Any]
+    clients: AsyncResources
+    started: float
+    docs: List[Document] = field(default_factory=list)
+    prompt_content: str = ""
+    messages: List[Any] = field(default_factory=list)
+    query_vector: List[float] | None = None
+    answer_cache: AnswerCache | None = None
+    cached: CachedAnswer | None = None
+    cache_info: Dict[str, Any] | None = None
+    search_info: Dict[str, Any] | None = None
+    packed: PackedContext | None = None
+    session: Session | None = None
+    timings: Timings = field(default_factory=Timings)
+
+
+async def _aprepare(
+    question: str,
+    history: list[dict] | None,
+    cfg_path: str | Path | None,
+    session_id: str | None = None,
+    timings: Timings | None = None,
+    query_vector: List[float] | None = None,
+) -> _Turn:
+    """Retrieve context for *question* and build the LLM messages.
+
+    With *session_id* the stored conversation replaces *history*; a
+    session this store does not know is seeded from *history*.  Stage
+    durations are added to *timings* (a fresh one if omitted).  A
+    precomputed *query_vector* (batch mode) skips the embedding call and
+    the lexical fast path.
+    """
+    timings = timings or Timings()
+    with timings.span("config"):
+        registry = get_registry()
+        cfg = registry.config(_DEFAULT_CFG, _config_path(cfg_path))
+        bundle = await registry.aresources(cfg)
+        clients = await bundle.async_clients()
+    session: Session | None = None
+    if session_id is not None:
+        with timings.span("session"):
+            store = registry.session_store(cfg)
+            session = store.get(session_id)
+            if session is None:
+                session = Session.from_history(session_id, history)
+                if session.turns or session.summary:
+                    store.put(session)
+            history = session.history()
+    turn = _Turn(question, history, registry, cfg, clients, timings.started, session=session, timings=timings)
+    search_cfg = cfg["search"]
+    lexical = registry.lexical_index(cfg) if search_cfg["mode"] != "vector" else None
+    with timings.span("embed"):
+        turn.query_vector = query_vector or _cached_query_vector(question, turn)
+
+    # 1. Lexical fast path: a clear keyword match needs no embedding at all
+    lexical_hits: List[LexicalHit] | None = None
+    if lexical is not None and (
+        search_cfg["mode"] == "lexical"
+        or (search_cfg["lexical_fast_path"] and turn.query_vector is None)
+    ):
+        with timings.span("lexical"):
+            lexical_hits = await asyncio.to_thread(lexical.search, question, search_cfg["candidates"])
+            confident = search_cfg["mode"] == "lexical" or _lexical_is_confident(
+                question, lexical_hits, lexical, cfg
+            )
+        if confident:
+            ids = [hit.id for hit in lexical_hits[: cfg["top_k"]]]
+            with timings.span("search"):
+                turn.docs = await _afetch_chunks(clients.collection, ids)
+            turn.search_info = {
+                "mode": "lexical" if search_cfg["mode"] == "lexical" else "lexical_fast",
+                "lexical_hits": len(lexical_hits),
+            }
+            _pack(turn)
+            return turn
+
+    # 2. Embed the question and try the semantic answer cache
+    with timings.span("embed"):
+        turn.query_vector = await _aembed_query(question, turn)
     if not history:
-        return ""
+        with timings.span("answer_cache"):
+            await _alookup_answer(turn)
+        if turn.cached is not None:
+            return turn
+
+    # 3. Retrieve similar chunks, fused with the BM25 ranking in hybrid mode,
+    #    from the families the question is routed to
+    with timings.span("search"):
+        route = _route(turn)
+        turn.docs = await _asearch(turn, lexical, lexical_hits, route.where)
+        if route.families and len(turn.docs) < cfg["top_k"]:
+            # Too little in those families (or untagged chunks): search everything.
+            route.reason = "fallback_few_hits"
+            turn.docs = await _asearch(turn, lexical, lexical_hits, None)
+    if route.reason != "disabled":
+        turn.search_info["route"] = route.as_dict()
+
+    # 4. Pack the context and build the prompt
+    _pack(turn)
+    return turn
+
+
+def _pack(turn: _Turn) -> None:
+    """Fit the retrieved chunks and history into the prompt budget."""
+    if not turn.docs:
+        return
+    with turn.timings.span("prompt"):
+        turn.packed = pack_context(turn.docs, turn.history, turn.cfg["context_packing"])
+        turn.prompt_content, turn.messages = _build_messages(turn.question, turn.packed)
+
+
+def _route(turn: _Turn) -> Route:
+    r_cfg = turn.cfg["routing"]
+    if not r_cfg["enabled"]:
+        return Route(reason="disabled")
+    return route_question(turn.question, r_cfg, family_cfg(turn.cfg))
+
+
+async def _asearch(
+    turn: _Turn,
+    lexical: LexicalIndex | None,
+    lexical_hits: List[LexicalHit] | None,
+    where: Dict[str, Any] | None,
+) -> List[Document]:
+    """Vector or hybrid search for the top ``top_k`` chunks matching *where*."""
+    if lexical is None:
+        turn.search_info = {"mode": "vector"}
+        return await _asearch_by_vector(turn.clients.collection, turn.query_vector, k=turn.cfg["top_k"], where=where)
+    # BM25 hits from the fast path were not filtered.
+    return await _ahybrid_search(turn, lexical, lexical_hits if where is None else None, where)
+
+
+async def _ahybrid_search(
+    turn: _Turn,
+    lexical: LexicalIndex,
+    lexical_hits: List[LexicalHit] | None,
+    where: Dict[str, Any] | None = None,
+) -> List[Document]:
+    """Fuse the vector and BM25 rankings and return the top ``top_k`` chunks."""
+    cfg, search_cfg = turn.cfg, turn.cfg["search"]
+    vector_search = _asearch_by_vector(
+        turn.clients.collection, turn.query_vector, k=search_cfg["candidates"], where=where
+    )
+    if lexical_hits is None:
+        vector_docs, lexical_hits = await asyncio.gather(
+            vector_search,
+            asyncio.to_thread(lexical.search, turn.question, search_cfg["candidates"], where),
+        )
+    else:
+        vector_docs = await vector_search
+
+    fused = _reciprocal_rank_fusion(
+        [[d.id for d in vector_docs], [hit.id for hit in lexical_hits]], search_cfg["rrf_k"]
+    )[: cfg["top_k"]]
+    by_id = {d.id: d for d in vector_docs}
+    missing = [chunk_id for chunk_id in fused if chunk_id not in by_id]
+    for doc in await _afetch_chunks(turn.clients.collection, missing):
+        by_id[doc.id] = doc
+    turn.search_info = {
+        "mode": "hybrid",
+        "vector_hits": len(vector_docs),
+        "lexical_hits": len(lexical_hits),
+        "lexical_only": len(missing),
+    }
+    return [by_id[chunk_id] for chunk_id in fused if chunk_id in by_id]
+
+
+def _embedding_key(cfg: Dict[str, Any]) -> str:
+    """Embedding cache namespace: the model, plus the endpoint when it is not OpenAI's.
+
+    Vectors from a local fake or proxy (``OPENAI_BASE_URL``) never reach
+    queries answered against the real API.
+    """
+    base_url = os.getenv("OPENAI_BASE_URL")
+    return f"{cfg['embedding_model']}@{base_url}" if base_url else cfg["embedding_model"]
+
+
+def _cached_query_vector(question: str, turn: _Turn) -> List[float] | None:
+    cache = turn.registry.embedding_cache(turn.cfg)
+    return cache.get(question, _embedding_key(turn.cfg)) if cache is not None else None
+
+
+async def _aembed_query(question: str, turn: _Turn) -> List[float]:
+    """Embed *question* unless the embedding cache already supplied it."""
+    if turn.query_vector is not None:
+        return turn.query_vector
+    vector = await turn.clients.embeddings.aembed_query(question)
+    cache = turn.registry.embedding_cache(turn.cfg)
+    if cache is not None:
+        cache.put(question, _embedding_key(turn.cfg), vector)
+    return vector
+
+
+async def _aread_corpus_version(turn: _Turn) -> str:
+    """The corpus version ingestion wrote; stores ingested before it existed are scanned instead."""
+    version = await asyncio.to_thread(read_corpus_version, turn.cfg)
+    if version is None:
+        res = await turn.clients.collection.get(include=["metadatas"])
+        version = corpus_version(res.get("metadatas") or [])
+    return version
+
+
+async def _alookup_answer(turn: _Turn) -> None:
+    """Populate ``turn.cached`` from the semantic answer cache on a hit."""
+    cache = turn.registry.answer_cache(turn.cfg)
+    if cache is None:
+        return
+    turn.answer_cache = cache
+    cache.refresh_version(lambda: _aread_corpus_version(turn))
+    hit = cache.lookup(turn.query_vector)
+    stats = cache.stats()
+    turn.cache_info = {"hit": hit is not None, "hit_rate": stats["hit_rate"]}
+    if hit is not None:
+        entry, similarity = hit
+        turn.cached = entry
+        turn.cache_info.update(
+            age_s=round(entry.age_s, 1),
+            similarity=round(similarity, 4),
+            cached_question=entry.question,
+        )
 
-    formatted = []
-    for msg in history:
-        role = msg.get("role", "user")
-        content = msg.get("content", "")
-        if role == "user":
-            formatted.append(f"User: {content}")
-        else:
-            formatted.append(f"Assistant: {content}")
 
-    return "\n".join(formatted)
+def _remember_answer(turn: _Turn, answer: str, sources: List[Dict[str, Any]]) -> None:
+    """Store a freshly generated answer for later paraphrases."""
+    if turn.answer_cache is not None and turn.cached is None and turn.docs:
+        turn.answer_cache.store(turn.question, turn.query_vector, answer, sources)
+
+
+def _record_session(turn: _Turn, answer: str) -> None:
+    """Append the exchange to the session and fold old turns in the background."""
+    if turn.session is None:
+        return
+    with turn.timings.span("session"):
+        store = turn.registry.session_store(turn.cfg)
+        session = store.append(turn.session.id, turn.question, answer)
+        store.schedule_fold(session, turn.clients.chat_model, turn.cfg["sessions"])
+
+
+def _finish(turn: _Turn, raw_response: str, answer: str, *, trace: bool) -> Dict[str, Any] | None:
+    """Record latency and stage timings and, if enabled, persist the trace of *turn*."""
+    _record_session(turn, answer)
+    should_trace = trace or (
+        turn.cfg.get("enable_tracing", False) and random.random() < turn.cfg["tracing"]["sample_rate"]
+    )
+    trace_dict: Dict[str, Any] | None = None
+    if should_trace:
+        retrieved_docs_meta = [
+            {"page_content": d.page_content, "metadata": d.metadata} for d in turn.docs
+        ]
+        q_trace = QueryTrace(
+            question=turn.question,
+            retrieved_docs=retrieved_docs_meta,
+            prompt=turn.prompt_content,
+            raw_llm_response=raw_response,
+            final_answer=answer,
+            num_tokens=count_tokens_approximately(turn.messages) if turn.messages else 0,
+            answer_cache=turn.cache_info,
+            search=turn.search_info,
+            num_tokens_saved=turn.packed.tokens_saved if turn.packed else 0,
+            context=turn.packed.info() if turn.packed else None,
+            timings_ms=turn.timings.as_ms(),
+        )
+        with turn.timings.span("trace"):
+            _persist_trace(q_trace, turn.cfg, turn.registry)
+        if trace:
+            trace_dict = {**asdict(q_trace), "system_prompt_hash": prompt_hash(_SYSTEM_PROMPT)}
+
+    turn.registry.record_latency(time.perf_counter() - turn.started)
+    observe("query", turn.timings)
+    return trace_dict
 
 # ---------------------------------------------------------------------------
 # Public API
 # ---------------------------------------------------------------------------
 
 
-def get_answer(
+async def aget_answer(
     question: str,
     *,
     history: list[dict] | None = None,
+    session_id: str | None = None,
     trace: bool = False,
     cfg_path: str | Path | None = None,
+    timings: Timings | None = None,
 ) -> str | Tuple[str, Dict[str, Any]]:
     """Return an answer to *question* using retrieval-augmented generation.
 
+    Every network call – query embedding, vector search and LLM completion –
+    is awaited, so concurrent requests share one event loop without
+    blocking each other.
+
     Parameters
     ----------
     question: str
         End-user question.
+    history: list[dict] | None
+        Previous ``{"role", "content"}`` messages, oldest first.
+    session_id: str | None
+        Use and extend the server-side conversation with this id instead of
+        *history*; unknown or expired ids start from *history*.
     trace: bool, default False
         If *True* the function returns a `(answer, trace_dict)` tuple and also
         records the trace to disk.  If *False*, tracing depends solely on the
         configuration key `enable_tracing`.
     cfg_path: Optional[str | Path]
-        Path to a YAML file whose contents will override the default config.
+        Path to a YAML file whose contents will override the default config
+        (default: ``$MEDDOC_RETRIEVAL_CONFIG``, if set).
+    timings: Timings | None
+        Collects per-stage durations, e.g. for a ``Server-Timing`` header.
     """
 
-    # return "Temporary answer: Lorem ipsum dolor sit amet, consectetur adipiscing elit. Sed do eiusmod tempor incididunt ut labore et dolore magna aliqua."
+    turn = await _aprepare(question, history, cfg_path, session_id, timings)
+    answer, sources, trace_dict = await _agenerate(turn, trace=trace)
+    if trace:
+        return answer, sources, trace_dict
+    return answer, sources
 
-    cfg = load_config(_DEFAULT_CFG, cfg_path)
 
-    # 1. Retrieve similar chunks
-    vectordb = _get_vector_store(cfg)
-    docs = vectordb.similarity_search(question, k=cfg["top_k"])
+async def _agenerate(
+    turn: _Turn, *, trace: bool
+) -> Tuple[str, List[Dict[str, Any]], Dict[str, Any] | None]:
+    """Answer a prepared *turn*: cached answer, no-context reply or LLM call."""
+    if turn.cached is not None:
+        answer, sources = turn.cached.answer, turn.cached.sources
+        return answer, sources, _finish(turn, answer, answer, trace=trace)
 
-    if len(docs) == 0:
-        no_info_msg = "I couldn't find the relevant information."
-        if trace:
-            return no_info_msg, [], {}
-        return no_info_msg, []
-    print(docs)
-
-    # 2. Build prompt
-    context_texts = [
-        [
-            f"Document: {doc.metadata['filename']}, Page: {doc.metadata.get('page_number', 'unknown')}",
-            f"Content: {doc.page_content}",
-        ]
-        for doc in docs
-    ]
+    if len(turn.docs) == 0:
+        return _NO_INFO_MSG, [], _finish(turn, _NO_INFO_MSG, _NO_INFO_MSG, trace=trace)
 
-    context = "\n\n".join(f"{doc[0]}\n{doc[1]}" for doc in context_texts)
-
-    system_prompt = (
-        "You are Ello AI — a trusted HR assistant for NHS staff.\n"
-        "Your goal: Provide clear, accurate answers about HR policies using the uploaded documents as your only factual source. "
-        "You may interpret natural language questions flexibly, but every factual statement must be supported by information in the provided context.\n\n"
-        "Behaviour rules:\n\n"
-        "1. Evidence-based reasoning\n"
-        "   • Use the uploaded documents as your source of truth.\n"
-        "   • You may restate, summarise, or infer meaning *if it is clearly supported* by the context (e.g. synonymous phrasing or paraphrased intent).\n"
-        "   • Do *not* invent or guess data that cannot be reasonably inferred.\n"
-        "   • If genuinely no relevant material exists, say so.\n\n"
-        "2. Handling natural language\n"
-        "   • Understand everyday NHS staff phrasing (e.g. 'How long can I be off sick?' → sickness absence entitlement).\n"
-        "   • If the meaning is clear, proceed to answer even if wording differs from the text.\n"
-        "   • If the question could mean several different things, or key details are missing, ask up to *three concise clarifying questions* before answering.\n\n"
-        "3. Clarify-first logic\n"
-        "   • Examples of vague questions: 'What is my pay?', 'Am I entitled?', 'What leave do I get?'.\n"
-        "   • Ask only for the minimum details needed (band, role, type of leave, etc.).\n"
-        "   • Once clarified, use retrieved content to form the final answer.\n\n"
-        "4. Citations\n"
-        "   • Support each factual statement with at least one citation referencing the document name and, if possible, page or section.\n"
-        "   • Paraphrased sentences still require a citation to their source material.\n\n"
-        "5. Style & tone\n"
-        "   • Write in clear, concise, professional English suitable for NHS staff.\n"
-        "   • Use bullet points for key items.\n"
-        "   • Separate multiple documents clearly (e.g. 'According to Maternity Policy v1.4…').\n"
-        "   • Avoid speculative phrases ('probably', 'might').\n\n"
-        "Output format – critical for parsing:\n\n"
-        "If you provide an answer (not a clarification question), add a single blank line followed by a JSON object "
-        "*on a single line* with the key 'sources'. "
-        "Note that the sources MUST come from the context, and not generated or made up. "
-        "The sources must also be relevant to the answer that you provided. "
-        "The value of 'sources' must be an array of objects, each having:\n"
-        "  • file – the document name (string)\n"
-        "  • page – page number as an integer (omit if unknown)\n\n"
-        "Examples:\n\n"
-        "Example of a complete answer:\n"
-        "Employees are entitled to take 52 weeks' adoption leave. …\n\n"
-        '{"sources":[{"file":"Policy-Handbook.pdf","page":37}]}\n\n'
-        "Example of asking for clarification (no sources needed):\n"
-        "Could you please specify which type of leave you're asking about? "
-        "For example: annual leave, sick leave, maternity leave, or adoption leave?\n"
-    )
+    # 4. Call LLM
+    with turn.timings.span("llm"):
+        response = await turn.clients.chat_model.ainvoke(turn.messages)
 
-    prompt_content = textwrap.dedent(
-        f"""
-        Context:
-        {context}
+    raw_response: str = response.content.strip()
 
-        {f'''
-        Previous Conversation:
-        {_format_chat_history(history)}
-        ''' if history else ''}
+    with turn.timings.span("parse"):
+        answer, sources = _extract_answer_and_sources(raw_response)
+        sources = attach_highlights(sources, turn.docs)
+    _remember_answer(turn, answer, sources)
 
-        Current Question: {question}
-        """
-    )
+    return answer, sources, _finish(turn, response.content, answer, trace=trace)
 
-    messages = [
-        SystemMessage(content=system_prompt),
-        HumanMessage(content=prompt_content),
-    ]
 
-    # 3. Call LLM
-    model = init_chat_model(
-        OPENAI_MODEL,
-        model_provider="openai",
-        api_key=OPENAI_API_KEY,
+async def astream_answer(
+    question: str,
+    *,
+    history: list[dict] | None = None,
+    session_id: str | None = None,
+    cfg_path: str | Path | None = None,
+    timings: Timings | None = None,
+) -> AsyncIterator[Tuple[str, Any]]:
+    """Stream the answer to *question* as it is generated.
+
+    Yields ``("token", text)`` events while the LLM is producing the answer
+    and finishes with exactly one ``("sources", {"answer": ..., "sources":
+    [...]})`` event.  The trailing ``{"sources": [...]}`` line is never sent
+    as tokens; it only appears, parsed, in the final event.
+    """
+
+    turn = await _aprepare(question, history, cfg_path, session_id, timings)
+
+    if turn.cached is not None:
+        _finish(turn, turn.cached.answer, turn.cached.answer, trace=False)
+        yield "token", turn.cached.answer
+        yield "sources", {"answer": turn.cached.answer, "sources": turn.cached.sources}
+        return
+
+    if len(turn.docs) == 0:
+        _finish(turn, _NO_INFO_MSG, _NO_INFO_MSG, trace=False)
+        yield "token", _NO_INFO_MSG
+        yield "sources", {"answer": _NO_INFO_MSG, "sources": []}
+        return
+
+    parser = _StreamingSourcesParser()
+    llm_started = time.perf_counter()
+    first_token = True
+    async for chunk in turn.clients.chat_model.astream(turn.messages):
+        if first_token:
+            turn.timings.add("llm_first_token", time.perf_counter() - llm_started)
+            first_token = False
+        text = parser.feed(chunk.content)
+        if text:
+            yield "token", text
+    turn.timings.add("llm", time.perf_counter() - llm_started)
+
+    with turn.timings.span("parse"):
+        answer, sources, tail = parser.finish()
+        sources = attach_highlights(sources, turn.docs)
+    if tail:
+        yield "token", tail
+
+    _remember_answer(turn, answer, sources)
+    _finish(turn, parser.raw, answer, trace=False)
+    yield "sources", {"answer": answer, "sources": sources}
+
+
+def get_answer(
+    question: str,
+    *,
+    history: list[dict] | None = None,
+    session_id: str | None = None,
+    trace: bool = False,
+    cfg_path: str | Path | None = None,
+) -> str | Tuple[str, Dict[str, Any]]:
+    """Blocking wrapper around :func:`aget_answer` for scripts and notebooks."""
+    return get_registry().run_sync(
+        aget_answer(question, history=history, session_id=session_id, trace=trace, cfg_path=cfg_path)
     )
-    response = model.invoke(messages)
 
-    raw_response: str = response.content.strip()
 
-    answer, sources = _extract_answer_and_sources(raw_response)
+async def _aembed_batch(questions: Sequence[str], registry: ResourceRegistry, cfg: Dict[str, Any]) -> List[List[float]]:
+    """Vectors for *questions*: cached ones from the embedding cache, the rest in one request."""
+    cache = registry.embedding_cache(cfg)
+    model = _embedding_key(cfg)
+    vectors: Dict[str, List[float]] = {}
+    for question in questions:
+        vector = cache.get(question, model) if cache is not None else None
+        if vector is not None:
+            vectors[question] = vector
+    missing = list(dict.fromkeys(q for q in questions if q not in vectors))
+    if missing:
+        bundle = await registry.aresources(cfg)
+        clients = await bundle.async_clients()
+        for question, vector in zip(missing, await clients.embeddings.aembed_documents(missing)):
+            vectors[question] = vector
+            if cache is not None:
+                cache.put(question, model, vector)
+    return [vectors[q] for q in questions]
+
+
+async def abatch_answers(
+    questions: Sequence[str],
+    *,
+    trace: bool = False,
+    cfg_path: str | Path | None = None,
+    concurrency: int | None = None,
+) -> AsyncIterator[Dict[str, Any]]:
+    """Answer many independent questions, yielding each result as it completes.
 
-    # ---------------------------------------------------------------------
-    # Tracing (optional)
-    # ---------------------------------------------------------------------
-    should_trace = trace or cfg.get("enable_tracing", False)
-    trace_dict: Dict[str, Any] | None = None
-    if should_trace:
-        retrieved_docs_meta = [
-            {"page_content": d.page_content, "metadata": d.metadata} for d in docs
-        ]
-        q_trace = QueryTrace(
-            question=question,
-            retrieved_docs=retrieved_docs_meta,
-            prompt=f"{system_prompt}\n\n{prompt_content}",
-            raw_llm_response=response.content,
-            final_answer=answer,
-            num_tokens=count_tokens_approximately(messages),
-        )
-        _persist_trace(q_trace, cfg)
-        trace_dict = asdict(q_trace)
+    All questions are embedded with a single batched request (questions in
+    the embedding cache are skipped); the searches then run concurrently,
+    at most ``batch.search_concurrency`` at a time, and the LLM calls at
+    most ``batch.llm_concurrency`` (or *concurrency*) at a time.
 
-    if trace:
-        return answer, sources, trace_dict
-    return answer, sources
+    Yields one dict per question, in completion order::
+
+        {"index": 3, "question": ..., "answer": ..., "sources": [...],
+         "timings_ms": {...}, "trace": {...}}   # "trace" only with trace=True
+
+    A failing question yields ``{"index", "question", "error"}`` instead
+    and does not stop the batch.
+    """
+    registry = get_registry()
+    cfg = registry.config(_DEFAULT_CFG, _config_path(cfg_path))
+    batch_cfg = cfg["batch"]
+    if len(questions) > batch_cfg["max_questions"]:
+        raise ValueError(f"At most {batch_cfg['max_questions']} questions per batch")
+    if not questions:
+        return
+
+    vectors = await _aembed_batch(questions, registry, cfg)
+    search_slots = asyncio.Semaphore(batch_cfg["search_concurrency"])
+    llm_slots = asyncio.Semaphore(concurrency or batch_cfg["llm_concurrency"])
+
+    async def answer_one(index: int, question: str) -> Dict[str, Any]:
+        timings = Timings()
+        try:
+            async with search_slots:
+                turn = await _aprepare(question, None, cfg_path, timings=timings, query_vector=vectors[index])
+            async with llm_slots:
+                answer, sources, trace_dict = await _agenerate(turn, trace=trace)
+        except Exception as exc:  # noqa: BLE001 – reported per question
+            return {"index": index, "question": question, "error": f"{type(exc).__name__}: {exc}"}
+        result = {
+            "index": index,
+            "question": question,
+            "answer": answer,
+            "sources": sources,
+            "timings_ms": timings.as_ms(),
+        }
+        if trace:
+            result["trace"] = trace_dict
+        return result
+
+    tasks = [asyncio.ensure_future(answer_one(i, q)) for i, q in enumerate(questions)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def batch_answers(
+    questions: Sequence[str],
+    *,
+    trace: bool = False,
+    cfg_path: str | Path | None = None,
+    concurrency: int | None = None,
+) -> List[Dict[str, Any]]:
+    """Blocking wrapper around :func:`abatch_answers`; results in input order."""
 
+    async def collect() -> List[Dict[str, Any]]:
+        return [r async for r in abatch_answers(questions, trace=trace, cfg_path=cfg_path, concurrency=concurrency)]
+
+    return sorted(get_registry().run_sync(collect()), key=lambda r: r["index"])
+
+
+
+def has_session(session_id: str, *, cfg_path: str | Path | None = None) -> bool:
+    """True if the server-side conversation *session_id* exists and has not expired."""
+    registry = get_registry()
+    return registry.session_store(registry.config(_DEFAULT_CFG, _config_path(cfg_path))).get(session_id) is not None
+
+
+def end_session(session_id: str, *, cfg_path: str | Path | None = None) -> None:
+    """Forget the server-side conversation *session_id*."""
+    registry = get_registry()
+    registry.session_store(registry.config(_DEFAULT_CFG, _config_path(cfg_path))).delete(session_id)
 
 # ---------------------------------------------------------------------------
 # Helper functions
 # ---------------------------------------------------------------------------
 
 
+# Where a sources object can start; the same rule for the streamed and the
+# non-streamed answer.
+_SOURCES_START_RE = re.compile(r'\{\s*"sources"')
+_SOURCES_KEY = '"sources"'
+_JSON_DECODER = json.JSONDecoder()
+
+
+def _parse_sources(text: str) -> List[Dict[str, Any]] | None:
+    """The sources list if *text* is a ``{"sources": [...]}`` object, else None."""
+    try:
+        obj = json.loads(text)
+    except json.JSONDecodeError:
+        return None
+    if isinstance(obj, dict) and isinstance(obj.get("sources"), list):
+        return obj["sources"]
+    return None
+
+
 def _extract_answer_and_sources(raw_response: str) -> tuple[str, List[Dict[str, Any]]]:
     """Split *raw_response* into natural-language answer and sources array.
 
     The model is expected to append a single-line JSON object like::
 
         {"sources":[{"file":"Policy.pdf","page":3}]}
+
+    Any ``{"sources"`` that starts an object running to the end of the
+    response counts, on its own line or not.  Without one that parses, the
+    whole response is the answer.
     """
 
-    json_match = re.search(r"\{.*\}\s*$", raw_response, re.DOTALL)
-    sources: list[dict[str, Any]] = []
-    if json_match:
-        sources_obj = json.loads(json_match.group(0))
-        sources = sources_obj.get("sources", []) if isinstance(sources_obj, dict) else []
-        answer_part = raw_response[: json_match.start()].strip()
-    else:
-        answer_part = raw_response.strip()
+    text = raw_response.strip()
+    for match in reversed(list(_SOURCES_START_RE.finditer(text))):
+        sources = _parse_sources(text[match.start():])
+        if sources is not None:
+            return text[:match.start()].strip(), sources
+    return text, []
+
 
-    return answer_part, sources
+class _StreamingSourcesParser:
+    """Incremental counterpart of :func:`_extract_answer_and_sources`.
+
+    Text is released as soon as it cannot be part of the trailing sources
+    object: from the first ``{`` that may still turn out to start one
+    (``{"sour`` so far, or a ``{"sources"`` object that has not ended or
+    ends the text), everything is held back, as is trailing whitespace,
+    until more text rules it out or the stream ends.  A held-back object
+    that does not parse as sources is released by :meth:`finish`.
+    """
+
+    def __init__(self) -> None:
+        self.raw = ""
+        self._start: int | None = None
+        self._emitted = 0
+        # Every "{" before this offset has been ruled out.
+        self._scan = 0
+
+    def _may_start_sources(self, i: int) -> bool:
+        rest = self.raw[i + 1:].lstrip()
+        if not rest.startswith(_SOURCES_KEY):
+            return _SOURCES_KEY.startswith(rest)
+        try:
+            _, end = _JSON_DECODER.raw_decode(self.raw, i)
+        except json.JSONDecodeError:
+            return True  # not complete yet; finish() decides
+        return not self.raw[end:].strip()
+
+    def feed(self, delta: str) -> str:
+        """Add *delta* to the buffer and return the newly releasable text."""
+        self.raw += delta
+        if self._start is None:
+            stripped = self.raw.lstrip()
+            if not stripped:
+                return ""
+            self._start = self._emitted = self._scan = len(self.raw) - len(stripped)
+
+        end = len(self.raw.rstrip())
+        while (brace := self.raw.find("{", self._scan, end)) != -1:
+            if self._may_start_sources(brace):
+                end = brace
+                break
+            # Text only grows, so a ruled-out "{" stays ruled out.
+            self._scan = brace + 1
+        while end > self._emitted and self.raw[end - 1].isspace():
+            end -= 1
+
+        if end <= self._emitted:
+            return ""
+        text = self.raw[self._emitted:end]
+        self._emitted = end
+        return text
+
+    def finish(self) -> tuple[str, List[Dict[str, Any]], str]:
+        """Return ``(answer, sources, tail)`` once the stream has ended.
+
+        *tail* is the part of the answer that was held back but turned out
+        not to be the sources line.
+        """
+        answer, sources = _extract_answer_and_sources(self.raw)
+        emitted = self.raw[self._start or 0 : self._emitted]
+        tail = answer[len(emitted):] if answer.startswith(emitted) else ""
+        return answer, sources, tail
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+"""Local query router: which document families a question is about.
+
+Ingestion tags each chunk with a ``family`` (see
+``backend/utils/families.py``).  :func:`route_question` scores the question
+against the same keyword lists – no model call, microseconds per question –
+and picks the best family plus any close runner-up.  The search stages then
+filter on ``{"family": {"$in": [...]}}``, which with
+``vector_store.shard_by_family`` means only those shards are searched, so
+search latency follows the size of the families asked about rather than
+the whole corpus.
+
+The router is only trusted when the picked families hold most of the
+keyword evidence; otherwise (or when no keyword matches) it returns no
+filter and the search runs over everything.  ``retrieval.py`` also falls
+back to a global search when the routed one finds fewer than ``top_k``
+chunks, e.g. in a store ingested before chunks had a family.
+"""
+
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+
+from backend.utils.families import family_names, score_families
+
+__all__ = ["DEFAULT_ROUTER_CFG", "Route", "route_question"]
+
+DEFAULT_ROUTER_CFG: Dict[str, Any] = {
+    # Off until the store has been (re-)ingested with chunk families.
+    "enabled": False,
+    "max_families": 2,
+    # A runner-up is searched too if it scores at least this share of the best.
+    "min_relative": 0.5,
+    # The picked families must hold this share of all keyword matches.
+    "min_share": 0.6,
+    # Searched with every routed question; ``None`` means the families
+    # block's ``default`` (chunks no keyword matched, e.g. handbook text).
+    "include": None,
+}
+
+
+@dataclass
+class Route:
+    """The router's decision for one question."""
+
+    families: List[str] = field(default_factory=list)  # empty: search everything
+    scores: Dict[str, int] = field(default_factory=dict)
+    confidence: float = 0.0
+    reason: str = ""
+
+    @property
+    def where(self) -> Dict[str, Any] | None:
+        return {"family": {"$in": self.families}} if self.families else None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"families": self.families, "confidence": round(self.confidence, 2), "reason": self.reason}
+
+
+def _included(cfg: Dict[str, Any], fam_cfg: Dict[str, Any]) -> List[str]:
+    """Families searched with every routed question, checked against *fam_cfg*."""
+    include = cfg.get("include")
+    if include is None:
+        return [fam_cfg["default"]]
+    unknown = [name for name in include if name not in family_names(fam_cfg)]
+    if unknown:
+        raise ValueError(f"routing.include names unknown families: {unknown}")
+    return list(include)
+
+
+def route_question(question: str, cfg: Dict[str, Any], fam_cfg: Dict[str, Any]) -> Route:
+    """Pick the families to search for *question*.
+
+    Parameters
+    ----------
+    question: str
+        The user's question.
+    cfg: Dict
+        A :data:`DEFAULT_ROUTER_CFG`-shaped block.
+    fam_cfg: Dict
+        The ``families`` block ingestion tagged the chunks with.
+    """
+    scores = score_families(question, fam_cfg)
+    if not scores:
+        return Route(reason="no_match")
+    ranked = sorted(scores, key=scores.__getitem__, reverse=True)
+    best = scores[ranked[0]]
+    picked = [name for name in ranked if scores[name] >= cfg["min_relative"] * best][: cfg["max_families"]]
+    confidence = sum(scores[name] for name in picked) / sum(scores.values())
+    if confidence < cfg["min_share"]:
+        return Route(scores=scores, confidence=confidence, reason="low_confidence")
+    extra = [name for name in _included(cfg, fam_cfg) if name not in picked]
+    return Route(picked + extra, scores, confidence, "routed")
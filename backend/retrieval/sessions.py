@@ -0,0 +1,290 @@
+from __future__ import annotations
+
+"""Server-side conversation sessions with a rolling summary.
+
+With a ``session_id`` the client no longer resends the whole conversation:
+the session keeps the last ``keep_turns`` messages verbatim and folds older
+ones into a short running summary once ``fold_batch`` of them have
+accumulated, so both the request payload and the prompt stay bounded however
+long a clarification dialogue gets.
+
+Folding costs one small LLM call and runs as a background task after the
+answer has been returned; until it finishes the overflowing messages are
+simply still verbatim.  Sessions expire ``ttl_s`` seconds after their last
+turn.  The ``memory`` backend is per process; ``sqlite`` persists across
+restarts and is shared by the workers on one host.  A session this store
+does not know (another worker, a restart, a serverless cold start) is
+seeded from the request's ``history``: clients send only the new question
+with ``resume: true``, the API answers ``409`` for an unknown session, and
+the client repeats the request once with its copy of the conversation.
+"""
+
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Set
+
+from backend.retrieval.context_packer import format_history
+from backend.utils.tokens import truncate_to_tokens
+
+__all__ = [
+    "DEFAULT_SESSION_CFG",
+    "MemorySessionStore",
+    "SQLiteSessionStore",
+    "Session",
+    "SessionStore",
+    "afold_session",
+    "open_session_store",
+]
+
+DEFAULT_SESSION_CFG: Dict[str, Any] = {
+    "backend": "memory",  # "memory" | "sqlite"
+    "path": "local/sessions.sqlite3",
+    "ttl_s": 4 * 3600,
+    "max_sessions": 10_000,  # memory backend only
+    "keep_turns": 6,  # messages kept verbatim (a question + answer is two)
+    "fold_batch": 4,  # fold once this many messages overflow `keep_turns`
+    "summary_max_tokens": 250,
+}
+
+_SUMMARY_PROMPT = (
+    "You maintain the running summary of a conversation between NHS staff and an HR policy assistant. "
+    "Merge the new messages into the summary. Keep what the user told you about themselves (role, band, "
+    "contract, type of leave, dates), what was already answered with its source documents, and any open "
+    "clarification questions. Drop pleasantries. Reply with the updated summary only, at most {words} words."
+)
+
+
+@dataclass
+class Session:
+    id: str
+    summary: str = ""
+    turns: List[Dict[str, str]] = field(default_factory=list)
+    # Messages folded into the summary so far.
+    folded: int = 0
+    updated_at: float = field(default_factory=time.time)
+
+    def history(self) -> List[Dict[str, str]]:
+        """Summary (as a pseudo-turn) followed by the verbatim messages."""
+        head = [{"role": "summary", "content": self.summary}] if self.summary else []
+        return head + list(self.turns)
+
+    @classmethod
+    def from_history(cls, session_id: str, history: List[Dict[str, Any]] | None) -> Session:
+        """A session holding the client's copy of the conversation (the inverse of :meth:`history`).
+
+        Used when *session_id* is unknown to this store – another worker's
+        memory, a restart or an expired entry – so the conversation carries
+        on from what the client sent.
+        """
+        session = cls(session_id)
+        for message in history or []:
+            role, content = message.get("role"), str(message.get("content") or "")
+            if role == "summary":
+                session.summary = content
+            elif role in ("user", "assistant") and content:
+                session.turns.append({"role": role, "content": content})
+        return session
+
+
+class SessionStore:
+    """Base class: TTL-bounded ``id → Session`` mapping plus fold bookkeeping."""
+
+    def __init__(self, ttl_s: float) -> None:
+        self.ttl_s = ttl_s
+        self._lock = threading.Lock()
+        # Serialises read-modify-write of one session (append vs. fold).
+        self._write_lock = threading.Lock()
+        self._folding: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    def get(self, session_id: str) -> Session | None:
+        raise NotImplementedError
+
+    def put(self, session: Session) -> None:
+        raise NotImplementedError
+
+    def delete(self, session_id: str) -> None:
+        raise NotImplementedError
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        for task in list(self._tasks):
+            task.cancel()
+
+    def _expired(self, updated_at: float) -> bool:
+        return time.time() - updated_at > self.ttl_s
+
+    def append(self, session_id: str, question: str, answer: str) -> Session:
+        """Add one question/answer exchange to the stored session."""
+        with self._write_lock:
+            session = self.get(session_id) or Session(session_id)
+            session.turns.append({"role": "user", "content": question})
+            session.turns.append({"role": "assistant", "content": answer})
+            session.updated_at = time.time()
+            self.put(session)
+        return session
+
+    def schedule_fold(self, session: Session, chat_model: Any, cfg: Dict[str, Any]) -> None:
+        """Start :func:`afold_session` in the background if *session* overflows."""
+        if len(session.turns) < cfg["keep_turns"] + cfg["fold_batch"]:
+            return
+        with self._lock:
+            if session.id in self._folding:
+                return
+            self._folding.add(session.id)
+        task = asyncio.get_running_loop().create_task(afold_session(self, session.id, chat_model, cfg))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        task.add_done_callback(lambda _t: self._folding.discard(session.id))
+
+
+class MemorySessionStore(SessionStore):
+    """Per-process store; least recently used sessions go first when full."""
+
+    def __init__(self, *, ttl_s: float, max_sessions: int = 10_000) -> None:
+        super().__init__(ttl_s)
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+
+    def get(self, session_id: str) -> Session | None:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            if self._expired(session.updated_at):
+                del self._sessions[session_id]
+                return None
+            self._sessions.move_to_end(session_id)
+            # Callers mutate their copy and put it back.
+            return Session(**json.loads(json.dumps(asdict(session))))
+
+    def put(self, session: Session) -> None:
+        with self._lock:
+            self._sessions[session.id] = session
+            self._sessions.move_to_end(session.id)
+            while self._sessions:
+                oldest = next(iter(self._sessions.values()))
+                if len(self._sessions) <= self.max_sessions and not self._expired(oldest.updated_at):
+                    break
+                self._sessions.popitem(last=False)
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions as JSON rows in a SQLite file; expired rows are swept on write."""
+
+    _SWEEP_INTERVAL_S = 60.0
+
+    def __init__(self, path: str | Path, *, ttl_s: float) -> None:
+        super().__init__(ttl_s)
+        db_path = Path(path)
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions "
+            "(id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at)")
+        self._db.commit()
+        self._last_sweep = 0.0
+
+    def get(self, session_id: str) -> Session | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data, updated_at FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+        if row is None or self._expired(row[1]):
+            return None
+        return Session(**json.loads(row[0]))
+
+    def put(self, session: Session) -> None:
+        data = json.dumps(asdict(session), ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO sessions (id, data, updated_at) VALUES (?, ?, ?)",
+                (session.id, data, session.updated_at),
+            )
+            if now - self._last_sweep > self._SWEEP_INTERVAL_S:
+                self._db.execute("DELETE FROM sessions WHERE updated_at < ?", (now - self.ttl_s,))
+                self._last_sweep = now
+            self._db.commit()
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            self._db.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            cutoff = time.time() - self.ttl_s
+            return self._db.execute("SELECT COUNT(*) FROM sessions WHERE updated_at >= ?", (cutoff,)).fetchone()[0]
+
+    def close(self) -> None:
+        super().close()
+        with self._lock:
+            self._db.close()
+
+
+def open_session_store(cfg: Dict[str, Any], root: Path) -> SessionStore:
+    """Build the store described by a :data:`DEFAULT_SESSION_CFG`-shaped block."""
+    if cfg["backend"] == "sqlite":
+        return SQLiteSessionStore(root / cfg["path"], ttl_s=cfg["ttl_s"])
+    if cfg["backend"] == "memory":
+        return MemorySessionStore(ttl_s=cfg["ttl_s"], max_sessions=cfg["max_sessions"])
+    raise ValueError(f"Unknown session backend: {cfg['backend']!r}")
+
+
+async def afold_session(store: SessionStore, session_id: str, chat_model: Any, cfg: Dict[str, Any]) -> None:
+    """Fold the messages beyond ``keep_turns`` into the session summary.
+
+    Turns appended while the LLM call is in flight are kept: only the
+    messages that were summarised are removed from the re-read session.
+    Failures leave the session untouched; the next turn retries.
+    """
+    from langchain.schema import HumanMessage, SystemMessage
+
+    session = store.get(session_id)
+    if session is None:
+        return
+    # Fold whole question/answer pairs.
+    n = (len(session.turns) - cfg["keep_turns"]) // 2 * 2
+    if n <= 0:
+        return
+    old = session.turns[:n]
+    words = max(20, int(cfg["summary_max_tokens"] * 0.75))
+    new_messages = format_history(old)
+    try:
+        response = await chat_model.ainvoke(
+            [
+                SystemMessage(content=_SUMMARY_PROMPT.format(words=words)),
+                HumanMessage(content=f"Summary so far:\n{session.summary or '(none)'}\n\nNew messages:\n{new_messages}"),
+            ]
+        )
+    except Exception:  # noqa: BLE001 – best effort, retried on the next turn
+        return
+    summary = truncate_to_tokens(str(response.content).strip(), cfg["summary_max_tokens"])
+
+    with store._write_lock:
+        current = store.get(session_id)
+        if current is None or current.folded != session.folded or current.turns[:n] != old:
+            return
+        current.summary = summary
+        current.turns = current.turns[n:]
+        current.folded += n
+        store.put(current)
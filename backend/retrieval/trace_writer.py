@@ -0,0 +1,269 @@
+from __future__ import annotations
+
+"""Background, batched writer for query traces.
+
+Request handlers only :meth:`TraceWriter.submit` a trace object onto a
+bounded queue; a daemon thread serialises and appends them in batches, so
+JSON encoding and disk I/O stay off the request's latency path.  When the
+queue is full the trace is dropped (and counted) rather than blocking.
+
+The active file is rotated once it exceeds ``max_bytes`` or when the UTC
+day changes; rotated files get a timestamp suffix and are gzipped.  The
+system prompt is the bulk of every record, so records carry only its hash
+and each distinct prompt is written once to ``<stem>.prompts.jsonl`` next
+to the trace file.  :func:`iter_traces` reads rotated and active files back
+in order.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+from dataclasses import asdict, is_dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Set
+
+__all__ = ["DEFAULT_TRACE_CFG", "TraceWriter", "iter_traces", "prompt_hash"]
+
+DEFAULT_TRACE_CFG: Dict[str, Any] = {
+    # Share of requests traced when `enable_tracing` is on; explicit
+    # `trace=True` calls are always recorded.
+    "sample_rate": 1.0,
+    "max_bytes": 64 * 1024 * 1024,
+    "rotate_daily": True,
+    "compress": True,
+    "queue_size": 10_000,
+    "batch_size": 256,
+    "flush_interval_s": 1.0,
+}
+
+_STOP = object()
+
+
+def prompt_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def _prompts_path(path: Path) -> Path:
+    return path.with_name(f"{path.stem}.prompts.jsonl")
+
+
+class TraceWriter:
+    """Append traces to *path* from a background thread.
+
+    Parameters
+    ----------
+    path: str | Path
+        Active JSONL file; rotated files are written next to it.
+    max_bytes: int
+        Rotate once the active file grows beyond this size.
+    rotate_daily: bool
+        Also rotate when the UTC date changes.
+    compress: bool
+        Gzip rotated files.
+    queue_size, batch_size: int
+        Bound of the pending queue and the most records written per batch.
+    flush_interval_s: float
+        Longest a submitted trace waits before it is written.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        *,
+        max_bytes: int = DEFAULT_TRACE_CFG["max_bytes"],
+        rotate_daily: bool = True,
+        compress: bool = True,
+        queue_size: int = DEFAULT_TRACE_CFG["queue_size"],
+        batch_size: int = DEFAULT_TRACE_CFG["batch_size"],
+        flush_interval_s: float = DEFAULT_TRACE_CFG["flush_interval_s"],
+    ) -> None:
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.rotate_daily = rotate_daily
+        self.compress = compress
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=queue_size)
+        self._counts = {"submitted": 0, "written": 0, "dropped": 0, "rotations": 0, "errors": 0}
+        self._lock = threading.Lock()
+        self._known_prompts: Set[str] = set()
+        self._fh = None
+        self._day: str | None = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="meddoc-trace-writer", daemon=True)
+        self._thread.start()
+
+    # ------------------------------------------------------------------
+    # Producer side (request path)
+    # ------------------------------------------------------------------
+
+    def submit(self, trace: Any, system_prompt: str | None = None) -> bool:
+        """Queue *trace* (a dataclass or dict); ``False`` if it was dropped."""
+        with self._lock:
+            self._counts["submitted"] += 1
+        try:
+            self._queue.put_nowait((trace, system_prompt))
+            return True
+        except queue.Full:
+            with self._lock:
+                self._counts["dropped"] += 1
+            return False
+
+    def flush(self, timeout: float | None = 5.0) -> bool:
+        """Block until everything submitted so far is on disk."""
+        done = threading.Event()
+        try:
+            self._queue.put(done, timeout=timeout)
+        except queue.Full:
+            return False
+        return done.wait(timeout)
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Write what is queued, then stop the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            counts = dict(self._counts)
+        counts["pending"] = self._queue.qsize()
+        return counts
+
+    # ------------------------------------------------------------------
+    # Writer thread
+    # ------------------------------------------------------------------
+
+    def _run(self) -> None:
+        stop = False
+        while not stop:
+            batch: List[Any] = []
+            events: List[threading.Event] = []
+            try:
+                item = self._queue.get(timeout=self.flush_interval_s)
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + self.flush_interval_s
+            while True:
+                if item is _STOP:
+                    stop = True
+                elif isinstance(item, threading.Event):
+                    events.append(item)
+                else:
+                    batch.append(item)
+                if stop or len(batch) >= self.batch_size:
+                    break
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()) if not events else 0)
+                except queue.Empty:
+                    break
+            try:
+                if batch:
+                    self._write(batch)
+            except Exception:  # noqa: BLE001 – tracing must never take the service down
+                with self._lock:
+                    self._counts["errors"] += 1
+            for event in events:
+                event.set()
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+    def _write(self, batch: List[Any]) -> None:
+        lines: List[str] = []
+        prompts: List[str] = []
+        for trace, system_prompt in batch:
+            record = asdict(trace) if is_dataclass(trace) else dict(trace)
+            if system_prompt is not None:
+                digest = prompt_hash(system_prompt)
+                record["system_prompt_hash"] = digest
+                if digest not in self._known_prompts:
+                    self._known_prompts.add(digest)
+                    prompts.append(json.dumps({"hash": digest, "text": system_prompt}, ensure_ascii=False))
+            lines.append(json.dumps(record, ensure_ascii=False))
+
+        if prompts:
+            with _prompts_path(self.path).open("a", encoding="utf-8") as fh:
+                fh.write("\n".join(prompts) + "\n")
+        fh = self._open()
+        fh.write("\n".join(lines) + "\n")
+        fh.flush()
+        with self._lock:
+            self._counts["written"] += len(lines)
+        if fh.tell() >= self.max_bytes:
+            self._rotate()
+
+    def _open(self):
+        today = datetime.now(timezone.utc).strftime("%Y%m%d")
+        if self._fh is not None and self.rotate_daily and self._day != today:
+            self._rotate()
+        if self._fh is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            if not self._known_prompts:
+                self._known_prompts = {rec["hash"] for rec in _read_jsonl(_prompts_path(self.path))}
+            if self.path.exists() and self.path.stat().st_size:
+                # Resume the active file only if it belongs to today.
+                mtime = datetime.fromtimestamp(self.path.stat().st_mtime, timezone.utc).strftime("%Y%m%d")
+                if self.rotate_daily and mtime != today:
+                    self._rotate(day=mtime)
+            self._fh = self.path.open("a", encoding="utf-8")
+            self._day = today
+        return self._fh
+
+    def _rotate(self, day: str | None = None) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+        if not self.path.exists() or not self.path.stat().st_size:
+            return
+        stamp = f"{day or self._day or 'unknown'}-{datetime.now(timezone.utc).strftime('%H%M%S%f')}"
+        rotated = self.path.with_name(f"{self.path.stem}-{stamp}{self.path.suffix}")
+        os.replace(self.path, rotated)
+        if self.compress:
+            with rotated.open("rb") as src, gzip.open(f"{rotated}.gz", "wb", compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst)
+            rotated.unlink()
+        with self._lock:
+            self._counts["rotations"] += 1
+
+
+def _read_jsonl(path: Path) -> Iterator[Dict[str, Any]]:
+    if not path.exists():
+        return
+    opener = gzip.open if path.suffix == ".gz" else open
+    with opener(path, "rt", encoding="utf-8") as fh:
+        for line in fh:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def iter_traces(path: str | Path, *, with_system_prompt: bool = False) -> Iterator[Dict[str, Any]]:
+    """Yield the records of rotated (oldest first) and active trace files.
+
+    With *with_system_prompt* the hashed system prompt is inlined back into
+    ``prompt`` as it was before hashing.
+    """
+    path = Path(path)
+    prompts: Dict[str, str] = {}
+    if with_system_prompt:
+        prompts = {rec["hash"]: rec["text"] for rec in _read_jsonl(_prompts_path(path))}
+    rotated = sorted(path.parent.glob(f"{path.stem}-*{path.suffix}*"))
+    for file in [*rotated, path]:
+        for record in _read_jsonl(file):
+            digest = record.get("system_prompt_hash")
+            if digest in prompts:
+                record["prompt"] = f"{prompts[digest]}\n\n{record.get('prompt', '')}"
+            yield record
@@ -1,3 +1,5 @@
 """Utility helpers used across backend modules."""
 
 from backend.utils.config_utils import deep_update, load_config  # noqa: F401
+from backend.utils.embedding_cache import EmbeddingCache  # noqa: F401
+from backend.utils.tokens import count_tokens, truncate_to_tokens  # noqa: F401
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+"""Two-tier embedding cache: bounded in-memory LRU over a SQLite file.
+
+Vectors are keyed on a SHA-256 of the embedding model name and the
+*normalised* text, so the same question asked with different capitalisation
+or spacing hits the same entry, while switching embedding model never
+returns a stale vector.  The SQLite tier survives restarts and is shared by
+every worker on the host.
+"""
+
+import hashlib
+import re
+import sqlite3
+import threading
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Sequence
+
+__all__ = ["EmbeddingCache", "normalise_question", "normalise_text"]
+
+Vector = List[float]
+
+_WS_RE = re.compile(r"\s+")
+
+
+def normalise_text(text: str) -> str:
+    """Collapse runs of whitespace and strip the ends."""
+    return _WS_RE.sub(" ", text).strip()
+
+
+def normalise_question(text: str) -> str:
+    """Case-fold and drop trailing punctuation on top of :func:`normalise_text`."""
+    return normalise_text(text).casefold().rstrip("?!. ")
+
+
+class EmbeddingCache:
+    """Look up embeddings in memory first, then on disk.
+
+    Parameters
+    ----------
+    path: Path | None
+        SQLite file for the persistent tier; ``None`` keeps the cache purely
+        in memory.
+    max_entries: int
+        Capacity of the in-memory LRU tier.
+    normalise: Callable[[str], str]
+        Applied to the text before hashing.
+    """
+
+    def __init__(
+        self,
+        path: str | Path | None = None,
+        *,
+        max_entries: int = 2048,
+        normalise: Callable[[str], str] = normalise_question,
+    ) -> None:
+        self.max_entries = max_entries
+        self._normalise = normalise
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, Vector]" = OrderedDict()
+        self._counts = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self._db: sqlite3.Connection | None = None
+        if path is not None:
+            db_path = Path(path)
+            db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+            self._db.commit()
+
+    def key(self, text: str, model: str) -> str:
+        blob = f"{model}\0{self._normalise(text)}".encode("utf-8")
+        return hashlib.sha256(blob).hexdigest()
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def get(self, text: str, model: str) -> Vector | None:
+        """Return the cached vector for *text* or ``None``."""
+        return self.get_many([text], model)[0]
+
+    def get_many(self, texts: Sequence[str], model: str) -> List[Vector | None]:
+        """Vectorised :meth:`get`; one SQL round trip for all memory misses."""
+        keys = [self.key(t, model) for t in texts]
+        found: Dict[str, Vector] = {}
+        with self._lock:
+            for k in keys:
+                vec = self._memory.get(k)
+                if vec is not None:
+                    self._memory.move_to_end(k)
+                    found[k] = vec
+            self._counts["memory_hits"] += len(found)
+
+            pending = [k for k in dict.fromkeys(keys) if k not in found]
+            if pending and self._db is not None:
+                for start in range(0, len(pending), 500):
+                    batch = pending[start:start + 500]
+                    rows = self._db.execute(
+                        f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                        batch,
+                    ).fetchall()
+                    for k, blob in rows:
+                        vec = array("f", blob).tolist()
+                        found[k] = vec
+                        self._remember(k, vec)
+                        self._counts["disk_hits"] += 1
+
+            self._counts["misses"] += sum(1 for k in keys if k not in found)
+        return [found.get(k) for k in keys]
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def put(self, text: str, model: str, vector: Sequence[float]) -> None:
+        self.put_many([text], model, [vector])
+
+    def put_many(self, texts: Sequence[str], model: str, vectors: Sequence[Sequence[float]]) -> None:
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                k = self.key(text, model)
+                vec = list(vector)
+                self._remember(k, vec)
+                rows.append((k, array("f", vec).tobytes()))
+            if self._db is not None and rows:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows
+                )
+                self._db.commit()
+
+    def _remember(self, key: str, vector: Vector) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    # ------------------------------------------------------------------
+    # Housekeeping
+    # ------------------------------------------------------------------
+
+    def stats(self) -> Dict[str, float | int]:
+        with self._lock:
+            counts = dict(self._counts)
+            counts["memory_entries"] = len(self._memory)
+        lookups = counts["memory_hits"] + counts["disk_hits"] + counts["misses"]
+        counts["hit_rate"] = round((lookups - counts["misses"]) / lookups, 3) if lookups else 0.0
+        return counts
+
+    def close(self) -> None:
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+"""Document families: which part of the policy corpus a chunk belongs to.
+
+Ingestion tags every chunk with a ``family`` – leave, pay, sickness,
+conduct, … – stored in its metadata next to ``filename`` and ``pdf_hash``.
+Retrieval uses the same vocabulary to route a question to the families it
+is likely about (see ``backend/retrieval/router.py``), and the vector store
+can keep one shard per family (``vector_store.shard_by_family``).
+
+A family is a list of keywords matched as word prefixes ("sick" matches
+"sickness"; "annual leave" matches the phrase).  A chunk takes the family
+of its file name when that is conclusive ("Maternity-Leave-Policy.pdf"),
+otherwise that of its section heading (chapters of a handbook), otherwise
+``default``.  Both ingestion and retrieval must use the same ``families``
+block, or routed searches will miss chunks.
+"""
+
+import re
+from functools import lru_cache
+from typing import Any, Dict, List, Sequence, Tuple
+
+__all__ = ["DEFAULT_FAMILY_CFG", "chunk_family", "family_cfg", "family_names", "score_families"]
+
+DEFAULT_FAMILY_CFG: Dict[str, Any] = {
+    "enabled": True,
+    # Family of chunks no keyword matches (general handbook text, contents).
+    "default": "general",
+    "keywords": {
+        "leave": [
+            "leave", "annual leave", "holiday", "maternity", "paternity", "adoption", "parental",
+            "carer", "compassionate", "bereavement", "career break", "sabbatical", "time off", "jury",
+        ],
+        "pay": [
+            "pay", "salar", "payroll", "overtime", "allowance", "expenses", "pension", "banding",
+            "increment", "agenda for change", "relocation", "enhancement", "mileage",
+        ],
+        "sickness": [
+            "sick", "absence", "absent", "illness", "occupational health", "attendance", "fit note",
+            "phased return", "return to work",
+        ],
+        "conduct": [
+            "conduct", "disciplin", "grievance", "bullying", "harassment", "dignity", "capability",
+            "whistleblow", "raising concerns", "freedom to speak", "suspension", "dismissal",
+        ],
+        "recruitment": [
+            "recruit", "appointment", "vacanc", "interview", "induction", "probation", "reference",
+            "dbs", "new starter", "onboarding",
+        ],
+        "working_time": [
+            "flexible working", "rota", "shift", "working time", "on call", "hours", "home working",
+            "remote working", "retire",
+        ],
+        "safety": [
+            "health and safety", "risk assess", "incident", "lone work", "violence", "aggression",
+            "infection", "manual handling",
+        ],
+    },
+}
+
+_SPLIT_RE = re.compile(r"[_\-.]+|(?<=[a-z])(?=[A-Z])")
+
+
+def family_cfg(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    """The ``families`` block of *cfg* over :data:`DEFAULT_FAMILY_CFG`."""
+    return {**DEFAULT_FAMILY_CFG, **(cfg.get("families") or {})}
+
+
+def family_names(fam_cfg: Dict[str, Any]) -> List[str]:
+    """Every family chunks can be tagged with, ``default`` last."""
+    return [name for name in fam_cfg["keywords"] if name != fam_cfg["default"]] + [fam_cfg["default"]]
+
+
+@lru_cache(maxsize=32)
+def _patterns(keywords: Tuple[Tuple[str, Tuple[str, ...]], ...]) -> List[Tuple[str, re.Pattern[str]]]:
+    return [
+        (name, re.compile(r"(?<![a-z0-9])(" + "|".join(re.escape(w).replace(r"\ ", r"\s+") for w in words) + ")"))
+        for name, words in keywords
+    ]
+
+
+def score_families(text: str, fam_cfg: Dict[str, Any]) -> Dict[str, int]:
+    """Distinct keywords of each family found in *text*; families without a match are omitted."""
+    text = _SPLIT_RE.sub(" ", text).lower()
+    keywords = tuple((name, tuple(words)) for name, words in fam_cfg["keywords"].items())
+    scores: Dict[str, int] = {}
+    for name, pattern in _patterns(keywords):
+        found = {match.lower() for match in pattern.findall(text)}
+        if found:
+            scores[name] = len(found)
+    return scores
+
+
+def _best(text: str, fam_cfg: Dict[str, Any]) -> str | None:
+    scores = score_families(text, fam_cfg)
+    # Ties go to the family listed first.
+    return max(scores, key=scores.__getitem__) if scores else None
+
+
+def chunk_family(filename: str, headings: Sequence[str], fam_cfg: Dict[str, Any]) -> str:
+    """Family of a chunk of *filename* under *headings* (innermost last)."""
+    family = _best(filename.rsplit(".", 1)[0], fam_cfg)
+    for heading in reversed(headings):
+        if family is not None:
+            break
+        family = _best(heading, fam_cfg)
+    return family or fam_cfg["default"]
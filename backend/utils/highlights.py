@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+"""Per-chunk highlight index: page, bounding boxes and a short snippet.
+
+Ingestion condenses the coordinates of a chunk's source elements into a
+compact JSON string stored in the chunk's metadata under ``highlight``
+(Chroma metadata values must be scalars)::
+
+    {"p": 37, "b": [[37, 0.1176, 0.2020, 0.8824, 0.3131], ...], "s": "Adoption leave is ..."}
+
+Boxes are ``[page, x0, y0, x1, y1]`` as fractions of the page size with the
+origin at the top left, so the frontend can overlay them at any zoom.  At
+query time the retrieved chunks already carry this metadata, and
+:func:`attach_highlights` fills in ``text`` and ``boxes`` of each cited
+source with a dictionary lookup – the request path never opens a PDF.
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Mapping, Sequence, Tuple
+
+__all__ = ["DEFAULT_HIGHLIGHT_CFG", "attach_highlights", "chunk_highlight", "snippet"]
+
+DEFAULT_HIGHLIGHT_CFG: Dict[str, Any] = {
+    "enabled": True,
+    "max_boxes": 16,
+    "snippet_chars": 240,
+}
+
+_WS_RE = re.compile(r"\s+")
+
+
+def snippet(text: str, max_chars: int = DEFAULT_HIGHLIGHT_CFG["snippet_chars"]) -> str:
+    """First *max_chars* of *text* with whitespace collapsed, cut at a word."""
+    text = _WS_RE.sub(" ", text).strip()
+    if len(text) <= max_chars:
+        return text
+    cut = text.rfind(" ", 0, max_chars)
+    return text[: cut if cut > max_chars // 2 else max_chars].rstrip() + "…"
+
+
+def _box(meta: Mapping[str, Any]) -> List[float] | None:
+    """Normalised ``[page, x0, y0, x1, y1]`` of one element, if it has coordinates."""
+    coords = meta.get("coordinates") or {}
+    points = coords.get("points")
+    width, height = coords.get("layout_width"), coords.get("layout_height")
+    page = meta.get("page_number")
+    if not points or not width or not height or not page:
+        return None
+    xs = [float(x) for x, _ in points]
+    ys = [float(y) for _, y in points]
+    y0, y1 = min(ys) / height, max(ys) / height
+    if coords.get("system") == "PointSpace":
+        # Cartesian PDF points: origin at the bottom left.
+        y0, y1 = 1 - y1, 1 - y0
+    clamp = lambda v: round(min(1.0, max(0.0, v)), 4)  # noqa: E731
+    return [page, clamp(min(xs) / width), clamp(y0), clamp(max(xs) / width), clamp(y1)]
+
+
+def chunk_highlight(
+    text: str,
+    page: int | None,
+    element_metadata: Sequence[Mapping[str, Any]],
+    cfg: Mapping[str, Any] = DEFAULT_HIGHLIGHT_CFG,
+) -> str:
+    """Encode the highlight entry of one chunk.
+
+    Parameters
+    ----------
+    text: str
+        Chunk text (the snippet is taken from it).
+    page: int | None
+        The chunk's ``page_number``.
+    element_metadata: Sequence[Mapping]
+        ``metadata.to_dict()`` of the elements the chunk was built from.
+    cfg: Mapping
+        A :data:`DEFAULT_HIGHLIGHT_CFG`-shaped block.
+    """
+    boxes = [box for box in map(_box, element_metadata) if box is not None]
+    entry: Dict[str, Any] = {"p": page, "b": boxes[: cfg["max_boxes"]], "s": snippet(text, cfg["snippet_chars"])}
+    return json.dumps(entry, ensure_ascii=False, separators=(",", ":"))
+
+
+def _decode(meta: Mapping[str, Any], text: str) -> Dict[str, Any]:
+    try:
+        entry = json.loads(meta["highlight"])
+    except (KeyError, TypeError, ValueError):
+        # Chunk ingested before the index existed: no boxes, snippet from the text.
+        entry = {"p": meta.get("page_number"), "b": [], "s": snippet(text)}
+    return entry
+
+
+def attach_highlights(sources: Sequence[Dict[str, Any]], docs: Sequence[Any]) -> List[Dict[str, Any]]:
+    """Fill ``text`` and ``boxes`` of each cited source from the retrieved *docs*.
+
+    A source matches the best-ranked chunk of the same file whose page (or
+    one of whose boxes) is the cited page; its boxes on that page are
+    returned as ``[x0, y0, x1, y1]``.  Sources without a match are returned
+    unchanged.
+    """
+    by_page: Dict[Tuple[str, Any], Dict[str, Any]] = {}
+    by_file: Dict[str, Dict[str, Any]] = {}
+    for doc in docs:
+        meta = doc.metadata or {}
+        filename = meta.get("filename")
+        entry = _decode(meta, doc.page_content)
+        pages = {entry.get("p")} | {box[0] for box in entry["b"]}
+        for page in pages:
+            by_page.setdefault((filename, page), entry)
+        by_file.setdefault(filename, entry)
+
+    enriched = []
+    for source in sources:
+        page = source.get("page")
+        if isinstance(page, str) and page.isdigit():
+            page = int(page)
+        entry = by_page.get((source.get("file"), page)) if page is not None else by_file.get(source.get("file"))
+        if entry is None:
+            enriched.append(source)
+            continue
+        page = page if page is not None else entry.get("p")
+        enriched.append(
+            {
+                **source,
+                "page": page,
+                "text": source.get("text") or entry["s"],
+                "boxes": [box[1:] for box in entry["b"] if box[0] == page],
+            }
+        )
+    return enriched
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+"""Prometheus histograms for pipeline stage latencies.
+
+``prometheus-client`` is listed in the requirements, but the helpers
+degrade to no-ops without it so scripts and notebooks never depend on it.
+Metrics live in the default registry of each process; with several
+uvicorn workers every worker serves its own ``/metrics``.
+"""
+
+from typing import Tuple
+
+from backend.utils.timing import Timings
+
+try:
+    import prometheus_client
+except ImportError:  # pragma: no cover – optional at runtime
+    prometheus_client = None
+
+__all__ = ["metrics_available", "observe", "observe_stage", "render_metrics"]
+
+# From 1 ms (cache hits, BM25) up to 2 min (a slow LLM or a large PDF).
+_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+if prometheus_client is not None:
+    _STAGE_SECONDS = prometheus_client.Histogram(
+        "meddoc_stage_seconds",
+        "Duration of one pipeline stage",
+        ["pipeline", "stage"],
+        buckets=_BUCKETS,
+    )
+    _TOTAL_SECONDS = prometheus_client.Histogram(
+        "meddoc_request_seconds",
+        "End-to-end duration of one pipeline run",
+        ["pipeline"],
+        buckets=_BUCKETS,
+    )
+
+
+def metrics_available() -> bool:
+    return prometheus_client is not None
+
+
+def observe_stage(pipeline: str, stage: str, seconds: float) -> None:
+    if prometheus_client is not None:
+        _STAGE_SECONDS.labels(pipeline, stage).observe(seconds)
+
+
+def observe(pipeline: str, timings: Timings) -> None:
+    """Record every span of *timings* and its total under *pipeline*."""
+    if prometheus_client is None:
+        return
+    for stage, seconds in timings.spans.items():
+        _STAGE_SECONDS.labels(pipeline, stage).observe(seconds)
+    _TOTAL_SECONDS.labels(pipeline).observe(timings.elapsed())
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """Return ``(body, content_type)`` in the Prometheus text format."""
+    if prometheus_client is None:
+        raise RuntimeError("prometheus-client is not installed")
+    return prometheus_client.generate_latest(), prometheus_client.CONTENT_TYPE_LATEST
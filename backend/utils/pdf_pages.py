@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+"""Single pages of the policy PDFs, extracted or rendered once and cached.
+
+A citation only needs the page it points at, but the handbook PDFs run to
+100+ pages.  :class:`PageCache` cuts a page (or a short page range) out into
+a small PDF, or renders one page to PNG/WebP, and keeps the result on disk
+under ``<root>/<pdf_hash>/`` so every later request is a plain file read.
+Keys use the SHA-256 of the source file (the ``pdf_hash`` ingestion stores
+in chunk metadata), so a replaced PDF never serves stale pages; the cache
+is bounded by ``max_bytes`` and evicts the least recently served files.
+
+PyMuPDF is imported on first render; WebP output also needs Pillow.
+"""
+
+import hashlib
+import os
+import threading
+import uuid
+from pathlib import Path
+from typing import Dict, Tuple
+
+__all__ = ["MEDIA_TYPES", "PageCache", "PageOutOfRange", "file_hash", "render_pages"]
+
+MEDIA_TYPES: Dict[str, str] = {"pdf": "application/pdf", "png": "image/png", "webp": "image/webp"}
+
+_hash_lock = threading.Lock()
+_hashes: Dict[Tuple[str, int, int], str] = {}
+
+
+class PageOutOfRange(ValueError):
+    """The requested pages are not in the document."""
+
+
+def file_hash(path: Path) -> str:
+    """SHA-256 of *path*, memoised on (path, mtime, size)."""
+    st = path.stat()
+    key = (str(path), st.st_mtime_ns, st.st_size)
+    with _hash_lock:
+        digest = _hashes.get(key)
+    if digest is None:
+        sha = hashlib.sha256()
+        with path.open("rb") as fh:
+            for chunk in iter(lambda: fh.read(1 << 20), b""):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        with _hash_lock:
+            _hashes[key] = digest
+    return digest
+
+
+def render_pages(pdf_path: Path, first: int, last: int, fmt: str, dpi: int = 144) -> bytes:
+    """Pages *first*..*last* (1-based, inclusive) of *pdf_path* as *fmt* bytes.
+
+    ``pdf`` keeps the range as a standalone PDF (text stays selectable);
+    ``png`` and ``webp`` render the single page *first* at *dpi*.
+    """
+    import fitz  # PyMuPDF
+
+    with fitz.open(pdf_path) as src:
+        if not 1 <= first <= last <= src.page_count:
+            raise PageOutOfRange(f"{pdf_path.name} has {src.page_count} pages")
+        if fmt == "pdf":
+            with fitz.open() as out:
+                out.insert_pdf(src, from_page=first - 1, to_page=last - 1)
+                # no_new_id: identical input gives identical bytes (strong ETags).
+                return out.tobytes(garbage=3, deflate=True, no_new_id=True)
+        pixmap = src[first - 1].get_pixmap(dpi=dpi)
+        if fmt == "png":
+            return pixmap.tobytes("png")
+        if fmt == "webp":
+            return pixmap.pil_tobytes(format="WEBP", quality=80)
+    raise ValueError(f"Unsupported page format: {fmt!r}")
+
+
+class PageCache:
+    """Disk cache of :func:`render_pages` output.
+
+    Parameters
+    ----------
+    root: str | Path
+        Cache directory; one sub-directory per source ``pdf_hash``.
+    max_bytes: int
+        Once the files exceed this size the least recently served ones are
+        deleted until the cache is back under 90 % of it.
+    """
+
+    def __init__(self, root: str | Path, *, max_bytes: int = 512 * 1024 * 1024) -> None:
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size: int | None = None  # measured on the first write
+
+    @staticmethod
+    def key(pdf_hash: str, first: int, last: int, fmt: str, dpi: int) -> str:
+        """File name of one entry; also its (strong) ETag."""
+        if fmt == "pdf":
+            return f"{pdf_hash[:32]}-p{first}-{last}.pdf"
+        return f"{pdf_hash[:32]}-p{first}@{dpi}.{fmt}"
+
+    def get(self, pdf_path: Path, first: int, last: int, fmt: str, dpi: int) -> Tuple[Path, str]:
+        """Return ``(cached file, key)``, rendering the pages on a miss."""
+        pdf_hash = file_hash(pdf_path)
+        key = self.key(pdf_hash, first, last, fmt, dpi)
+        path = self.root / pdf_hash[:32] / key
+        try:
+            os.utime(path)  # mark as recently served
+            return path, key
+        except FileNotFoundError:
+            pass
+
+        data = render_pages(pdf_path, first, last, fmt, dpi)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{key}.{uuid.uuid4().hex}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        self._account(len(data))
+        return path, key
+
+    def _account(self, added: int) -> None:
+        with self._lock:
+            if self._size is None:
+                self._size = sum(f.stat().st_size for f in self.root.rglob("*") if f.is_file())
+            else:
+                self._size += added
+            if self._size <= self.max_bytes:
+                return
+            files = []
+            for f in self.root.rglob("*"):
+                try:
+                    st = f.stat()
+                except FileNotFoundError:
+                    continue
+                if f.is_file():
+                    files.append((st.st_mtime, st.st_size, f))
+            files.sort()
+            size = sum(s for _, s, _ in files)
+            for _, file_size, f in files:
+                if size <= self.max_bytes * 0.9:
+                    break
+                f.unlink(missing_ok=True)
+                size -= file_size
+            self._size = size
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+"""Minimal span timing for request and ingestion stages.
+
+A :class:`Timings` collects wall-clock durations per stage name (repeated
+spans of one name add up).  It costs two ``perf_counter`` calls and a dict
+update per span, so it stays on in production; the collected durations go
+into the query trace, the Prometheus histograms (:mod:`backend.utils.metrics`)
+and the ``Server-Timing`` response header.
+"""
+
+import time
+from typing import Dict, Sequence
+
+__all__ = ["Timings", "percentiles"]
+
+
+def percentiles(values_s: Sequence[float], pcts: Sequence[int] = (50, 95, 99)) -> Dict[str, float | None]:
+    """Nearest-rank percentiles of *values_s* (seconds) in milliseconds, e.g. ``{"p50": 12.3}``."""
+    ordered = sorted(values_s)
+    result: Dict[str, float | None] = {}
+    for pct in pcts:
+        if not ordered:
+            result[f"p{pct}"] = None
+            continue
+        idx = min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))
+        result[f"p{pct}"] = round(ordered[idx] * 1000, 1)
+    return result
+
+
+class _Span:
+    __slots__ = ("_timings", "_name", "_t0")
+
+    def __init__(self, timings: "Timings", name: str) -> None:
+        self._timings = timings
+        self._name = name
+
+    def __enter__(self) -> "_Span":
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._timings.add(self._name, time.perf_counter() - self._t0)
+
+
+class Timings:
+    """Stage name → accumulated seconds, in the order stages first ran."""
+
+    __slots__ = ("spans", "started")
+
+    def __init__(self) -> None:
+        self.spans: Dict[str, float] = {}
+        self.started = time.perf_counter()
+
+    def span(self, name: str) -> _Span:
+        """Context manager timing the enclosed block as stage *name*."""
+        return _Span(self, name)
+
+    def add(self, name: str, seconds: float) -> None:
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def as_ms(self) -> Dict[str, float]:
+        return {name: round(seconds * 1000, 2) for name, seconds in self.spans.items()}
+
+    def server_timing(self) -> str:
+        """Value for the ``Server-Timing`` header, with the total last."""
+        parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.spans.items()]
+        parts.append(f"total;dur={self.elapsed() * 1000:.1f}")
+        return ", ".join(parts)
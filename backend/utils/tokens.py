@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+"""Token counting shared by ingestion (batch packing) and retrieval (prompt budgets)."""
+
+from typing import Any
+
+__all__ = ["count_tokens", "truncate_to_tokens"]
+
+_encoder: Any = None
+
+
+def _get_encoder() -> Any:
+    global _encoder
+    if _encoder is None:
+        try:
+            import tiktoken
+
+            _encoder = tiktoken.get_encoding("cl100k_base")
+        except Exception:  # noqa: BLE001 – offline or tiktoken missing
+            _encoder = False
+    return _encoder
+
+
+def count_tokens(text: str) -> int:
+    """Return the ``cl100k_base`` token count of *text* (≈ chars/4 fallback)."""
+    encoder = _get_encoder()
+    if encoder is False:
+        return max(1, len(text) // 4)
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Return the longest prefix of *text* that fits in *max_tokens*."""
+    if max_tokens <= 0:
+        return ""
+    encoder = _get_encoder()
+    if encoder is False:
+        return text[: max_tokens * 4]
+    tokens = encoder.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoder.decode(tokens[:max_tokens])
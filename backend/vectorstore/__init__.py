@@ -0,0 +1,9 @@
+"""Vector-store backends (Chroma server or embedded memmap index) and the BM25 index."""
+
+from backend.vectorstore.base import AsyncVectorStore, VectorStore  # noqa: F401
+from backend.vectorstore.factory import (  # noqa: F401
+    DEFAULT_LEXICAL_CFG, DEFAULT_VECTOR_STORE_CFG, aopen_vector_store, collection_name, corpus_fingerprint,
+    open_lexical_index, open_vector_store, read_corpus_version, target_name, write_corpus_version)
+from backend.vectorstore.lexical import LexicalHit, LexicalIndex, tokenize  # noqa: F401
+from backend.vectorstore.local import AsyncLocalVectorStore, LocalVectorStore  # noqa: F401
+from backend.vectorstore.sharded import AsyncShardedVectorStore, ShardedVectorStore  # noqa: F401
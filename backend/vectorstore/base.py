@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+"""The vector-store interface shared by ingestion and retrieval.
+
+The interface is deliberately the subset of the ``chromadb`` collection API
+that MedDoc already uses, with the same argument names and result shapes, so
+a Chroma collection *is* a :class:`VectorStore` and the rest of the code does
+not care which backend it talks to.
+"""
+
+from typing import Any, Dict, List, Protocol, Sequence, runtime_checkable
+
+__all__ = ["AsyncVectorStore", "VectorStore", "Where"]
+
+# Chroma-style metadata filter, e.g. {"pdf_hash": "…"} or
+# {"$and": [{"filename": {"$in": [...]}}, {"page_number": {"$ne": 1}}]}.
+Where = Dict[str, Any]
+
+
+@runtime_checkable
+class VectorStore(Protocol):
+    """Blocking vector store, used by ingestion and scripts."""
+
+    def count(self) -> int: ...
+
+    def query(
+        self,
+        query_embeddings: Sequence[Sequence[float]],
+        n_results: int = 10,
+        where: Where | None = None,
+        include: Sequence[str] = ("documents", "metadatas", "distances"),
+    ) -> Dict[str, List[List[Any]]]: ...
+
+    def get(
+        self,
+        ids: Sequence[str] | None = None,
+        where: Where | None = None,
+        limit: int | None = None,
+        include: Sequence[str] = ("documents", "metadatas"),
+    ) -> Dict[str, List[Any]]: ...
+
+    def upsert(
+        self,
+        ids: Sequence[str],
+        embeddings: Sequence[Sequence[float]],
+        documents: Sequence[str],
+        metadatas: Sequence[Dict[str, Any]],
+    ) -> None: ...
+
+    def update(self, ids: Sequence[str], metadatas: Sequence[Dict[str, Any]]) -> None: ...
+
+    def delete(self, ids: Sequence[str]) -> None: ...
+
+
+@runtime_checkable
+class AsyncVectorStore(Protocol):
+    """Awaitable read side used on the request path."""
+
+    async def query(
+        self,
+        query_embeddings: Sequence[Sequence[float]],
+        n_results: int = 10,
+        where: Where | None = None,
+        include: Sequence[str] = ("documents", "metadatas", "distances"),
+    ) -> Dict[str, List[List[Any]]]: ...
+
+    async def get(
+        self,
+        ids: Sequence[str] | None = None,
+        where: Where | None = None,
+        limit: int | None = None,
+        include: Sequence[str] = ("documents", "metadatas"),
+    ) -> Dict[str, List[Any]]: ...
@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+"""Open the configured vector store.
+
+Both ingestion and retrieval read the same two config blocks::
+
+    vector_store:
+      backend: chroma        # or "local"
+      path: local/vector_index
+      shard_by_family: false
+    chroma:
+      collection_name: documents
+    lexical_index:
+      enabled: true
+      path: local/lexical/{target}.json.gz
+
+``chroma`` talks to the Chroma server at ``CHROMA_HOST``/``CHROMA_PORT``;
+``local`` opens the memory-mapped index under ``path`` (relative to the
+repository root), read-only unless the caller is going to write to it.
+The BM25 index lives next to whichever store it mirrors; ``{target}`` in
+its path is replaced by :func:`target_name`.  So does the corpus version
+(``vector_store.version_path``): a fingerprint of the ingested ``pdf_hash``
+set that ingestion writes after every run, so retrieval can tell the
+corpus changed without reading every chunk's metadata.
+
+With ``shard_by_family`` each document family (``families`` block, see
+``backend/utils/families.py``) is stored separately – in the collection
+``<collection_name>-<family>`` or the index ``<path>/<family>`` – behind a
+:class:`~backend.vectorstore.sharded.ShardedVectorStore`.
+"""
+
+import hashlib
+import os
+from pathlib import Path
+from typing import Any, Dict, Iterable
+
+from backend import ROOT_DIR
+from backend.utils.families import family_cfg, family_names
+from backend.vectorstore.base import AsyncVectorStore, VectorStore
+from backend.vectorstore.lexical import LexicalIndex
+from backend.vectorstore.local import LocalVectorStore
+from backend.vectorstore.sharded import AsyncShardedVectorStore, ShardedVectorStore
+
+__all__ = [
+    "DEFAULT_LEXICAL_CFG",
+    "DEFAULT_VECTOR_STORE_CFG",
+    "aopen_vector_store",
+    "collection_name",
+    "corpus_fingerprint",
+    "open_lexical_index",
+    "open_vector_store",
+    "read_corpus_version",
+    "target_name",
+    "write_corpus_version",
+]
+
+DEFAULT_VECTOR_STORE_CFG: Dict[str, Any] = {
+    "backend": "chroma",
+    "path": "local/vector_index",
+    # One collection / index per document family; queries routed to a
+    # family only search its shard.
+    "shard_by_family": False,
+    # Written by ingestion, read by the answer cache; `{target}` as below.
+    "version_path": "local/cache/corpus_version-{target}.txt",
+}
+
+DEFAULT_LEXICAL_CFG: Dict[str, Any] = {
+    "enabled": True,
+    "path": "local/lexical/{target}.json.gz",
+    # Readers stat the file at most this often and reload it off the event loop.
+    "refresh_interval_s": 30.0,
+}
+
+
+def _store_cfg(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    store_cfg = {**DEFAULT_VECTOR_STORE_CFG, **cfg.get("vector_store", {})}
+    if store_cfg["backend"] not in ("chroma", "local"):
+        raise ValueError(f"Unknown vector store backend: {store_cfg['backend']!r}")
+    return store_cfg
+
+
+def collection_name(cfg: Dict[str, Any]) -> str:
+    return cfg.get("chroma", {}).get("collection_name", "documents")
+
+
+def target_name(cfg: Dict[str, Any]) -> str:
+    """Short name of the configured store, e.g. ``chroma-documents``."""
+    store_cfg = _store_cfg(cfg)
+    if store_cfg["backend"] == "local":
+        return "local-" + Path(store_cfg["path"]).name
+    return "chroma-" + collection_name(cfg)
+
+
+def open_lexical_index(cfg: Dict[str, Any]) -> LexicalIndex | None:
+    """Return the BM25 index mirroring the configured store, or ``None`` if disabled."""
+    lex_cfg = {**DEFAULT_LEXICAL_CFG, **cfg.get("lexical_index", {})}
+    if not lex_cfg["enabled"]:
+        return None
+    return LexicalIndex(
+        ROOT_DIR / lex_cfg["path"].format(target=target_name(cfg)),
+        refresh_interval_s=lex_cfg["refresh_interval_s"],
+    )
+
+
+def corpus_fingerprint(pdf_hashes: Iterable[str]) -> str:
+    """Return a fingerprint of the distinct *pdf_hashes*."""
+    hashes = sorted(set(pdf_hashes))
+    digest = hashlib.sha256("\n".join(hashes).encode("utf-8")).hexdigest()[:12]
+    return f"{len(hashes)}:{digest}"
+
+
+def _version_path(cfg: Dict[str, Any]) -> Path:
+    return ROOT_DIR / _store_cfg(cfg)["version_path"].format(target=target_name(cfg))
+
+
+def read_corpus_version(cfg: Dict[str, Any]) -> str | None:
+    """The corpus version ingestion last wrote for *cfg*, or ``None`` if there is none."""
+    try:
+        return _version_path(cfg).read_text(encoding="utf-8").strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def write_corpus_version(cfg: Dict[str, Any], version: str) -> None:
+    """Record *version* for *cfg*; written atomically, readers never see a partial file."""
+    path = _version_path(cfg)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(version + "\n", encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _chroma_address() -> Dict[str, Any]:
+    return {"host": os.getenv("CHROMA_HOST", "localhost"), "port": int(os.getenv("CHROMA_PORT", "8000"))}
+
+
+def _shards(cfg: Dict[str, Any]) -> list[str]:
+    """Family shards of *cfg*, or an empty list when the store is not sharded."""
+    if not _store_cfg(cfg)["shard_by_family"]:
+        return []
+    return family_names(family_cfg(cfg))
+
+
+def open_vector_store(cfg: Dict[str, Any], *, read_only: bool = True) -> VectorStore:
+    """Return a blocking :class:`VectorStore` for *cfg*."""
+    store_cfg = _store_cfg(cfg)
+    shards = _shards(cfg)
+    if store_cfg["backend"] == "local":
+        path = ROOT_DIR / store_cfg["path"]
+        if shards:
+            stores = {name: LocalVectorStore(path / name, read_only=read_only) for name in shards}
+            return ShardedVectorStore(stores, default=shards[-1])
+        return LocalVectorStore(path, read_only=read_only)
+    import chromadb  # only the Chroma backend needs the client library
+
+    client = chromadb.HttpClient(**_chroma_address())
+    name = collection_name(cfg)
+    # Vectors are always supplied by the caller; no server-side embedding.
+    if shards:
+        collections = {
+            family: client.get_or_create_collection(f"{name}-{family}", embedding_function=None) for family in shards
+        }
+        return ShardedVectorStore(collections, default=shards[-1])
+    return client.get_or_create_collection(name, embedding_function=None)
+
+
+async def aopen_vector_store(cfg: Dict[str, Any], store: VectorStore | None = None) -> AsyncVectorStore:
+    """Return an awaitable store for the running event loop.
+
+    For the local backend pass the process's shared blocking *store* so all
+    loops search the same mapping instead of opening the index again.
+    """
+    store_cfg = _store_cfg(cfg)
+    shards = _shards(cfg)
+    if store_cfg["backend"] == "local":
+        if shards:
+            if not isinstance(store, ShardedVectorStore):
+                store = open_vector_store(cfg, read_only=True)
+            return AsyncShardedVectorStore({name: shard.as_async() for name, shard in store.shards.items()})
+        if not isinstance(store, LocalVectorStore):
+            store = LocalVectorStore(ROOT_DIR / store_cfg["path"], read_only=True)
+        return store.as_async()
+    import chromadb
+
+    client = await chromadb.AsyncHttpClient(**_chroma_address())
+    name = collection_name(cfg)
+    if shards:
+        return AsyncShardedVectorStore(
+            {
+                family: await client.get_or_create_collection(f"{name}-{family}", embedding_function=None)
+                for family in shards
+            }
+        )
+    return await client.get_or_create_collection(name, embedding_function=None)
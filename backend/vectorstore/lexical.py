@@ -0,0 +1,324 @@
+from __future__ import annotations
+
+"""BM25 inverted index over the ingested chunks.
+
+Staff often type the literal policy vocabulary – "Agenda for Change band 5",
+"W19", "shared parental leave" – which dense embeddings rank loosely.  This
+index is built by ingestion next to the vector store (same chunk ids) and
+lets retrieval fuse a lexical ranking with the vector one, or skip the
+embedding call entirely when the keyword match is unambiguous.
+
+Only what a search needs is stored per chunk: its id, ``filename``,
+``page_number`` and ``pdf_hash``.  Chunk text is fetched from the vector
+store by id.  The file is a gzipped JSON document; readers stat it every
+``refresh_interval_s`` and reload it in a worker thread when its mtime
+changes.
+"""
+
+import asyncio
+import gzip
+import json
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Sequence, Set
+
+import numpy as np
+
+__all__ = ["LexicalHit", "LexicalIndex", "tokenize"]
+
+_FORMAT = 1
+_META_KEYS = ("filename", "page_number", "pdf_hash", "family")
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset(
+    "a about am an and any are as at be been being but by can could do does did for from get got has have how i if "
+    "in into is it its me my of off on or our should so than that the their them then there these they this to "
+    "us was we were what when where which while who why will with would you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-case alphanumeric tokens without stopwords ("W19" → "w19")."""
+    return [tok for tok in _TOKEN_RE.findall(text.lower()) if tok not in _STOPWORDS]
+
+
+@dataclass
+class LexicalHit:
+    id: str
+    score: float
+    filename: str | None
+    page_number: int | None
+    pdf_hash: str | None
+    # Share of the distinct query terms that occur in this chunk.
+    coverage: float
+
+
+class LexicalIndex:
+    """Okapi BM25 over chunk ids.
+
+    Parameters
+    ----------
+    path: str | Path | None
+        Gzipped JSON file; ``None`` keeps the index in memory only.
+    k1, b: float
+        Standard BM25 parameters.
+    refresh_interval_s: float
+        Minimum time between two checks of the file's mtime by
+        :meth:`refresh_in_background`.
+    """
+
+    def __init__(
+        self,
+        path: str | Path | None = None,
+        *,
+        k1: float = 1.2,
+        b: float = 0.75,
+        refresh_interval_s: float = 30.0,
+    ) -> None:
+        self.path = Path(path) if path else None
+        self.k1, self.b = k1, b
+        self.refresh_interval_s = refresh_interval_s
+        self._lock = threading.Lock()
+        self._mtime: int | None = None
+        self._checked = time.time()
+        self._refreshes: Set[asyncio.Task] = set()
+        # Writer-side state: per chunk term frequencies and metadata.
+        self._terms: Dict[str, Dict[str, int]] = {}
+        self._meta: Dict[str, Dict[str, Any]] = {}
+        self._compiled: _Compiled | None = None
+        if self.path is not None and self.path.exists():
+            self._load()
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def _load(self) -> None:
+        # Parse outside the lock so searches keep using the current postings,
+        # then swap.  The mtime is taken first: a rewrite during the read is
+        # picked up by the next refresh.
+        mtime = self.path.stat().st_mtime_ns
+        with gzip.open(self.path, "rt", encoding="utf-8") as fh:
+            raw = json.load(fh)
+        if raw.get("format") != _FORMAT:
+            raise ValueError(f"Unsupported lexical index format in {self.path}: {raw.get('format')}")
+        ids = raw["ids"]
+        terms: Dict[str, Dict[str, int]] = {chunk_id: {} for chunk_id in ids}
+        for token, postings in raw["postings"].items():
+            for doc, tf in zip(postings[::2], postings[1::2]):
+                terms[ids[doc]][token] = tf
+        meta = dict(zip(ids, raw["meta"]))
+        with self._lock:
+            self._terms, self._meta, self._compiled = terms, meta, None
+            self._mtime = mtime
+
+    def save(self) -> None:
+        """Write the index atomically."""
+        if self.path is None:
+            return
+        with self._lock:
+            ids = list(self._terms)
+            docno = {chunk_id: n for n, chunk_id in enumerate(ids)}
+            postings: Dict[str, List[int]] = {}
+            for chunk_id, tfs in self._terms.items():
+                for token, tf in tfs.items():
+                    postings.setdefault(token, []).extend((docno[chunk_id], tf))
+            payload = {"format": _FORMAT, "ids": ids, "meta": [self._meta[i] for i in ids], "postings": postings}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with gzip.open(tmp, "wt", encoding="utf-8", compresslevel=5) as fh:
+            json.dump(payload, fh, separators=(",", ":"))
+        os.replace(tmp, self.path)
+        self._mtime = self.path.stat().st_mtime_ns
+
+    def refresh(self) -> None:
+        """Reload if ingestion rewrote the file since it was read."""
+        self._checked = time.time()
+        if self.path is None or not self.path.exists():
+            return
+        if self.path.stat().st_mtime_ns != self._mtime:
+            self._load()
+
+    def refresh_in_background(self) -> None:
+        """Start :meth:`refresh` in a worker thread if the check is due.
+
+        The caller does not wait: searches keep using the loaded postings
+        until the reload swaps them in, and a failed reload is retried at
+        the next check.
+        """
+        if self.path is None:
+            return
+        with self._lock:
+            if time.time() - self._checked < self.refresh_interval_s or self._refreshes:
+                return
+            self._checked = time.time()
+        task = asyncio.get_running_loop().create_task(self._arefresh())
+        self._refreshes.add(task)
+        task.add_done_callback(self._refreshes.discard)
+
+    async def _arefresh(self) -> None:
+        try:
+            await asyncio.to_thread(self.refresh)
+        except Exception:  # noqa: BLE001 – best effort, retried at the next check
+            pass
+
+    # ------------------------------------------------------------------
+    # Writes (mirroring the vector store's upsert / update / delete)
+    # ------------------------------------------------------------------
+
+    def upsert(self, ids: Sequence[str], texts: Sequence[str], metadatas: Sequence[Dict[str, Any]]) -> None:
+        with self._lock:
+            for chunk_id, text, meta in zip(ids, texts, metadatas):
+                self._terms[chunk_id] = dict(Counter(tokenize(text)))
+                self._meta[chunk_id] = {k: (meta or {}).get(k) for k in _META_KEYS}
+            self._compiled = None
+
+    def update(self, ids: Sequence[str], metadatas: Sequence[Dict[str, Any]]) -> None:
+        with self._lock:
+            for chunk_id, meta in zip(ids, metadatas):
+                if chunk_id in self._meta:
+                    self._meta[chunk_id].update({k: v for k, v in (meta or {}).items() if k in _META_KEYS})
+            if self._compiled is not None:
+                self._compiled.columns.clear()  # the postings are unchanged
+
+    def delete(self, ids: Iterable[str]) -> None:
+        with self._lock:
+            for chunk_id in ids:
+                self._terms.pop(chunk_id, None)
+                self._meta.pop(chunk_id, None)
+            self._compiled = None
+
+    def ids(self) -> set[str]:
+        with self._lock:
+            return set(self._terms)
+
+    def __len__(self) -> int:
+        return len(self._terms)
+
+    # ------------------------------------------------------------------
+    # Search
+    # ------------------------------------------------------------------
+
+    def _compile(self) -> "_Compiled":
+        with self._lock:
+            if self._compiled is None:
+                self._compiled = _Compiled.build(self._terms, self._meta)
+            return self._compiled
+
+    def idf(self, token: str) -> float:
+        return self._compile().idf(token)
+
+    def search(self, query: str, k: int = 10, where: Dict[str, Any] | None = None) -> List[LexicalHit]:
+        """Return the top *k* chunks for *query* by BM25 score.
+
+        *where* accepts equality, ``{"$eq": ...}`` and ``{"$in": [...]}``
+        conditions on ``filename``, ``page_number``, ``pdf_hash`` and
+        ``family``, combined with ``$and``.
+        """
+        compiled = self._compile()
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms or not compiled.ids:
+            return []
+
+        n = len(compiled.ids)
+        scores = np.zeros(n, dtype=np.float32)
+        matched = np.zeros(n, dtype=np.int32)
+        norm = self.k1 * (1.0 - self.b + self.b * compiled.lengths / compiled.avg_length)
+        for token in terms:
+            postings = compiled.postings.get(token)
+            if postings is None:
+                continue
+            docs, tfs = postings
+            weight = compiled.idf(token) * tfs * (self.k1 + 1.0) / (tfs + norm[docs])
+            scores[docs] += weight
+            matched[docs] += 1
+
+        candidates = np.flatnonzero(matched)
+        if where:
+            candidates = candidates[compiled.mask(candidates, where)]
+        if len(candidates) == 0:
+            return []
+        k = min(k, len(candidates))
+        top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [
+            LexicalHit(
+                id=compiled.ids[i],
+                score=float(scores[i]),
+                filename=compiled.meta[i].get("filename"),
+                page_number=compiled.meta[i].get("page_number"),
+                pdf_hash=compiled.meta[i].get("pdf_hash"),
+                coverage=float(matched[i]) / len(terms),
+            )
+            for i in top
+        ]
+
+
+@dataclass
+class _Compiled:
+    """Array form of the index used for scoring; rebuilt after writes."""
+
+    ids: List[str]
+    meta: List[Dict[str, Any]]
+    lengths: np.ndarray
+    avg_length: float
+    postings: Dict[str, tuple[np.ndarray, np.ndarray]]
+    # Metadata key → (value code per id, value → code), built on first filter.
+    columns: Dict[str, tuple[np.ndarray, Dict[Any, int]]] = field(default_factory=dict)
+
+    @classmethod
+    def build(cls, terms: Dict[str, Dict[str, int]], meta: Dict[str, Dict[str, Any]]) -> "_Compiled":
+        ids = list(terms)
+        lengths = np.asarray([sum(terms[i].values()) for i in ids], dtype=np.float32)
+        lists: Dict[str, tuple[List[int], List[int]]] = {}
+        for docno, chunk_id in enumerate(ids):
+            for token, tf in terms[chunk_id].items():
+                docs, tfs = lists.setdefault(token, ([], []))
+                docs.append(docno)
+                tfs.append(tf)
+        postings = {
+            token: (np.asarray(docs, dtype=np.int64), np.asarray(tfs, dtype=np.float32))
+            for token, (docs, tfs) in lists.items()
+        }
+        avg = float(lengths.mean()) if len(lengths) else 1.0
+        return cls(ids, [meta[i] for i in ids], lengths, avg or 1.0, postings)
+
+    def column(self, key: str) -> tuple[np.ndarray, Dict[Any, int]]:
+        """Integer code of each chunk's *key* value, and the value → code map."""
+        col = self.columns.get(key)
+        if col is None:
+            vocab: Dict[Any, int] = {}
+            codes = np.fromiter(
+                (vocab.setdefault(m.get(key), len(vocab)) for m in self.meta), dtype=np.int32, count=len(self.meta)
+            )
+            col = self.columns[key] = (codes, vocab)
+        return col
+
+    def mask(self, rows: np.ndarray, where: Dict[str, Any]) -> np.ndarray:
+        """Which of *rows* match the metadata filter *where*."""
+        keep = np.ones(len(rows), dtype=bool)
+        for key, cond in where.items():
+            if key == "$and":
+                for clause in cond:
+                    keep &= self.mask(rows, clause)
+                continue
+            codes, vocab = self.column(key)
+            if not isinstance(cond, dict):
+                cond = {"$eq": cond}
+            if "$in" in cond:
+                keep &= np.isin(codes[rows], [vocab[v] for v in cond["$in"] if v in vocab])
+            if "$eq" in cond:
+                keep &= codes[rows] == vocab.get(cond["$eq"], -1)
+        return keep
+
+    def idf(self, token: str) -> float:
+        postings = self.postings.get(token)
+        df = len(postings[0]) if postings is not None else 0
+        n = len(self.ids)
+        return math.log(1.0 + (n - df + 0.5) / (df + 0.5))
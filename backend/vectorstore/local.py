@@ -0,0 +1,446 @@
+from __future__ import annotations
+
+"""Embedded vector store: a memory-mapped float32 matrix plus a JSONL sidecar.
+
+The corpus is only tens of thousands of chunks, so exact search over a
+single matrix is both simpler and faster than a network hop to Chroma.  An
+index directory holds::
+
+    header.json          {"format": 1, "dim": 3072, "generation": 4}
+    vectors-4.f32        row-major float32 vectors, append-only
+    log-4.jsonl          one record per put / metadata update / delete
+
+Writers (ingestion) append vectors first and the log records that reference
+them second, so a reader never sees a row that is not fully on disk.  When
+enough rows are dead the writer compacts into generation ``n + 1`` and
+switches ``header.json`` atomically.
+
+Readers (the API) open the vectors with ``np.memmap(mode="r")``; every
+uvicorn worker maps the same file, so the matrix lives once in the OS page
+cache.  Readers pick up new log records and generations on the next call.
+"""
+
+import asyncio
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+from backend.vectorstore.base import Where
+
+__all__ = ["AsyncLocalVectorStore", "LocalVectorStore"]
+
+_FORMAT = 1
+_HEADER = "header.json"
+# Compact once this share of rows is dead (and at least _MIN_DEAD_ROWS are).
+_DEAD_RATIO = 0.25
+_MIN_DEAD_ROWS = 1024
+
+
+@dataclass
+class _Snapshot:
+    """Immutable view of the index; replaced, never mutated, on refresh."""
+
+    generation: int = -1
+    dim: int | None = None
+    vectors: np.ndarray = field(default_factory=lambda: np.empty((0, 0), dtype=np.float32))
+    norms: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=np.float32))
+    ids: List[str | None] = field(default_factory=list)
+    documents: List[str] = field(default_factory=list)
+    metadatas: List[Dict[str, Any]] = field(default_factory=list)
+    live: np.ndarray = field(default_factory=lambda: np.empty(0, dtype=bool))
+    row_of: Dict[str, int] = field(default_factory=dict)
+    log_offset: int = 0
+    columns: Dict[str, np.ndarray] = field(default_factory=dict)
+
+    def column(self, key: str) -> np.ndarray:
+        col = self.columns.get(key)
+        if col is None:
+            col = np.empty(len(self.metadatas), dtype=object)
+            col[:] = [m.get(key) if m else None for m in self.metadatas]
+            self.columns[key] = col
+        return col
+
+
+class LocalVectorStore:
+    """Exact cosine top-k search over a memory-mapped matrix.
+
+    Implements :class:`backend.vectorstore.base.VectorStore`.
+
+    Parameters
+    ----------
+    path: str | Path
+        Index directory (created by writers on first upsert).
+    read_only: bool
+        Readers never write; writers may :meth:`upsert`, :meth:`update` and
+        :meth:`delete`.
+    """
+
+    def __init__(self, path: str | Path, *, read_only: bool = True) -> None:
+        self.path = Path(path)
+        self.read_only = read_only
+        self._lock = threading.Lock()
+        self._header_stamp: tuple[int, int] | None = None
+        self._snap = _Snapshot()
+        if not read_only:
+            self.path.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            self._refresh()
+
+    # ------------------------------------------------------------------
+    # Files
+    # ------------------------------------------------------------------
+
+    def _vectors_path(self, generation: int) -> Path:
+        return self.path / f"vectors-{generation}.f32"
+
+    def _log_path(self, generation: int) -> Path:
+        return self.path / f"log-{generation}.jsonl"
+
+    def _write_header(self, dim: int, generation: int) -> None:
+        tmp = self.path / f"{_HEADER}.tmp"
+        tmp.write_text(json.dumps({"format": _FORMAT, "dim": dim, "generation": generation}))
+        os.replace(tmp, self.path / _HEADER)
+
+    # ------------------------------------------------------------------
+    # Loading
+    # ------------------------------------------------------------------
+
+    def _refresh(self) -> _Snapshot:
+        """Bring the snapshot up to date with the files; caller holds the lock."""
+        header = self.path / _HEADER
+        try:
+            st = header.stat()
+        except FileNotFoundError:
+            return self._snap
+        stamp = (st.st_mtime_ns, st.st_size)
+        if stamp != self._header_stamp:
+            meta = json.loads(header.read_text())
+            if meta.get("format") != _FORMAT:
+                raise ValueError(f"Unsupported vector index format in {self.path}: {meta.get('format')}")
+            if meta["generation"] != self._snap.generation:
+                try:
+                    self._snap = self._replay(_Snapshot(meta["generation"], meta["dim"]))
+                except FileNotFoundError:
+                    # Compacted between reading the header and opening the
+                    # files; the next call sees the new header.
+                    return self._snap
+            self._header_stamp = stamp
+        log = self._log_path(self._snap.generation)
+        if log.exists() and log.stat().st_size > self._snap.log_offset:
+            self._snap = self._replay(self._snap)
+        return self._snap
+
+    def _replay(self, prev: _Snapshot) -> _Snapshot:
+        """Apply log records past ``prev.log_offset`` to a copy of *prev*."""
+        ids, documents, metadatas = list(prev.ids), list(prev.documents), list(prev.metadatas)
+        live = list(prev.live)
+        row_of = dict(prev.row_of)
+        offset = prev.log_offset
+        log = self._log_path(prev.generation)
+        if log.exists():
+            with log.open("rb") as fh:
+                fh.seek(offset)
+                for line in fh:
+                    if not line.endswith(b"\n"):
+                        break  # torn write; re-read once it is complete
+                    offset += len(line)
+                    rec = json.loads(line)
+                    if "put" in rec:
+                        row = rec["row"]
+                        while len(ids) <= row:
+                            ids.append(None)
+                            documents.append("")
+                            metadatas.append({})
+                            live.append(False)
+                        old = row_of.get(rec["put"])
+                        if old is not None:
+                            live[old] = False
+                        ids[row], documents[row], metadatas[row] = rec["put"], rec["doc"], rec["meta"]
+                        live[row] = True
+                        row_of[rec["put"]] = row
+                    elif "meta" in rec:
+                        row = row_of.get(rec["meta"])
+                        if row is not None:
+                            metadatas[row] = {**metadatas[row], **rec["value"]}
+                    elif "del" in rec:
+                        row = row_of.pop(rec["del"], None)
+                        if row is not None:
+                            live[row] = False
+
+        vectors = self._map_vectors(prev.generation, prev.dim, len(ids))
+        norms = prev.norms
+        if len(norms) < len(vectors):
+            fresh = np.linalg.norm(vectors[len(norms):], axis=1).astype(np.float32)
+            fresh[fresh == 0] = 1.0
+            norms = np.concatenate([norms, fresh])
+        return _Snapshot(
+            generation=prev.generation,
+            dim=prev.dim,
+            vectors=vectors,
+            norms=norms,
+            ids=ids,
+            documents=documents,
+            metadatas=metadatas,
+            live=np.asarray(live, dtype=bool),
+            row_of=row_of,
+            log_offset=offset,
+        )
+
+    def _map_vectors(self, generation: int, dim: int | None, rows: int) -> np.ndarray:
+        path = self._vectors_path(generation)
+        if not dim or rows == 0 or not path.exists():
+            return np.empty((0, dim or 0), dtype=np.float32)
+        return np.memmap(path, dtype=np.float32, mode="r", shape=(rows, dim))
+
+    def _snapshot(self) -> _Snapshot:
+        with self._lock:
+            return self._refresh()
+
+    # ------------------------------------------------------------------
+    # Filters
+    # ------------------------------------------------------------------
+
+    def _mask(self, snap: _Snapshot, where: Where | None) -> np.ndarray:
+        return snap.live & _evaluate(snap, where) if where else snap.live.copy()
+
+    # ------------------------------------------------------------------
+    # Read API (Chroma-compatible)
+    # ------------------------------------------------------------------
+
+    def count(self) -> int:
+        return int(self._snapshot().live.sum())
+
+    def query(
+        self,
+        query_embeddings: Sequence[Sequence[float]],
+        n_results: int = 10,
+        where: Where | None = None,
+        include: Sequence[str] = ("documents", "metadatas", "distances"),
+    ) -> Dict[str, List[List[Any]]]:
+        snap = self._snapshot()
+        mask = self._mask(snap, where)
+        candidates = np.flatnonzero(mask)
+        result: Dict[str, List[List[Any]]] = {key: [] for key in ("ids", *include)}
+        for query in query_embeddings:
+            rows, sims = self._top_k(snap, np.asarray(query, dtype=np.float32), candidates, mask, n_results)
+            result["ids"].append([snap.ids[r] for r in rows])
+            if "documents" in include:
+                result["documents"].append([snap.documents[r] for r in rows])
+            if "metadatas" in include:
+                result["metadatas"].append([dict(snap.metadatas[r]) for r in rows])
+            if "distances" in include:
+                result["distances"].append([float(1.0 - s) for s in sims])
+            if "embeddings" in include:
+                result["embeddings"].append([snap.vectors[r].tolist() for r in rows])
+        return result
+
+    @staticmethod
+    def _top_k(
+        snap: _Snapshot, query: np.ndarray, candidates: np.ndarray, mask: np.ndarray, k: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        k = min(k, len(candidates))
+        if k <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        qnorm = float(np.linalg.norm(query)) or 1.0
+        if len(candidates) * 4 < len(mask):
+            # Selective filter: score only the matching rows.
+            sims = (snap.vectors[candidates] @ query) / (snap.norms[candidates] * qnorm)
+            rows = candidates
+        else:
+            # Score everything straight off the memmap, then mask.
+            sims = (snap.vectors @ query) / (snap.norms * qnorm)
+            sims[~mask] = -np.inf
+            rows = np.arange(len(sims))
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top], kind="stable")]
+        return rows[top], sims[top]
+
+    def get(
+        self,
+        ids: Sequence[str] | None = None,
+        where: Where | None = None,
+        limit: int | None = None,
+        include: Sequence[str] = ("documents", "metadatas"),
+    ) -> Dict[str, List[Any]]:
+        snap = self._snapshot()
+        mask = self._mask(snap, where)
+        if ids is not None:
+            rows = [r for r in (snap.row_of.get(i) for i in ids) if r is not None and mask[r]]
+        else:
+            rows = np.flatnonzero(mask).tolist()
+        rows = rows[:limit] if limit is not None else rows
+        result: Dict[str, List[Any]] = {"ids": [snap.ids[r] for r in rows]}
+        if "documents" in include:
+            result["documents"] = [snap.documents[r] for r in rows]
+        if "metadatas" in include:
+            result["metadatas"] = [dict(snap.metadatas[r]) for r in rows]
+        if "embeddings" in include:
+            result["embeddings"] = [snap.vectors[r].tolist() for r in rows]
+        return result
+
+    # ------------------------------------------------------------------
+    # Write API (Chroma-compatible)
+    # ------------------------------------------------------------------
+
+    def _require_writable(self) -> None:
+        if self.read_only:
+            raise PermissionError(f"Vector index {self.path} was opened read-only")
+
+    def _append_log(self, generation: int, records: List[Dict[str, Any]]) -> None:
+        lines = "".join(json.dumps(rec, ensure_ascii=False) + "\n" for rec in records)
+        with self._log_path(generation).open("a", encoding="utf-8") as fh:
+            fh.write(lines)
+            fh.flush()
+            os.fsync(fh.fileno())
+
+    def upsert(
+        self,
+        ids: Sequence[str],
+        embeddings: Sequence[Sequence[float]],
+        documents: Sequence[str],
+        metadatas: Sequence[Dict[str, Any]],
+    ) -> None:
+        self._require_writable()
+        if not ids:
+            return
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) != len(ids):
+            raise ValueError("upsert needs one embedding per id")
+        with self._lock:
+            snap = self._refresh()
+            if snap.dim is None:
+                self._write_header(vectors.shape[1], 0)
+                snap = self._refresh()
+            if vectors.shape[1] != snap.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match index ({snap.dim})")
+
+            row_bytes = snap.dim * 4
+            path = self._vectors_path(snap.generation)
+            with path.open("ab") as fh:
+                start = fh.tell() // row_bytes
+                fh.truncate(start * row_bytes)  # drop a torn row from a crash
+                fh.seek(start * row_bytes)
+                fh.write(vectors.tobytes())
+                fh.flush()
+                os.fsync(fh.fileno())
+            self._append_log(
+                snap.generation,
+                [
+                    {"put": i, "row": start + n, "doc": doc, "meta": meta or {}}
+                    for n, (i, doc, meta) in enumerate(zip(ids, documents, metadatas))
+                ],
+            )
+            self._refresh()
+
+    def update(self, ids: Sequence[str], metadatas: Sequence[Dict[str, Any]]) -> None:
+        """Merge *metadatas* into the stored metadata of *ids*."""
+        self._require_writable()
+        with self._lock:
+            snap = self._refresh()
+            records = [{"meta": i, "value": m} for i, m in zip(ids, metadatas) if i in snap.row_of]
+            if records:
+                self._append_log(snap.generation, records)
+                self._refresh()
+
+    def delete(self, ids: Sequence[str]) -> None:
+        self._require_writable()
+        with self._lock:
+            snap = self._refresh()
+            records = [{"del": i} for i in ids if i in snap.row_of]
+            if not records:
+                return
+            self._append_log(snap.generation, records)
+            snap = self._refresh()
+            dead = len(snap.live) - int(snap.live.sum())
+            if dead >= _MIN_DEAD_ROWS and dead >= _DEAD_RATIO * len(snap.live):
+                self._compact(snap)
+
+    def compact(self) -> None:
+        """Rewrite the live rows into a new generation, dropping dead ones."""
+        self._require_writable()
+        with self._lock:
+            self._compact(self._refresh())
+
+    def _compact(self, snap: _Snapshot) -> None:
+        if snap.dim is None:
+            return
+        generation = snap.generation + 1
+        rows = np.flatnonzero(snap.live)
+        with self._vectors_path(generation).open("wb") as fh:
+            for start in range(0, len(rows), 4096):
+                fh.write(np.ascontiguousarray(snap.vectors[rows[start:start + 4096]]).tobytes())
+            fh.flush()
+            os.fsync(fh.fileno())
+        self._log_path(generation).unlink(missing_ok=True)
+        self._append_log(
+            generation,
+            [
+                {"put": snap.ids[r], "row": n, "doc": snap.documents[r], "meta": snap.metadatas[r]}
+                for n, r in enumerate(rows)
+            ],
+        )
+        self._write_header(snap.dim, generation)
+        self._refresh()
+        # Readers still mapping the old generation keep their inode alive.
+        self._vectors_path(snap.generation).unlink(missing_ok=True)
+        self._log_path(snap.generation).unlink(missing_ok=True)
+
+    def as_async(self) -> "AsyncLocalVectorStore":
+        return AsyncLocalVectorStore(self)
+
+
+class AsyncLocalVectorStore:
+    """Awaitable view of a :class:`LocalVectorStore`; searches run in a thread."""
+
+    def __init__(self, store: LocalVectorStore) -> None:
+        self.store = store
+
+    async def query(self, **kwargs: Any) -> Dict[str, List[List[Any]]]:
+        return await asyncio.to_thread(self.store.query, **kwargs)
+
+    async def get(self, **kwargs: Any) -> Dict[str, List[Any]]:
+        return await asyncio.to_thread(self.store.get, **kwargs)
+
+# ---------------------------------------------------------------------------
+# Metadata filters
+# ---------------------------------------------------------------------------
+
+
+def _evaluate(snap: _Snapshot, where: Where) -> np.ndarray:
+    mask = np.ones(len(snap.metadatas), dtype=bool)
+    for key, cond in where.items():
+        if key == "$and":
+            for clause in cond:
+                mask &= _evaluate(snap, clause)
+        elif key == "$or":
+            any_mask = np.zeros_like(mask)
+            for clause in cond:
+                any_mask |= _evaluate(snap, clause)
+            mask &= any_mask
+        else:
+            mask &= _compare(snap.column(key), cond)
+    return mask
+
+
+def _compare(column: np.ndarray, cond: Any) -> np.ndarray:
+    op, value = next(iter(cond.items())) if isinstance(cond, dict) else ("$eq", cond)
+    if op == "$eq":
+        return np.asarray(column == value, dtype=bool)
+    if op == "$ne":
+        return np.asarray(column != value, dtype=bool)
+    if op in ("$in", "$nin"):
+        values = set(value)
+        hits = np.fromiter((v in values for v in column), dtype=bool, count=len(column))
+        return hits if op == "$in" else ~hits
+    ordering = {"$gt": "__gt__", "$gte": "__ge__", "$lt": "__lt__", "$lte": "__le__"}
+    if op in ordering:
+        method = ordering[op]
+        return np.fromiter(
+            (v is not None and getattr(v, method)(value) is True for v in column), dtype=bool, count=len(column)
+        )
+    raise ValueError(f"Unsupported filter operator: {op}")
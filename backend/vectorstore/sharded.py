@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+"""One vector store per document family behind the :class:`VectorStore` interface.
+
+With ``vector_store.shard_by_family`` every family (see
+``backend/utils/families.py``) gets its own Chroma collection or local
+index, and :class:`ShardedVectorStore` hides the split: writes go to the
+shard named by each chunk's ``family`` metadata, and a query whose
+``where`` filters on ``family`` (what the query router sends) only
+searches those shards, without evaluating the filter row by row.
+Unfiltered queries search every shard and merge the hits by distance, so
+callers see the same results as from one store.
+"""
+
+import asyncio
+from typing import Any, Dict, List, Sequence
+
+from backend.vectorstore.base import AsyncVectorStore, VectorStore, Where
+
+__all__ = ["AsyncShardedVectorStore", "ShardedVectorStore", "shard_filter"]
+
+KEY = "family"
+
+
+def shard_filter(where: Where | None, shards: Sequence[str]) -> List[str]:
+    """Shards a query with *where* can match: those its ``family`` condition allows."""
+    cond = (where or {}).get(KEY)
+    if cond is None:
+        return list(shards)
+    if isinstance(cond, dict):
+        if "$in" in cond:
+            allowed = set(cond["$in"])
+        elif "$eq" in cond:
+            allowed = {cond["$eq"]}
+        else:
+            return list(shards)
+    else:
+        allowed = {cond}
+    return [name for name in shards if name in allowed]
+
+
+def _within_shard(where: Where | None) -> Where | None:
+    """*where* without its ``family`` condition, which shard selection already applied."""
+    rest = {key: cond for key, cond in (where or {}).items() if key != KEY}
+    return rest or None
+
+
+def _merge(
+    results: List[Dict[str, List[List[Any]]]], queries: int, n_results: int, include: Sequence[str]
+) -> Dict[str, List[List[Any]]]:
+    """Merge per-shard query results (each with distances) into the best *n_results* per query."""
+    keys = ("ids", *include)
+    merged: Dict[str, List[List[Any]]] = {key: [] for key in keys}
+    for row in range(queries):
+        hits = [
+            (res["distances"][row][i], {key: res[key][row][i] for key in keys})
+            for res in results
+            for i in range(len(res["ids"][row]))
+        ]
+        hits.sort(key=lambda hit: hit[0])
+        for key in keys:
+            merged[key].append([hit[key] for _, hit in hits[:n_results]])
+    return merged
+
+
+class ShardedVectorStore:
+    """Blocking store over one :class:`VectorStore` per family.
+
+    Parameters
+    ----------
+    shards: Dict[str, VectorStore]
+        Family name → store.
+    default: str
+        Shard for chunks without a ``family`` (must be in *shards*).
+    """
+
+    def __init__(self, shards: Dict[str, VectorStore], default: str) -> None:
+        self.shards = shards
+        self.default = default
+
+    def _shard_of(self, meta: Dict[str, Any] | None) -> str:
+        family = (meta or {}).get(KEY)
+        return family if family in self.shards else self.default
+
+    def count(self) -> int:
+        return sum(shard.count() for shard in self.shards.values())
+
+    def query(
+        self,
+        query_embeddings: Sequence[Sequence[float]],
+        n_results: int = 10,
+        where: Where | None = None,
+        include: Sequence[str] = ("documents", "metadatas", "distances"),
+    ) -> Dict[str, List[List[Any]]]:
+        wanted = [key for key in include if key != "distances"] + ["distances"]
+        results = [
+            self.shards[name].query(
+                query_embeddings=query_embeddings, n_results=n_results, where=_within_shard(where), include=wanted
+            )
+            for name in shard_filter(where, list(self.shards))
+        ]
+        return _merge(results, len(query_embeddings), n_results, include)
+
+    def get(
+        self,
+        ids: Sequence[str] | None = None,
+        where: Where | None = None,
+        limit: int | None = None,
+        include: Sequence[str] = ("documents", "metadatas"),
+    ) -> Dict[str, List[Any]]:
+        result: Dict[str, List[Any]] = {key: [] for key in ("ids", *include)}
+        for name in shard_filter(where, list(self.shards)):
+            part = self.shards[name].get(ids=ids, where=_within_shard(where), limit=limit, include=include)
+            for key in result:
+                result[key].extend(part.get(key) or [])
+        if limit is not None:
+            result = {key: values[:limit] for key, values in result.items()}
+        return result
+
+    def upsert(
+        self,
+        ids: Sequence[str],
+        embeddings: Sequence[Sequence[float]],
+        documents: Sequence[str],
+        metadatas: Sequence[Dict[str, Any]],
+    ) -> None:
+        groups: Dict[str, List[int]] = {}
+        for i, meta in enumerate(metadatas):
+            groups.setdefault(self._shard_of(meta), []).append(i)
+        for name, rows in groups.items():
+            # A chunk whose family changed (new keywords) must not stay behind in its old shard.
+            moved = [ids[i] for i in rows]
+            for other, shard in self.shards.items():
+                if other != name:
+                    shard.delete(ids=moved)
+            self.shards[name].upsert(
+                ids=moved,
+                embeddings=[embeddings[i] for i in rows],
+                documents=[documents[i] for i in rows],
+                metadatas=[metadatas[i] for i in rows],
+            )
+
+    def update(self, ids: Sequence[str], metadatas: Sequence[Dict[str, Any]]) -> None:
+        """Merge *metadatas* into *ids*; each must carry the chunk's current ``family``."""
+        groups: Dict[str, List[int]] = {}
+        for i, meta in enumerate(metadatas):
+            groups.setdefault(self._shard_of(meta), []).append(i)
+        for name, rows in groups.items():
+            self.shards[name].update(ids=[ids[i] for i in rows], metadatas=[metadatas[i] for i in rows])
+
+    def delete(self, ids: Sequence[str]) -> None:
+        if not ids:
+            return
+        for shard in self.shards.values():
+            shard.delete(ids=ids)
+
+
+class AsyncShardedVectorStore:
+    """Awaitable read side of :class:`ShardedVectorStore`; shards are searched concurrently."""
+
+    def __init__(self, shards: Dict[str, AsyncVectorStore]) -> None:
+        self.shards = shards
+
+    async def query(
+        self,
+        query_embeddings: Sequence[Sequence[float]],
+        n_results: int = 10,
+        where: Where | None = None,
+        include: Sequence[str] = ("documents", "metadatas", "distances"),
+    ) -> Dict[str, List[List[Any]]]:
+        wanted = [key for key in include if key != "distances"] + ["distances"]
+        results = await asyncio.gather(
+            *(
+                self.shards[name].query(
+                    query_embeddings=query_embeddings, n_results=n_results, where=_within_shard(where), include=wanted
+                )
+                for name in shard_filter(where, list(self.shards))
+            )
+        )
+        return _merge(list(results), len(query_embeddings), n_results, include)
+
+    async def get(
+        self,
+        ids: Sequence[str] | None = None,
+        where: Where | None = None,
+        limit: int | None = None,
+        include: Sequence[str] = ("documents", "metadatas"),
+    ) -> Dict[str, List[Any]]:
+        parts = await asyncio.gather(
+            *(
+                self.shards[name].get(ids=ids, where=_within_shard(where), limit=limit, include=include)
+                for name in shard_filter(where, list(self.shards))
+            )
+        )
+        result: Dict[str, List[Any]] = {key: [] for key in ("ids", *include)}
+        for part in parts:
+            for key in result:
+                result[key].extend(part.get(key) or [])
+        if limit is not None:
+            result = {key: values[:limit] for key, values in result.items()}
+        return result
@@ -0,0 +1,14 @@
+"""Offline benchmarks for MedDoc.
+
+Everything in this package runs against local, deterministic stand-ins for
+the OpenAI and Chroma services (see :mod:`benchmarks.fakes`), so results are
+reproducible and cost nothing.  Run individual benchmarks as modules, e.g.::
+
+    python -m benchmarks.bench_concurrency --requests 200 --concurrency 50
+
+``bench_e2e`` and ``bench_ingest`` drive the real API and ingestion
+pipeline end to end against :mod:`benchmarks.fake_openai` (fake embedding
+and chat endpoints over HTTP) and print JSON reports to compare between
+commits.  ``bench_memory`` runs ingestion in a subprocess per document size
+and reports peak memory with and without page windows.
+"""
@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+"""Concurrency benchmark: blocking pipeline vs :func:`aget_answer`.
+
+Fires ``--requests`` questions at ``--concurrency`` in-flight requests on a
+single event loop – the situation of one uvicorn worker – and reports
+throughput and latency percentiles for
+
+* ``blocking`` – the old shape: an ``async def`` handler that calls
+  synchronous embedding / search / LLM clients and so freezes the loop;
+* ``async`` – :func:`backend.retrieval.retrieval.aget_answer` against the
+  same fakes, awaiting every network call.
+
+Usage::
+
+    python -m benchmarks.bench_concurrency --requests 100 --concurrency 25
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List
+
+import yaml
+from langchain.schema import Document
+
+from backend.retrieval import resources
+from backend.retrieval.context_packer import DEFAULT_CONTEXT_CFG, pack_context
+from backend.retrieval.retrieval import _build_messages, _extract_answer_and_sources, aget_answer
+from benchmarks.fakes import FakeRegistry, dumps, percentiles
+
+
+async def _run(
+    call: Callable[[str], Awaitable[Any]], questions: List[str], concurrency: int
+) -> Dict[str, Any]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def one(q: str) -> None:
+        async with semaphore:
+            t0 = time.perf_counter()
+            await call(q)
+            latencies.append(time.perf_counter() - t0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(q) for q in questions))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": len(questions),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(questions) / elapsed, 2),
+        "latency_ms": percentiles(latencies),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Blocking vs async retrieval pipeline under concurrency.")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=25)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--search-latency", type=float, default=0.02)
+    parser.add_argument("--llm-latency", type=float, default=0.5)
+    args = parser.parse_args()
+
+    registry = FakeRegistry(
+        embed_latency=args.embed_latency,
+        search_latency=args.search_latency,
+        llm_latency=args.llm_latency,
+    )
+    resources.install_registry(registry)
+    questions = [f"How much maternity leave do I get? #{i}" for i in range(args.requests)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cfg_path = Path(tmp) / "bench.yaml"
+        # Fake vectors must not land in the real on-disk query embedding cache.
+        cfg_path.write_text(yaml.safe_dump({"enable_tracing": False, "embedding_cache": {"enabled": False}}))
+
+        async def blocking(question: str) -> Any:
+            vector = registry.embeddings.embed_query(question)
+            hits = registry.collection.query(query_embeddings=[vector], n_results=4)
+            docs = [
+                Document(page_content=text, metadata=meta)
+                for text, meta in zip(hits["documents"][0], hits["metadatas"][0])
+            ]
+            _, messages = _build_messages(question, pack_context(docs, None, DEFAULT_CONTEXT_CFG))
+            response = registry.chat_model.invoke(messages)
+            return _extract_answer_and_sources(response.content)
+
+        async def non_blocking(question: str) -> Any:
+            return await aget_answer(question, cfg_path=cfg_path)
+
+        result = {
+            "config": vars(args),
+            "blocking": asyncio.run(_run(blocking, questions, args.concurrency)),
+            "async": asyncio.run(_run(non_blocking, questions, args.concurrency)),
+        }
+
+    resources.shutdown_registry()
+    print(dumps(result))
+
+
+if __name__ == "__main__":
+    main()
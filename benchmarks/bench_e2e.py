@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+"""End-to-end load test of the FastAPI app against fake OpenAI endpoints.
+
+Builds a synthetic corpus in the embedded vector store (plus its BM25
+index) in a temporary directory, starts :mod:`benchmarks.fake_openai` for
+embeddings and chat, then starts the real ``backend.main`` app with
+uvicorn, pointed at both through ``OPENAI_BASE_URL`` and
+``MEDDOC_RETRIEVAL_CONFIG``.  Questions are replayed over HTTP at a fixed
+concurrency; the report has throughput, client latency percentiles and the
+per-stage percentiles parsed from each response's ``Server-Timing`` header
+(``--stream`` replays ``/api/chat/stream`` and reports time to first token
+instead; a response whose ``{"sources": ...}`` line leaks into its token
+events counts as an error).
+
+Questions come from the trace files (``--traces``, rotated files included)
+or are generated from the corpus vocabulary.  Answer and embedding caches
+are off unless ``--caches`` is given, so every request pays for the full
+pipeline.  Compare runs between commits with ``--output``.
+
+Usage::
+
+    python -m benchmarks.bench_e2e --requests 300 --concurrency 20 --chat-latency 0.5 --output e2e.json
+"""
+
+import os
+
+# backend.config reads the key at import time; the fake server ignores it.
+os.environ.setdefault("OPENAI_API_KEY", "sk-offline-benchmark")
+
+import argparse  # noqa: E402
+import asyncio  # noqa: E402
+import random  # noqa: E402
+import tempfile  # noqa: E402
+import time  # noqa: E402
+from pathlib import Path  # noqa: E402
+from typing import Any, Dict, List  # noqa: E402
+
+import httpx  # noqa: E402
+import yaml  # noqa: E402
+
+from backend.retrieval.trace_writer import iter_traces  # noqa: E402
+from backend.vectorstore import LexicalIndex, LocalVectorStore  # noqa: E402
+from benchmarks.fake_openai import FakeOpenAIServer, create_app  # noqa: E402
+from benchmarks.fakes import dumps, fake_vector, percentiles, run_info  # noqa: E402
+
+_TOPICS = [
+    ("annual leave", "Annual-Leave-Policy"),
+    ("maternity pay", "Maternity-Policy"),
+    ("shared parental leave", "Shared-Parental-Leave-Procedure"),
+    ("sickness absence", "Sickness-Absence-Policy"),
+    ("flexible working", "Flexible-Working-Policy"),
+    ("adoption leave", "Adoption-Leave-Procedure"),
+    ("on-call payments", "Pay-Terms-and-Conditions"),
+    ("study leave", "Learning-and-Development-Policy"),
+]
+
+
+def _build_corpus(root: Path, num_chunks: int, dim: int) -> Dict[str, Any]:
+    """Write the vector and lexical indexes; return the retrieval config."""
+    store = LocalVectorStore(root / "vector_index", read_only=False)
+    lexical = LexicalIndex(root / "lexical.json.gz")
+    rng = random.Random(0)
+    for start in range(0, num_chunks, 1000):
+        ids, texts, metas = [], [], []
+        for i in range(start, min(num_chunks, start + 1000)):
+            topic, stem = _TOPICS[i % len(_TOPICS)]
+            band = rng.randint(2, 9)
+            texts.append(
+                f"{topic.capitalize()} – section {i}. Staff on Agenda for Change band {band} are entitled to "
+                f"{rng.randint(1, 52)} weeks of {topic} subject to {rng.randint(6, 26)} weeks' continuous service. "
+                f"Requests go to the line manager using form W{rng.randint(10, 99)}."
+            )
+            metas.append({"filename": f"{stem}-V{i % 3 + 1}.pdf", "page_number": i // 40 + 1, "pdf_hash": stem})
+            ids.append(f"{stem}-{i}")
+        store.upsert(ids=ids, embeddings=[fake_vector(t, dim) for t in texts], documents=texts, metadatas=metas)
+        lexical.upsert(ids, texts, metas)
+    lexical.save()
+    store.compact()
+    return {
+        "vector_store": {"backend": "local", "path": str(root / "vector_index")},
+        "lexical_index": {"path": str(root / "lexical.json.gz")},
+    }
+
+
+def _questions(args: argparse.Namespace) -> List[str]:
+    if args.traces is not None:
+        questions = [rec["question"] for rec in iter_traces(args.traces) if rec.get("question")]
+        if not questions:
+            raise SystemExit(f"No questions in {args.traces}")
+    else:
+        rng = random.Random(1)
+        templates = [
+            "How many weeks of {t} do I get on band {b}?",
+            "{t} band {b}",
+            "Who approves {t} requests?",
+            "What notice do I need to give before {t}?",
+        ]
+        questions = [
+            rng.choice(templates).format(t=rng.choice(_TOPICS)[0], b=rng.randint(2, 9)) for _ in range(200)
+        ]
+    return [questions[i % len(questions)] for i in range(args.requests)]
+
+
+def _server_timing(header: str | None) -> Dict[str, float]:
+    stages: Dict[str, float] = {}
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if params.startswith("dur="):
+            stages[name] = float(params[4:]) / 1000
+    return stages
+
+
+async def _replay(base_url: str, questions: List[str], args: argparse.Namespace) -> Dict[str, Any]:
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies: List[float] = []
+    first_tokens: List[float] = []
+    stages: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120.0, limits=limits) as client:
+
+        async def one(question: str, record: bool) -> None:
+            async with semaphore:
+                t0 = time.perf_counter()
+                first_token: float | None = None
+                try:
+                    if args.stream:
+                        async with client.stream("POST", "/api/chat/stream", json={"question": question}) as resp:
+                            resp.raise_for_status()
+                            event = ""
+                            async for line in resp.aiter_lines():
+                                if line.startswith("event: "):
+                                    event = line[len("event: "):]
+                                if first_token is None and event == "token":
+                                    first_token = time.perf_counter() - t0
+                                if event == "error":
+                                    raise RuntimeError("stream error event")
+                                if event == "token" and line.startswith("data: ") and '\\"sources\\"' in line:
+                                    # The sources line must only arrive, parsed, in the final event.
+                                    raise RuntimeError("sources line streamed as tokens")
+                    else:
+                        resp = await client.post("/api/chat", json={"question": question})
+                        resp.raise_for_status()
+                except Exception as exc:  # noqa: BLE001
+                    if record:
+                        errors[type(exc).__name__] = errors.get(type(exc).__name__, 0) + 1
+                    return
+                if not record:
+                    return
+                latencies.append(time.perf_counter() - t0)
+                if first_token is not None:
+                    first_tokens.append(first_token)
+                if not args.stream:
+                    for name, seconds in _server_timing(resp.headers.get("server-timing")).items():
+                        stages.setdefault(name, []).append(seconds)
+
+        await asyncio.gather(*(one(q, False) for q in questions[: args.warmup]))
+        started = time.perf_counter()
+        await asyncio.gather(*(one(q, True) for q in questions))
+        wall = time.perf_counter() - started
+
+    result: Dict[str, Any] = {
+        "requests": len(questions),
+        "errors": errors,
+        "wall_s": round(wall, 2),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+        "latency_ms": percentiles(latencies),
+    }
+    if args.stream:
+        result["first_token_ms"] = percentiles(first_tokens)
+    else:
+        result["stages_ms"] = {name: percentiles(values) for name, values in stages.items()}
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline end-to-end load test of the MedDoc API.")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--chunks", type=int, default=20_000, help="synthetic corpus size")
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--chat-latency", type=float, default=0.5)
+    parser.add_argument("--search-mode", choices=["vector", "hybrid", "lexical"], default="hybrid")
+    parser.add_argument("--traces", type=Path, default=None, help="replay questions from this trace file")
+    parser.add_argument("--stream", action="store_true", help="replay /api/chat/stream")
+    parser.add_argument("--caches", action="store_true", help="keep the answer and embedding caches on")
+    parser.add_argument("--output", type=Path, default=None, help="also write the JSON result here")
+    args = parser.parse_args()
+
+    questions = _questions(args)
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        t0 = time.perf_counter()
+        cfg = _build_corpus(root, args.chunks, args.dim)
+        build_s = time.perf_counter() - t0
+        cfg.update(
+            {
+                "search": {"mode": args.search_mode},
+                "trace_path": str(root / "traces/query_traces.jsonl"),
+                "answer_cache": {"enabled": args.caches},
+                "embedding_cache": {"enabled": args.caches, "path": None},
+                "http_pool": {"max_connections": max(20, args.concurrency * 2)},
+            }
+        )
+        cfg_path = root / "retrieval.yaml"
+        cfg_path.write_text(yaml.safe_dump(cfg))
+
+        fake = FakeOpenAIServer(
+            create_app(latency=args.embed_latency, chat_latency=args.chat_latency, dim=args.dim)
+        )
+        with fake:
+            os.environ["OPENAI_BASE_URL"] = os.environ["OPENAI_API_BASE"] = fake.base_url
+            os.environ["MEDDOC_RETRIEVAL_CONFIG"] = str(cfg_path)
+            from backend.main import app
+
+            with FakeOpenAIServer(app) as server:
+                base_url = f"http://{server.host}:{server.port}"
+                result = asyncio.run(_replay(base_url, questions, args))
+            counters = dict(fake.counters)
+
+    report = {
+        "run": run_info(),
+        "config": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()},
+        "corpus_build_s": round(build_s, 2),
+        "result": result,
+        "fake_openai": counters,
+    }
+    text = dumps(report)
+    if args.output:
+        args.output.write_text(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+"""Exercise :class:`EmbeddingScheduler` against a throttling fake server.
+
+Embeds ``--chunks`` synthetic policy chunks through a real
+``OpenAIEmbeddings`` client pointed at :mod:`benchmarks.fake_openai`, which
+rejects ``--throttle-rate`` of requests (and anything over
+``--server-tpm``) with 429.  With ``--crash-after N`` the first run aborts
+after N upserted batches and a second run resumes from the checkpoint, which
+must skip every batch that was already written.  A further run over the
+same checkpoint must write every chunk again: a finished group is never
+skipped (a re-added PDF or a wiped collection).  With ``--replica`` a
+final run rebuilds the index from scratch (fresh checkpoint) and should be
+served entirely from the chunk embedding store, without a single request.
+
+Usage::
+
+    python -m benchmarks.bench_embedding_scheduler --chunks 2000 --throttle-rate 0.2
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from langchain_openai import OpenAIEmbeddings
+
+from backend.ingestion.embedding_scheduler import EmbeddingScheduler
+from benchmarks.fake_openai import FakeOpenAIServer
+from benchmarks.fakes import dumps
+
+
+class _Crash(Exception):
+    pass
+
+
+def _chunks(n: int) -> List[str]:
+    return [
+        f"Section {i}. Employees on Agenda for Change band {i % 9 + 1} accrue annual leave "
+        f"and sick pay as described in chapter {i % 12}. " * (1 + i % 5)
+        for i in range(n)
+    ]
+
+
+async def _run(scheduler: EmbeddingScheduler, texts: List[str], store: Dict[str, Any], crash_after: int | None) -> int:
+    upserts = 0
+
+    async def upsert(ids: List[str], vectors: List[List[float]], docs: List[str], metas: List[Dict[str, Any]]) -> None:
+        nonlocal upserts
+        if crash_after is not None and upserts >= crash_after:
+            raise _Crash()
+        upserts += 1
+        store.update(zip(ids, vectors))
+
+    ids = [f"bench-{i}" for i in range(len(texts))]
+    metas = [{"chunk": i} for i in range(len(texts))]
+    return await scheduler.run("bench", texts, metas, ids, upsert)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Embedding scheduler under injected throttling.")
+    parser.add_argument("--chunks", type=int, default=1000)
+    parser.add_argument("--throttle-rate", type=float, default=0.2)
+    parser.add_argument("--server-tpm", type=int, default=None)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--tokens-per-minute", type=int, default=2_000_000)
+    parser.add_argument("--max-batch-tokens", type=int, default=4_000)
+    parser.add_argument("--crash-after", type=int, default=None)
+    parser.add_argument("--replica", action="store_true", help="rebuild from the chunk store afterwards")
+    args = parser.parse_args()
+
+    texts = _chunks(args.chunks)
+    store: Dict[str, Any] = {}
+    result: Dict[str, Any] = {"config": vars(args)}
+
+    with FakeOpenAIServer(
+        latency=args.latency, throttle_rate=args.throttle_rate, tokens_per_minute=args.server_tpm
+    ) as server, tempfile.TemporaryDirectory() as tmp:
+        sched_cfg = {
+            "concurrency": args.concurrency,
+            "tokens_per_minute": args.tokens_per_minute,
+            "max_batch_tokens": args.max_batch_tokens,
+            "backoff_base_s": 0.05,
+            "backoff_max_s": 1.0,
+            "checkpoint_path": str(Path(tmp) / "checkpoint.jsonl"),
+            "chunk_store_path": str(Path(tmp) / "chunks.sqlite3"),
+        }
+
+        def scheduler() -> EmbeddingScheduler:
+            embeddings = OpenAIEmbeddings(
+                model="text-embedding-3-large",
+                api_key="fake",
+                base_url=server.base_url,
+                max_retries=0,
+                # Send raw strings: no tiktoken download needed offline.
+                check_embedding_ctx_length=False,
+            )
+            return EmbeddingScheduler(embeddings, sched_cfg)
+
+        runs = []
+        crash_after = args.crash_after
+        while True:
+            sched = scheduler()
+            t0 = time.perf_counter()
+            crashed = False
+            try:
+                asyncio.run(_run(sched, texts, store, crash_after))
+            except _Crash:
+                crashed = True
+            finally:
+                sched.close()
+            runs.append(
+                {
+                    "elapsed_s": round(time.perf_counter() - t0, 3),
+                    "crashed": crashed,
+                    "batches": sched.stats.batches,
+                    "skipped_batches": sched.stats.skipped_batches,
+                    "from_chunk_store": sched.stats.cached_texts,
+                    "retries": sched.stats.retries,
+                    "throttled": sched.stats.throttled,
+                    "tokens": sched.stats.tokens,
+                }
+            )
+            if not crashed:
+                break
+            crash_after = None
+
+        # Same group, same checkpoint, after it finished: nothing may be skipped.
+        rerun_store: Dict[str, Any] = {}
+        sched = scheduler()
+        try:
+            written = asyncio.run(_run(sched, texts, rerun_store, None))
+        finally:
+            sched.close()
+        result["rerun"] = {
+            "written": written,
+            "skipped_batches": sched.stats.skipped_batches,
+            "complete": written == len(texts) and len(rerun_store) == len(texts),
+        }
+
+        if args.replica:
+            requests_before = server.counters["requests"]
+            sched_cfg["checkpoint_path"] = str(Path(tmp) / "replica.jsonl")
+            replica: Dict[str, Any] = {}
+            sched = scheduler()
+            t0 = time.perf_counter()
+            try:
+                asyncio.run(_run(sched, texts, replica, None))
+            finally:
+                sched.close()
+            result["replica"] = {
+                "elapsed_s": round(time.perf_counter() - t0, 3),
+                "from_chunk_store": sched.stats.cached_texts,
+                "api_requests": server.counters["requests"] - requests_before,
+                "complete": len(replica) == len(texts),
+            }
+
+        result["runs"] = runs
+        result["server"] = dict(server.counters)
+        result["stored_vectors"] = len(store)
+        result["complete"] = len(store) == len(texts)
+
+    print(dumps(result))
+
+
+if __name__ == "__main__":
+    main()
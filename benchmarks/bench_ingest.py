@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+"""Ingestion benchmark over synthetic PDFs with a fake embedding endpoint.
+
+Generates ``--pdfs`` policy-like PDFs of ``--pages`` pages each with
+PyMuPDF, then runs the real ingestion pipeline
+(:func:`backend.ingestion.preprocess._run_pipeline`: hash, plan, partition,
+chunk, embed, upsert) into an embedded vector store in a temporary
+directory, with ``OpenAIEmbeddings`` pointed at
+:mod:`benchmarks.fake_openai`.  Three passes are timed:
+
+* ``full`` – empty store, every page is ingested;
+* ``unchanged`` – same files again, the manifest should skip all of them;
+* ``edit`` – one page of one file changed, only that page is re-ingested.
+
+Each pass reports wall time, pages/s and chunks/s, the per-stage busy time
+and throughput, the pipeline phase timings and the embedding scheduler
+counters.  Partitioning needs ``unstructured`` installed; ``--strategy
+hi_res`` also needs its OCR/layout extras.
+
+Usage::
+
+    python -m benchmarks.bench_ingest --pdfs 20 --pages 10 --output ingest.json
+"""
+
+import os
+
+# The OpenAI client wants a key; the fake server ignores it.
+os.environ.setdefault("OPENAI_API_KEY", "sk-offline-benchmark")
+
+import argparse  # noqa: E402
+import asyncio  # noqa: E402
+import random  # noqa: E402
+import tempfile  # noqa: E402
+import time  # noqa: E402
+from dataclasses import asdict  # noqa: E402
+from pathlib import Path  # noqa: E402
+from typing import Any, Dict, List  # noqa: E402
+
+import fitz  # PyMuPDF  # noqa: E402
+from langchain_openai import OpenAIEmbeddings  # noqa: E402
+
+from backend.ingestion import preprocess  # noqa: E402
+from backend.vectorstore import LocalVectorStore  # noqa: E402
+from benchmarks.fake_openai import FakeOpenAIServer, create_app  # noqa: E402
+from benchmarks.fakes import dumps, run_info  # noqa: E402
+
+_SECTIONS = [
+    "Purpose", "Scope", "Eligibility", "Entitlement", "Notification",
+    "Pay", "Return to work", "Responsibilities", "Monitoring",
+]
+
+
+def _page_text(rng: random.Random, doc: int, page: int) -> List[str]:
+    lines = [f"{rng.choice(_SECTIONS)} ({doc}.{page})"]
+    for _ in range(rng.randint(4, 8)):
+        lines.append(
+            f"Staff on band {rng.randint(2, 9)} with {rng.randint(6, 26)} weeks' service may request "
+            f"{rng.randint(1, 52)} weeks of leave; the line manager responds within {rng.randint(5, 30)} days "
+            f"using form W{rng.randint(10, 99)} and records the outcome on ESR."
+        )
+    return lines
+
+
+def _write_pdf(path: Path, pages: List[List[str]]) -> None:
+    doc = fitz.open()
+    for lines in pages:
+        page = doc.new_page()
+        page.insert_textbox(fitz.Rect(56, 56, 540, 790), "\n\n".join(lines), fontsize=10)
+    doc.save(path)
+    doc.close()
+
+
+def _make_corpus(folder: Path, num_pdfs: int, num_pages: int) -> Dict[Path, List[List[str]]]:
+    rng = random.Random(0)
+    corpus = {}
+    for i in range(num_pdfs):
+        path = folder / f"Synthetic-Policy-{i:03d}-V1.pdf"
+        corpus[path] = [_page_text(rng, i, p) for p in range(num_pages)]
+        _write_pdf(path, corpus[path])
+    return corpus
+
+
+def _run(label: str, pdfs: List[Path], store: Any, base_url: str, cfg: Dict[str, Any], pages: int) -> Dict[str, Any]:
+    # A new client per pass: its connection pool belongs to the event loop
+    # of the asyncio.run() that first used it.
+    embeddings = OpenAIEmbeddings(
+        model=cfg["chroma"]["embedding_model"],
+        base_url=base_url,
+        check_embedding_ctx_length=False,
+        max_retries=0,
+    )
+    t0 = time.perf_counter()
+    result = asyncio.run(preprocess._run_pipeline(pdfs, store, embeddings, cfg))
+    wall = time.perf_counter() - t0
+    return {
+        "pass": label,
+        "wall_s": round(wall, 2),
+        "chunks": result.total_chunks,
+        "pages_per_s": round(pages / wall, 1) if wall else 0.0,
+        "chunks_per_s": round(result.total_chunks / wall, 1) if wall else 0.0,
+        "stages": {name: stage.as_dict() for name, stage in result.stages.items()},
+        "phases_ms": result.timings.as_ms(),
+        "embedding": asdict(result.embedding),
+        "partition": result.partitions.as_dict(
+            preprocess._adaptive_cfg(cfg) if cfg["partition_strategy"] == "adaptive" else None
+        ),
+        "store_count": store.count(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline benchmark of the ingestion pipeline.")
+    parser.add_argument("--pdfs", type=int, default=10)
+    parser.add_argument("--pages", type=int, default=8)
+    parser.add_argument("--strategy", default="fast", help="unstructured partition strategy, or adaptive")
+    parser.add_argument("--partition-workers", type=int, default=None)
+    parser.add_argument("--embed-latency", type=float, default=0.05)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--output", type=Path, default=None, help="also write the JSON result here")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = Path(tmp)
+        folder = root / "pdfs"
+        folder.mkdir()
+        corpus = _make_corpus(folder, args.pdfs, args.pages)
+        pdfs = sorted(corpus)
+
+        # Absolute paths: ROOT_DIR / <absolute> leaves them unchanged.
+        cfg = {
+            **preprocess._DEFAULT_CFG,
+            "partition_strategy": args.strategy,
+            "partition_cache": {"enabled": False},
+            "vector_store": {"backend": "local", "path": str(root / "vector_index")},
+            "lexical_index": {"path": str(root / "lexical.json.gz")},
+            "pipeline": {**preprocess._DEFAULT_CFG["pipeline"], "partition_workers": args.partition_workers},
+            "embedding_scheduler": {
+                **preprocess._DEFAULT_CFG["embedding_scheduler"],
+                "checkpoint_path": str(root / "embedding_checkpoint.jsonl"),
+            },
+            "incremental": {
+                **preprocess._DEFAULT_CFG["incremental"],
+                "manifest_path": str(root / "ingest_manifest.json"),
+            },
+        }
+        store = LocalVectorStore(root / "vector_index", read_only=False)
+
+        with FakeOpenAIServer(create_app(latency=args.embed_latency, dim=args.dim)) as fake:
+            total_pages = args.pdfs * args.pages
+            passes = [
+                _run("full", pdfs, store, fake.base_url, cfg, total_pages),
+                _run("unchanged", pdfs, store, fake.base_url, cfg, total_pages),
+            ]
+            edited = pdfs[0]
+            corpus[edited][0] = corpus[edited][0] + ["This paragraph was added in a later revision."]
+            _write_pdf(edited, corpus[edited])
+            passes.append(_run("edit", pdfs, store, fake.base_url, cfg, total_pages))
+            counters = dict(fake.counters)
+
+    report = {
+        "run": run_info(),
+        "config": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()},
+        "passes": passes,
+        "fake_openai": counters,
+    }
+    text = dumps(report)
+    if args.output:
+        args.output.write_text(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
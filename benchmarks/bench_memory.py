@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+"""Peak memory of ingestion against document size, windowed vs. one shot.
+
+Generates one synthetic policy PDF per ``--pages`` size and ingests each
+in a fresh subprocess, so every measurement starts from a clean heap:
+
+* ``ingest`` – :func:`backend.ingestion.ingest._embed_stream` (PyMuPDF text,
+  recursive splitter, Chroma) into an ephemeral Chroma client;
+* ``pipeline`` – :func:`backend.ingestion.preprocess._run_pipeline`
+  (partition, chunk, embed, upsert) into an embedded vector store; needs
+  ``unstructured`` installed.
+
+Each is run with ``--window`` pages per step and with windowing disabled
+(the whole document at once).  Embeddings come from
+:mod:`benchmarks.fake_openai`.  Reported per case: the ``tracemalloc``
+peak of the ingesting process, its maximum RSS and the largest RSS of its child
+processes (partitioning runs in a process pool), wall time and chunks.
+
+Usage::
+
+    python -m benchmarks.bench_memory --pages 50,200,600 --modes ingest,pipeline --output memory.json
+"""
+
+import os
+
+# The OpenAI client wants a key; the fake server ignores it.
+os.environ.setdefault("OPENAI_API_KEY", "sk-offline-benchmark")
+
+import argparse  # noqa: E402
+import asyncio  # noqa: E402
+import json  # noqa: E402
+import random  # noqa: E402
+import resource  # noqa: E402
+import subprocess  # noqa: E402
+import sys  # noqa: E402
+import tempfile  # noqa: E402
+import time  # noqa: E402
+import tracemalloc  # noqa: E402
+from pathlib import Path  # noqa: E402
+from typing import Any, Dict  # noqa: E402
+
+import fitz  # PyMuPDF  # noqa: E402
+
+from benchmarks.fake_openai import FakeOpenAIServer, create_app  # noqa: E402
+from benchmarks.fakes import dumps, run_info  # noqa: E402
+
+
+def _write_pdf(path: Path, pages: int) -> None:
+    # Same page text as bench_ingest, which cannot be imported without unstructured.
+    rng = random.Random(0)
+    doc = fitz.open()
+    for number in range(pages):
+        lines = [f"Section {number + 1}"]
+        for _ in range(rng.randint(4, 8)):
+            lines.append(
+                f"Staff on band {rng.randint(2, 9)} with {rng.randint(6, 26)} weeks' service may request "
+                f"{rng.randint(1, 52)} weeks of leave; the line manager responds within {rng.randint(5, 30)} days "
+                f"using form W{rng.randint(10, 99)} and records the outcome on ESR."
+            )
+        doc.new_page().insert_textbox(fitz.Rect(56, 56, 540, 790), "\n\n".join(lines), fontsize=10)
+    doc.save(path)
+    doc.close()
+
+
+def _maxrss_mb(who: int) -> float:
+    # Linux reports kilobytes, macOS bytes.
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(resource.getrusage(who).ru_maxrss / scale, 1)
+
+
+# ---------------------------------------------------------------------------
+# Child process: one ingestion run
+# ---------------------------------------------------------------------------
+
+
+def _embeddings(base_url: str) -> Any:
+    from langchain_openai import OpenAIEmbeddings
+
+    return OpenAIEmbeddings(
+        model="text-embedding-3-small", base_url=base_url, check_embedding_ctx_length=False, max_retries=0
+    )
+
+
+def _ingest(pdf: Path, work: Path, base_url: str, window: int | None) -> int:
+    import chromadb
+    from langchain_community.vectorstores import Chroma
+
+    from backend.ingestion import ingest
+
+    ingest.SCHEDULER_CFG = {"checkpoint_path": str(work / "checkpoint.jsonl")}
+    if window is None:
+        ingest.WINDOW_PAGES = ingest.EMBED_WINDOW = sys.maxsize
+    else:
+        ingest.WINDOW_PAGES = window
+    vectordb = Chroma(client=chromadb.EphemeralClient(), collection_name="bench", embedding_function=_embeddings(base_url))
+    return asyncio.run(ingest._embed_stream([pdf], vectordb))
+
+
+def _pipeline(pdf: Path, work: Path, base_url: str, window: int | None) -> int:
+    from backend.ingestion import preprocess
+    from backend.vectorstore import LocalVectorStore
+
+    # Absolute paths: ROOT_DIR / <absolute> leaves them unchanged.
+    cfg = {
+        **preprocess._DEFAULT_CFG,
+        "partition_strategy": "fast",
+        "partition_cache": {"enabled": False},
+        "vector_store": {"backend": "local", "path": str(work / "vector_index")},
+        "lexical_index": {"path": str(work / "lexical.json.gz")},
+        "pipeline": {**preprocess._DEFAULT_CFG["pipeline"], "partition_workers": 1, "window_pages": window},
+        "embedding_scheduler": {
+            **preprocess._DEFAULT_CFG["embedding_scheduler"],
+            "checkpoint_path": str(work / "embedding_checkpoint.jsonl"),
+        },
+        "incremental": {**preprocess._DEFAULT_CFG["incremental"], "manifest_path": str(work / "manifest.json")},
+    }
+    store = LocalVectorStore(work / "vector_index", read_only=False)
+    return asyncio.run(preprocess._run_pipeline([pdf], store, _embeddings(base_url), cfg)).total_chunks
+
+
+def _child(spec: Dict[str, Any]) -> None:
+    run = {"ingest": _ingest, "pipeline": _pipeline}[spec["mode"]]
+    with tempfile.TemporaryDirectory() as work:
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        chunks = run(Path(spec["pdf"]), Path(work), spec["base_url"], spec["window"])
+        wall = time.perf_counter() - t0
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    result = {
+        "chunks": chunks,
+        "wall_s": round(wall, 2),
+        "traced_peak_mb": round(peak / 1024 / 1024, 1),
+        "maxrss_mb": _maxrss_mb(resource.RUSAGE_SELF),
+        "children_maxrss_mb": _maxrss_mb(resource.RUSAGE_CHILDREN),
+    }
+    # Last line of stdout; ingestion logs come before it.
+    print(json.dumps(result))
+
+
+# ---------------------------------------------------------------------------
+# Parent: corpus, fake endpoint and one subprocess per case
+# ---------------------------------------------------------------------------
+
+
+def _measure(mode: str, pdf: Path, base_url: str, window: int | None) -> Dict[str, Any]:
+    spec = {"mode": mode, "pdf": str(pdf), "base_url": base_url, "window": window}
+    proc = subprocess.run(
+        [sys.executable, "-m", "benchmarks.bench_memory", "--child", json.dumps(spec)],
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        return {"error": proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit {proc.returncode}"}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Peak memory of ingestion by document size.")
+    parser.add_argument("--pages", default="50,200,600", help="comma-separated document sizes")
+    parser.add_argument("--modes", default="ingest,pipeline", help="ingest and/or pipeline")
+    parser.add_argument("--window", type=int, default=50, help="pages per window in the windowed runs")
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--output", type=Path, default=None, help="also write the JSON result here")
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(json.loads(args.child))
+        return
+
+    sizes = [int(n) for n in args.pages.split(",") if n]
+    modes = [m for m in args.modes.split(",") if m]
+    cases = []
+    with tempfile.TemporaryDirectory() as tmp, FakeOpenAIServer(create_app(latency=0.0, dim=args.dim)) as fake:
+        for pages in sizes:
+            pdf = Path(tmp) / f"Synthetic-Handbook-{pages}p.pdf"
+            _write_pdf(pdf, pages)
+            for mode in modes:
+                for window in (args.window, None):
+                    result = _measure(mode, pdf, fake.base_url, window)
+                    cases.append({"mode": mode, "pages": pages, "window": window, **result})
+                    print(f"{mode:<9} {pages:>5} pages  window {window or 'off':>4}  {result}", file=sys.stderr)
+
+    report = {
+        "run": run_info(),
+        "config": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items() if k != "child"},
+        "cases": cases,
+    }
+    text = dumps(report)
+    if args.output:
+        args.output.write_text(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
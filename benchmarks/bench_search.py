@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+"""Compare vector, lexical and hybrid retrieval on the query trace file.
+
+Every trace (rotated files included) whose answer cited sources becomes a test case: the cited
+``(file, page)`` pairs are the relevant set, and each search mode is scored
+by recall@k over the pages of the chunks it retrieves.  Retrieval latency
+(embedding included, LLM excluded) is reported per mode, together with how
+often the lexical fast path skipped the embedding call.
+
+The stores named by ``--config`` (or the retrieval defaults) are used, so
+run ingestion first.  ``--synthetic N`` instead replays N generated
+questions against the in-process fakes, which only exercises the harness.
+
+Usage::
+
+    python -m benchmarks.bench_search --traces local/traces/query_traces.jsonl --k 4 10
+"""
+
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Set, Tuple
+
+import yaml
+
+from backend import ROOT_DIR
+from backend.retrieval import retrieval
+from backend.retrieval.resources import ResourceRegistry, get_registry, install_registry
+from backend.retrieval.trace_writer import iter_traces
+from backend.utils.config_utils import deep_update
+from benchmarks.fakes import FakeRegistry, dumps, percentiles
+
+_MODES: Dict[str, Dict[str, Any]] = {
+    "vector": {"mode": "vector"},
+    "lexical": {"mode": "lexical"},
+    "hybrid": {"mode": "hybrid", "lexical_fast_path": False},
+    "hybrid+fast_path": {"mode": "hybrid", "lexical_fast_path": True},
+}
+
+Case = Tuple[str, Set[Tuple[str, int | None]]]
+
+
+def _load_cases(path: Path, limit: int | None) -> List[Case]:
+    cases: List[Case] = []
+    for rec in iter_traces(path):
+        _, sources = retrieval._extract_answer_and_sources(rec.get("raw_llm_response") or "")
+        relevant = {(s["file"], s.get("page")) for s in sources if isinstance(s, dict) and s.get("file")}
+        if relevant:
+            cases.append((rec["question"], relevant))
+    return cases[:limit] if limit else cases
+
+
+def _synthetic_cases(registry: FakeRegistry, n: int) -> List[Case]:
+    meta = registry.collection.metadatas
+    rows = list(range(0, len(meta), max(1, len(meta) // n)))[:n]
+    # Alternate keyword-style and natural-language phrasing.
+    return [
+        (
+            f"paragraph {i} leave" if j % 2 == 0 else f"What does paragraph {i} say about leave?",
+            {(meta[i]["filename"], meta[i]["page_number"])},
+        )
+        for j, i in enumerate(rows)
+    ]
+
+
+def _recall(docs: List[Any], relevant: Set[Tuple[str, int | None]], k: int) -> float:
+    retrieved = {(d.metadata.get("filename"), d.metadata.get("page_number")) for d in docs[:k]}
+    # A citation without a page counts as found if any chunk of the file is.
+    files = {f for f, _ in retrieved}
+    hits = sum(1 for f, p in relevant if (f, p) in retrieved or (p is None and f in files))
+    return hits / len(relevant)
+
+
+async def _run_mode(cases: List[Case], cfg_path: str, ks: List[int], concurrency: int) -> Dict[str, Any]:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    recalls: Dict[int, List[float]] = {k: [] for k in ks}
+    modes_used: Dict[str, int] = {}
+
+    async def one(question: str, relevant: Set[Tuple[str, int | None]]) -> None:
+        async with semaphore:
+            t0 = time.perf_counter()
+            turn = await retrieval._aprepare(question, None, cfg_path)
+            latencies.append(time.perf_counter() - t0)
+        used = (turn.search_info or {}).get("mode", "vector")
+        modes_used[used] = modes_used.get(used, 0) + 1
+        for k in ks:
+            recalls[k].append(_recall(turn.docs, relevant, k))
+
+    await asyncio.gather(*(one(q, rel) for q, rel in cases))
+    return {
+        "latency_ms": percentiles(latencies),
+        "recall": {f"@{k}": round(sum(v) / len(v), 3) for k, v in recalls.items()},
+        "paths": modes_used,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Vector vs lexical vs hybrid retrieval on the trace file.")
+    parser.add_argument("--traces", type=Path, default=ROOT_DIR / "local/traces/query_traces.jsonl")
+    parser.add_argument("--config", type=Path, default=None, help="retrieval YAML override")
+    parser.add_argument("--k", type=int, nargs="+", default=[4])
+    parser.add_argument("--limit", type=int, default=None)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--synthetic", type=int, default=None, metavar="N")
+    args = parser.parse_args()
+
+    registry: ResourceRegistry
+    if args.synthetic:
+        registry = FakeRegistry(embed_latency=0.05, search_latency=0.01, num_chunks=2000, lexical=True)
+        install_registry(registry)
+        cases = _synthetic_cases(registry, args.synthetic)
+    else:
+        registry = get_registry()
+        cases = _load_cases(args.traces, args.limit)
+    if not cases:
+        raise SystemExit(f"No traces with cited sources in {args.traces}")
+
+    base: Dict[str, Any] = {}
+    if args.config:
+        base = yaml.safe_load(args.config.read_text()) or {}
+    result: Dict[str, Any] = {"cases": len(cases), "k": args.k, "modes": {}}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, search in _MODES.items():
+            # Caches off so every mode pays for its own embedding calls.
+            override = deep_update(
+                json.loads(json.dumps(base)),
+                {
+                    "top_k": max(args.k),
+                    "search": search,
+                    "enable_tracing": False,
+                    "answer_cache": {"enabled": False},
+                    "embedding_cache": {"enabled": False},
+                },
+            )
+            cfg_path = Path(tmp) / f"{name}.yaml"
+            cfg_path.write_text(yaml.safe_dump(override))
+            result["modes"][name] = registry.run_sync(_run_mode(cases, str(cfg_path), args.k, args.concurrency))
+
+    registry.close()
+    print(dumps(result))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+"""Local OpenAI-compatible HTTP server for offline benchmarks.
+
+Serves ``POST /v1/embeddings`` with deterministic vectors and can inject
+throttling the way the real API does: a random share of requests, or any
+request beyond a tokens-per-minute budget, is rejected with ``429`` and a
+``Retry-After`` header.
+
+``POST /v1/chat/completions`` answers after ``chat_latency`` seconds (or
+streams the answer word by word over that time) with a short answer that
+cites the first ``Document: …, Page: …`` of the prompt in the trailing
+``{"sources": [...]}`` line, so the whole pipeline – parsing included – runs
+as in production.  Point the OpenAI/LangChain clients at it with
+``base_url=server.base_url`` or ``OPENAI_BASE_URL``.
+
+Run stand-alone with::
+
+    python -m benchmarks.fake_openai --port 8765 --throttle-rate 0.1
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import random
+import re
+import socket
+import threading
+import time
+from array import array
+from typing import Any, Dict, List
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from benchmarks.fakes import fake_vector
+
+__all__ = ["FakeOpenAIServer", "create_app"]
+
+
+def _input_key(item: Any) -> str:
+    # LangChain sends token arrays rather than strings when it pre-tokenises.
+    return item if isinstance(item, str) else " ".join(map(str, item))
+
+
+def _input_tokens(item: Any) -> int:
+    return max(1, len(item) // 4) if isinstance(item, str) else len(item)
+
+
+_CITATION_RE = re.compile(r"Document: (?P<file>[^\n,]+), Page: (?P<page>\d+)")
+
+
+def _fake_answer(messages: List[Dict[str, Any]]) -> str:
+    """Deterministic answer citing the first document in the prompt."""
+    prompt = str(messages[-1].get("content", "")) if messages else ""
+    match = _CITATION_RE.search(prompt)
+    if match is None:
+        return "Could you please specify which policy you are asking about?"
+    source = {"file": match["file"].strip(), "page": int(match["page"])}
+    # Models put the sources on their own line or right after the answer,
+    # usually followed by a newline; the streaming parser must hold back both.
+    separator = "\n\n" if source["page"] % 2 else " "
+    return (
+        f"According to {source['file']}, the entitlement is described on page {source['page']}. "
+        "Employees should discuss the details with their line manager before the leave starts."
+        + separator
+        + json.dumps({"sources": [source]})
+        + "\n"
+    )
+
+
+def create_app(
+    *,
+    latency: float = 0.05,
+    throttle_rate: float = 0.0,
+    tokens_per_minute: int | None = None,
+    dim: int = 256,
+    seed: int = 0,
+    chat_latency: float = 0.5,
+) -> FastAPI:
+    """Return a FastAPI app imitating the OpenAI embeddings and chat endpoints."""
+    app = FastAPI(title="fake-openai")
+    rng = random.Random(seed)
+    window: List[tuple[float, int]] = []
+    app.state.counters = counters = {"requests": 0, "throttled": 0, "tokens": 0, "chat_requests": 0}
+
+    def over_budget(tokens: int) -> bool:
+        if tokens_per_minute is None:
+            return False
+        now = time.monotonic()
+        while window and now - window[0][0] > 60:
+            window.pop(0)
+        if sum(n for _, n in window) + tokens > tokens_per_minute:
+            return True
+        window.append((now, tokens))
+        return False
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request) -> Any:
+        body: Dict[str, Any] = await request.json()
+        inputs = body["input"]
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        tokens = sum(_input_tokens(i) for i in inputs)
+        counters["requests"] += 1
+
+        if rng.random() < throttle_rate or over_budget(tokens):
+            counters["throttled"] += 1
+            return JSONResponse(
+                status_code=429,
+                headers={"retry-after": "0.2"},
+                content={"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+            )
+
+        await asyncio.sleep(latency)
+        counters["tokens"] += tokens
+        data = []
+        for idx, item in enumerate(inputs):
+            vector = fake_vector(_input_key(item), dim)
+            if body.get("encoding_format") == "base64":
+                encoded: Any = base64.b64encode(array("f", vector).tobytes()).decode("ascii")
+            else:
+                encoded = vector
+            data.append({"object": "embedding", "index": idx, "embedding": encoded})
+        return {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "fake"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        }
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request) -> Any:
+        body: Dict[str, Any] = await request.json()
+        counters["chat_requests"] += 1
+        answer = _fake_answer(body.get("messages") or [])
+        model = body.get("model", "fake")
+        created = int(time.time())
+
+        if not body.get("stream"):
+            await asyncio.sleep(chat_latency)
+            return {
+                "id": f"chatcmpl-{counters['chat_requests']}",
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [
+                    {"index": 0, "message": {"role": "assistant", "content": answer}, "finish_reason": "stop"}
+                ],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(answer) // 4, "total_tokens": len(answer) // 4},
+            }
+
+        words = answer.split(" ")
+
+        async def events() -> Any:
+            for i, word in enumerate(words):
+                await asyncio.sleep(chat_latency / len(words))
+                chunk = {
+                    "id": f"chatcmpl-{counters['chat_requests']}",
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": {"content": word if i == 0 else " " + word}, "finish_reason": None}],
+                }
+                yield f"data: {json.dumps(chunk)}\n\n"
+            done = {
+                "id": f"chatcmpl-{counters['chat_requests']}",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+            }
+            yield f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+class FakeOpenAIServer:
+    """Run :func:`create_app` on a background thread (context manager)."""
+
+    def __init__(self, app: FastAPI | None = None, *, host: str = "127.0.0.1", port: int = 0, **app_kwargs: Any) -> None:
+        self.app = app or create_app(**app_kwargs)
+        if port == 0:
+            with socket.socket() as sock:
+                sock.bind((host, 0))
+                port = sock.getsockname()[1]
+        self.host, self.port = host, port
+        self._server = uvicorn.Server(uvicorn.Config(self.app, host=host, port=port, log_level="warning"))
+        self._thread = threading.Thread(target=self._server.run, name="fake-openai", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1"
+
+    @property
+    def counters(self) -> Dict[str, int]:
+        return self.app.state.counters
+
+    def __enter__(self) -> "FakeOpenAIServer":
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._server.should_exit = True
+        self._thread.join(timeout=5)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--tokens-per-minute", type=int, default=None)
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--chat-latency", type=float, default=0.5)
+    args = parser.parse_args()
+    app = create_app(
+        latency=args.latency,
+        throttle_rate=args.throttle_rate,
+        tokens_per_minute=args.tokens_per_minute,
+        dim=args.dim,
+        chat_latency=args.chat_latency,
+    )
+    uvicorn.run(app, host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+"""Deterministic in-process stand-ins for the embedding, Chroma and LLM clients.
+
+The fakes mirror the small slice of each client API that the retrieval
+pipeline uses and add a configurable latency so that benchmarks exercise the
+same concurrency behaviour as the real network calls.
+"""
+
+import asyncio
+import hashlib
+import json
+import platform
+import random
+import subprocess
+import time
+from datetime import datetime, timezone
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List
+
+from backend import ROOT_DIR
+from backend.retrieval.resources import AsyncResources, ResourceRegistry
+from backend.utils.timing import percentiles
+from backend.vectorstore import LexicalIndex
+
+__all__ = [
+    "FakeChatModel",
+    "FakeCollection",
+    "FakeEmbeddings",
+    "FakeRegistry",
+    "dumps",
+    "fake_vector",
+    "percentiles",
+    "run_info",
+]
+
+_DIM = 64
+
+_ANSWER = (
+    "Employees are entitled to take 52 weeks' adoption leave.\n\n"
+    '{"sources":[{"file":"Managers-and-Staff-Policy-Handbook-2024-W100.pdf","page":37}]}'
+)
+
+
+def fake_vector(text: str, dim: int = _DIM) -> List[float]:
+    """Return a unit-length pseudo-random vector seeded by *text*."""
+    rng = random.Random(hashlib.sha256(text.encode("utf-8")).digest())
+    vec = [rng.gauss(0.0, 1.0) for _ in range(dim)]
+    norm = sum(v * v for v in vec) ** 0.5 or 1.0
+    return [v / norm for v in vec]
+
+
+class FakeEmbeddings:
+    """Embedding client with a fixed per-call latency."""
+
+    def __init__(self, latency: float = 0.05, dim: int = _DIM) -> None:
+        self.latency = latency
+        self.dim = dim
+        self.calls = 0
+
+    def embed_query(self, text: str) -> List[float]:
+        self.calls += 1
+        time.sleep(self.latency)
+        return fake_vector(text, self.dim)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        time.sleep(self.latency)
+        return [fake_vector(t, self.dim) for t in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return fake_vector(text, self.dim)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return [fake_vector(t, self.dim) for t in texts]
+
+
+@dataclass
+class _FakeMessage:
+    content: str
+
+
+class FakeChatModel:
+    """Chat model that returns a canned answer with a sources line."""
+
+    def __init__(self, latency: float = 0.5, answer: str = _ANSWER) -> None:
+        self.latency = latency
+        self.answer = answer
+        self.calls = 0
+
+    def invoke(self, messages: List[Any]) -> _FakeMessage:
+        self.calls += 1
+        time.sleep(self.latency)
+        return _FakeMessage(self.answer)
+
+    async def ainvoke(self, messages: List[Any]) -> _FakeMessage:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return _FakeMessage(self.answer)
+
+    async def astream(self, messages: List[Any]) -> AsyncIterator[_FakeMessage]:
+        """Yield the answer word by word; *latency* is spread over the stream."""
+        self.calls += 1
+        words = self.answer.split(" ")
+        for i, word in enumerate(words):
+            await asyncio.sleep(self.latency / len(words))
+            yield _FakeMessage(word if i == 0 else " " + word)
+
+
+class FakeCollection:
+    """Chroma collection over synthetic chunks with exact dot-product search."""
+
+    def __init__(self, num_chunks: int = 200, latency: float = 0.02, dim: int = _DIM) -> None:
+        self.latency = latency
+        self.documents = [
+            f"Synthetic policy paragraph {i} about leave, pay and sickness." for i in range(num_chunks)
+        ]
+        self.metadatas = [
+            {"filename": f"Policy-{i % 10}.pdf", "page_number": i % 40 + 1, "pdf_hash": f"hash{i % 10}"}
+            for i in range(num_chunks)
+        ]
+        self.embeddings = [fake_vector(d, dim) for d in self.documents]
+
+    def _query(self, vector: List[float], n_results: int) -> Dict[str, Any]:
+        scores = [sum(a * b for a, b in zip(vector, e)) for e in self.embeddings]
+        top = sorted(range(len(scores)), key=scores.__getitem__, reverse=True)[:n_results]
+        return {
+            "ids": [[str(i) for i in top]],
+            "documents": [[self.documents[i] for i in top]],
+            "metadatas": [[self.metadatas[i] for i in top]],
+            "distances": [[1.0 - scores[i] for i in top]],
+        }
+
+    def query(self, query_embeddings: List[List[float]], n_results: int = 10, **_: Any) -> Dict[str, Any]:
+        time.sleep(self.latency)
+        return self._query(query_embeddings[0], n_results)
+
+    async def aget(self, ids: List[str] | None = None, include: List[str] | None = None, **_: Any) -> Dict[str, Any]:
+        await asyncio.sleep(self.latency)
+        rows = [int(i) for i in ids] if ids is not None else range(len(self.documents))
+        return {
+            "ids": [str(i) for i in rows],
+            "documents": [self.documents[i] for i in rows],
+            "metadatas": [self.metadatas[i] for i in rows],
+        }
+
+    def lexical_index(self) -> LexicalIndex:
+        """Build an in-memory BM25 index over the synthetic chunks."""
+        index = LexicalIndex()
+        index.upsert([str(i) for i in range(len(self.documents))], self.documents, self.metadatas)
+        return index
+
+    async def aquery(self, query_embeddings: List[List[float]], n_results: int = 10, **_: Any) -> Dict[str, Any]:
+        await asyncio.sleep(self.latency)
+        return self._query(query_embeddings[0], n_results)
+
+
+class _AsyncCollectionView:
+    """Expose :meth:`FakeCollection.aquery` under chromadb's async ``query`` name."""
+
+    def __init__(self, collection: FakeCollection) -> None:
+        self._collection = collection
+
+    async def query(self, **kwargs: Any) -> Dict[str, Any]:
+        return await self._collection.aquery(**kwargs)
+
+    async def get(self, **kwargs: Any) -> Dict[str, Any]:
+        return await self._collection.aget(**kwargs)
+
+
+class _FakeResources:
+    """Duck-typed :class:`~backend.retrieval.resources.RetrievalResources`."""
+
+    def __init__(self, key: str, embeddings: FakeEmbeddings, collection: FakeCollection, chat_model: FakeChatModel) -> None:
+        self.key = key
+        self.embeddings = embeddings
+        self.collection = collection
+        self.chat_model = chat_model
+        self.created_at = time.time()
+        self.uses = 0
+
+    async def async_clients(self) -> AsyncResources:
+        return AsyncResources(
+            embeddings=self.embeddings,
+            chat_model=self.chat_model,
+            collection=_AsyncCollectionView(self.collection),
+            http_client=_NullAsyncClient(),
+        )
+
+    async def aclose(self) -> None:
+        return None
+
+    def close(self) -> None:
+        return None
+
+
+class _NullAsyncClient:
+    async def aclose(self) -> None:
+        return None
+
+
+class FakeRegistry(ResourceRegistry):
+    """Resource registry that hands out fakes instead of network clients."""
+
+    def __init__(
+        self,
+        *,
+        embed_latency: float = 0.05,
+        search_latency: float = 0.02,
+        llm_latency: float = 0.5,
+        num_chunks: int = 200,
+        lexical: bool = False,
+    ) -> None:
+        super().__init__()
+        self.embeddings = FakeEmbeddings(embed_latency)
+        self.collection = FakeCollection(num_chunks, search_latency)
+        self.chat_model = FakeChatModel(llm_latency)
+        self.lexical = self.collection.lexical_index() if lexical else None
+
+    def lexical_index(self, cfg: Dict[str, Any]) -> LexicalIndex | None:
+        return self.lexical
+
+    def _build(self, key: str, cfg: Dict[str, Any]) -> _FakeResources:
+        return _FakeResources(key, self.embeddings, self.collection, self.chat_model)
+
+
+def dumps(result: Dict[str, Any]) -> str:
+    """Serialise a benchmark result the same way across all benchmarks."""
+    return json.dumps(result, indent=2, sort_keys=True)
+
+
+def run_info() -> Dict[str, Any]:
+    """Commit, interpreter and time of a benchmark run, for comparing results."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "ts": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
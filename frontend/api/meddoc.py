@@ -10,5 +10,6 @@ sys.path.append(str(repo_root))
 
 from backend.main import app as fastapi_app  # noqa: E402
 
-# Vercel will invoke this handler for each request
+# Vercel will invoke this handler for each request.  The RAG stack is imported
+# by the first chat request, not here (see scripts/profile_imports.py).
 handler = Mangum(fastapi_app)
@@ -12,13 +12,23 @@ const PDFViewer = dynamic<PDFViewerProps>(
   { ssr: false },
 );
 
+// The PDF viewer is hidden below the `md` breakpoint; there a citation opens
+// just the cited page, rendered and cached by the backend.
+const pageImageUrl = (file: string, page: number) =>
+  `${process.env.NEXT_PUBLIC_BACKEND_URL}/api/pdf/page?file=${encodeURIComponent(file)}&page=${page}&format=webp`;
+
 export default function Home() {
   const [question, setQuestion] = useState("");
   const [messages, setMessages] = useState<Message[]>([]);
   const [loading, setLoading] = useState(false);
+  // The backend keeps the conversation for this id, so only the new
+  // question is sent each turn; the history goes along only when a worker
+  // does not know the id (409: serverless cold start, restart).
+  const [sessionId] = useState(() => crypto.randomUUID());
   const [currentPdf, setCurrentPdf] = useState<{
     file: string;
     page?: number | null;
+    boxes?: number[][] | null;
   } | null>(null);
 
   useEffect(() => {
@@ -47,20 +57,30 @@ export default function Home() {
       const endpoint = "/api/chat";
       const url = `${process.env.NEXT_PUBLIC_BACKEND_URL}${endpoint}`;
 
-      const messageHistory = messages.map((msg) => ({
-        role: msg.sender === "user" ? "user" : "assistant",
-        content: msg.text || msg.words?.join(" ") || "",
-      }));
-
-      const res = await fetch(url, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({
-          question: trimmed,
-          trace: false,
-          history: messageHistory,
-        }),
-      });
+      const ask = (history?: { role: string; content: string }[]) =>
+        fetch(url, {
+          method: "POST",
+          headers: { "Content-Type": "application/json" },
+          body: JSON.stringify({
+            question: trimmed,
+            trace: false,
+            session_id: sessionId,
+            resume: messages.length > 0,
+            history,
+          }),
+        });
+
+      let res = await ask();
+      if (res.status === 409) {
+        res = await ask(
+          messages
+            .filter((msg) => !msg.loading)
+            .map((msg) => ({
+              role: msg.sender === "user" ? "user" : "assistant",
+              content: msg.text || msg.words?.join(" ") || "",
+            })),
+        );
+      }
       const data = await res.json();
       await new Promise((r) => setTimeout(r, 500));
 
@@ -83,6 +103,7 @@ export default function Home() {
           setCurrentPdf({
             file: s0.file,
             page: s0.page != null ? Number(s0.page) : undefined,
+            boxes: s0.boxes,
           });
         }
         let i = 0;
@@ -173,6 +194,7 @@ export default function Home() {
                   : null
               }
               page={currentPdf?.page}
+              highlights={currentPdf?.boxes}
             />
           </div>
         </div>
@@ -227,10 +249,15 @@ export default function Home() {
                 <MessageBubble
                   key={idx}
                   message={m}
-                  onSourceClick={(file, pg) => {
+                  onSourceClick={(s) => {
+                    if (s.page != null && !window.matchMedia("(min-width: 768px)").matches) {
+                      window.open(pageImageUrl(s.file, Number(s.page)), "_blank", "noopener");
+                      return;
+                    }
                     setCurrentPdf({
-                      file,
-                      page: pg != null ? Number(pg) : undefined,
+                      file: s.file,
+                      page: s.page != null ? Number(s.page) : undefined,
+                      boxes: s.boxes,
                     });
                   }}
                 />
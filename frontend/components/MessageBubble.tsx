@@ -1,10 +1,10 @@
 import React from "react";
-import { Message } from "../types";
+import { Message, Source } from "../types";
 import LoadingDots from "./LoadingDots";
 
 interface Props {
   message: Message;
-  onSourceClick?: (file: string, page?: number | null) => void;
+  onSourceClick?: (source: Source) => void;
 }
 
 const MessageBubble: React.FC<Props> = ({ message, onSourceClick }) => {
@@ -101,7 +101,7 @@ const MessageBubble: React.FC<Props> = ({ message, onSourceClick }) => {
                   className="group flex items-center gap-2 px-3 py-1.5 bg-blue-50 hover:bg-blue-100 border border-blue-200 hover:border-blue-300 rounded-lg text-xs font-medium text-blue-700 transition-all duration-200 shadow-sm hover:shadow"
                   onClick={(e) => {
                     e.stopPropagation();
-                    onSourceClick?.(s.file, s.page);
+                    onSourceClick?.(s);
                   }}
                 >
                   <svg
@@ -117,7 +117,9 @@ const MessageBubble: React.FC<Props> = ({ message, onSourceClick }) => {
                       d="M9 12h6m-6 4h6m2 5H7a2 2 0 01-2-2V5a2 2 0 012-2h5.586a1 1 0 01.707.293l5.414 5.414a1 1 0 01.293.707V19a2 2 0 01-2 2z"
                     />
                   </svg>
-                  <span className="truncate max-w-[150px]">{s.file}</span>
+                  <span className="truncate max-w-[150px]" title={s.text ?? undefined}>
+                    {s.file}
+                  </span>
                   {s.page != null && (
                     <span className="px-1.5 py-0.5 bg-blue-200 rounded text-blue-800 font-semibold">
                       p.{s.page}
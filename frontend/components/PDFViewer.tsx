@@ -3,6 +3,8 @@ import dynamic from "next/dynamic";
 export interface PDFViewerProps {
   fileUrl: string | null;
   page?: number | null;
+  /** Boxes to highlight on `page`: [x0, y0, x1, y1] fractions of the page. */
+  highlights?: number[][] | null;
 }
 
 // Dynamically import the client-side viewer with proper props typing
@@ -13,9 +13,10 @@ pdfjs.GlobalWorkerOptions.workerSrc = new URL(
 interface Props {
   fileUrl: string | null;
   page?: number | null;
+  highlights?: number[][] | null;
 }
 
-export default function PDFViewerClient({ fileUrl, page }: Props) {
+export default function PDFViewerClient({ fileUrl, page, highlights }: Props) {
   const [numPages, setNumPages] = useState<number>();
   const [pdfInst, setPdfInst] = useState<PDFDocumentProxy | null>(null);
 
@@ -138,10 +139,23 @@ export default function PDFViewerClient({ fileUrl, page }: Props) {
             Array.from({ length: numPages }, (_, i) => i + 1).map((n) => (
               <div
                 key={n}
-                className={`shadow-lg rounded-lg overflow-hidden transition-all duration-300 ${
+                className={`relative shadow-lg rounded-lg overflow-hidden transition-all duration-300 ${
                   n === page ? "ring-4 ring-blue-400 ring-offset-4" : ""
                 }`}
               >
+                {n === page &&
+                  highlights?.map(([x0, y0, x1, y1], i) => (
+                    <div
+                      key={i}
+                      className="absolute z-10 pointer-events-none bg-yellow-300/30 border border-yellow-400 rounded-sm"
+                      style={{
+                        left: `${x0 * 100}%`,
+                        top: `${y0 * 100}%`,
+                        width: `${(x1 - x0) * 100}%`,
+                        height: `${(y1 - y0) * 100}%`,
+                      }}
+                    />
+                  ))}
                 <Page
                   pageNumber={n}
                   width={600}
@@ -10,5 +10,8 @@ export interface Message {
 export interface Source {
   file: string;
   page?: number | null;
-  text?: string;
+  /** Snippet of the cited passage. */
+  text?: string | null;
+  /** Passage boxes on `page` as [x0, y0, x1, y1], fractions of the page size. */
+  boxes?: number[][] | null;
 }
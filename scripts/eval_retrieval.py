@@ -0,0 +1,293 @@
+from __future__ import annotations
+
+"""Retrieval-only evaluation: recall@k, MRR and search latency per config.
+
+Usage (from project root):
+
+    # labelled set: one {"question": ..., "relevant": [{"file": ..., "page": ...}]} per line
+    python scripts/eval_retrieval.py --questions eval/questions.jsonl \\
+        --variant baseline= --variant top3=top_k=3 --variant vector=search.mode=vector
+
+    # silver labels: the chunks production retrieved for past questions
+    python scripts/eval_retrieval.py --traces local/traces/query_traces.jsonl \\
+        --variant small=configs/retrieval-3-small.yaml --k 1,3,5,10 --output eval.json
+
+Questions go through the retrieval stage only (embedding, vector / BM25
+search, fusion) – no LLM call is made.  For each embedding model the
+questions are embedded in batches of ``--embed-batch`` per request, then
+searched ``--concurrency`` at a time.  Relevance is judged on
+``(file, page)`` (a label without ``page`` matches any page of the file),
+so results stay comparable across chunking changes.
+
+Each ``--variant NAME=SPEC`` is applied on top of ``--config`` (default:
+``MEDDOC_RETRIEVAL_CONFIG``).  SPEC is either a YAML file or comma-separated
+``dotted.key=value`` overrides (values parsed as YAML); an empty SPEC is the
+base config.  A variant with another ``embedding_model`` must point at a
+vector store built with that model.  The answer and embedding caches are
+always disabled so every question pays for its search.
+"""
+
+import argparse
+import asyncio
+import copy
+import json
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Tuple
+
+import yaml
+
+# ---------------------------------------------------------------------------
+# Ensure project root is importable when running the script directly
+# ---------------------------------------------------------------------------
+ROOT_DIR = Path(__file__).resolve().parent.parent
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from backend.retrieval import retrieval  # noqa: E402
+from backend.retrieval.resources import get_registry, shutdown_registry  # noqa: E402
+from backend.retrieval.trace_writer import iter_traces  # noqa: E402
+from backend.utils.config_utils import deep_update  # noqa: E402
+from backend.utils.timing import Timings  # noqa: E402
+
+# (file, page); page None matches any page of the file.
+Label = Tuple[str, Any]
+
+# Overrides every variant gets: measure the search, not the caches.
+_FORCED = {
+    "answer_cache": {"enabled": False},
+    "embedding_cache": {"enabled": False},
+    "enable_tracing": False,
+}
+
+
+# ---------------------------------------------------------------------------
+# Question sets
+# ---------------------------------------------------------------------------
+
+
+def _labels(entries: List[Dict[str, Any]]) -> List[Label]:
+    labels = []
+    for entry in entries:
+        meta = entry.get("metadata", entry)
+        file = meta.get("file") or meta.get("filename")
+        if file:
+            label = (file, meta.get("page", meta.get("page_number")))
+            if label not in labels:
+                labels.append(label)
+    return labels
+
+
+def _read_questions(path: Path) -> Iterator[Tuple[str, List[Label]]]:
+    with path.open(encoding="utf-8") as fh:
+        for line in fh:
+            if line.strip():
+                rec = json.loads(line)
+                yield rec["question"], _labels(rec.get("relevant") or rec.get("sources") or [])
+
+
+def _trace_questions(path: Path) -> Iterator[Tuple[str, List[Label]]]:
+    for rec in iter_traces(path):
+        if rec.get("question") and rec.get("retrieved_docs"):
+            yield rec["question"], _labels(rec["retrieved_docs"])
+
+
+def load_questions(args: argparse.Namespace) -> List[Tuple[str, List[Label]]]:
+    """Labelled questions (first occurrence of each question), unlabelled ones dropped."""
+    source = _read_questions(args.questions) if args.questions else _trace_questions(args.traces)
+    seen: Dict[str, List[Label]] = {}
+    for question, labels in source:
+        if labels and question not in seen:
+            seen[question] = labels
+            if args.limit and len(seen) >= args.limit:
+                break
+    return list(seen.items())
+
+
+# ---------------------------------------------------------------------------
+# Variants
+# ---------------------------------------------------------------------------
+
+
+def _overrides(spec: str) -> Dict[str, Any]:
+    if spec.endswith((".yaml", ".yml")):
+        with open(spec, encoding="utf-8") as fh:
+            return yaml.safe_load(fh) or {}
+    cfg: Dict[str, Any] = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        dotted, sep, raw = item.partition("=")
+        if not sep:
+            raise SystemExit(f"Bad override {item!r}: expected key=value")
+        *parents, leaf = dotted.split(".")
+        node = cfg
+        for key in parents:
+            node = node.setdefault(key, {})
+        node[leaf] = yaml.safe_load(raw)
+    return cfg
+
+
+def write_variants(specs: List[str], base: Path | None, folder: Path) -> Dict[str, Path]:
+    """Write one merged YAML per ``NAME=SPEC`` into *folder*; return name → path."""
+    base_cfg: Dict[str, Any] = {}
+    if base is not None:
+        with base.open(encoding="utf-8") as fh:
+            base_cfg = yaml.safe_load(fh) or {}
+    paths = {}
+    for spec in specs or ["baseline="]:
+        name, _, rest = spec.partition("=")
+        cfg = deep_update(deep_update(copy.deepcopy(base_cfg), _overrides(rest)), _FORCED)
+        paths[name] = folder / f"{name}.yaml"
+        paths[name].write_text(yaml.safe_dump(cfg))
+    return paths
+
+
+# ---------------------------------------------------------------------------
+# Metrics
+# ---------------------------------------------------------------------------
+
+
+def _matches(doc_label: Label, labels: List[Label]) -> List[int]:
+    file, page = doc_label
+    return [i for i, (f, p) in enumerate(labels) if f == file and (p is None or p == page)]
+
+
+def score(retrieved: List[Label], labels: List[Label], ks: List[int]) -> Dict[str, float]:
+    """recall@k for each *k* and the reciprocal rank of the first relevant chunk."""
+    found: set[int] = set()
+    result: Dict[str, float] = {}
+    rr = 0.0
+    for rank, doc_label in enumerate(retrieved, start=1):
+        hits = _matches(doc_label, labels)
+        if hits and not rr:
+            rr = 1 / rank
+        found.update(hits)
+        for k in ks:
+            if rank == k:
+                result[f"recall@{k}"] = len(found) / len(labels)
+    for k in ks:
+        result.setdefault(f"recall@{k}", len(found) / len(labels))
+    result["mrr"] = rr
+    return result
+
+
+def _pct(values: List[float], pct: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))], 1)
+
+
+# ---------------------------------------------------------------------------
+# Runner
+# ---------------------------------------------------------------------------
+
+
+async def _aembed(questions: List[str], cfg: Dict[str, Any], batch: int) -> Tuple[List[List[float]], float]:
+    registry = get_registry()
+    t0 = time.perf_counter()
+    vectors: List[List[float]] = []
+    for start in range(0, len(questions), batch):
+        vectors += await retrieval._aembed_batch(questions[start : start + batch], registry, cfg)
+    return vectors, time.perf_counter() - t0
+
+
+async def aevaluate(
+    questions: List[Tuple[str, List[Label]]],
+    variants: Dict[str, Path],
+    *,
+    ks: List[int],
+    concurrency: int,
+    embed_batch: int,
+) -> Dict[str, Any]:
+    """Run every variant over *questions*; return the per-variant report."""
+    registry = get_registry()
+    texts = [q for q, _ in questions]
+    embedded: Dict[str, Tuple[List[List[float]], float]] = {}
+    report: Dict[str, Any] = {}
+
+    for name, path in variants.items():
+        cfg = registry.config(retrieval._DEFAULT_CFG, path)
+        model = cfg["embedding_model"]
+        if model not in embedded:
+            embedded[model] = await _aembed(texts, cfg, embed_batch)
+        vectors, embed_s = embedded[model]
+        slots = asyncio.Semaphore(concurrency)
+
+        async def one(index: int) -> Tuple[List[Label], float]:
+            timings = Timings()
+            async with slots:
+                turn = await retrieval._aprepare(texts[index], None, path, timings=timings, query_vector=vectors[index])
+            search_s = timings.spans.get("lexical", 0.0) + timings.spans.get("search", 0.0)
+            return [(d.metadata.get("filename"), d.metadata.get("page_number")) for d in turn.docs], search_s
+
+        await one(0)  # load the indexes outside the timed run
+        t0 = time.perf_counter()
+        results = await asyncio.gather(*(one(i) for i in range(len(texts))))
+        wall = time.perf_counter() - t0
+
+        scores = [score(docs, labels, ks) for (docs, _), (_, labels) in zip(results, questions)]
+        latencies = [search_s * 1000 for _, search_s in results]
+        report[name] = {
+            "config": str(path.name),
+            "embedding_model": model,
+            "top_k": cfg["top_k"],
+            "search_mode": cfg["search"]["mode"],
+            "questions": len(texts),
+            "retrieved_mean": round(statistics.fmean(len(docs) for docs, _ in results), 2),
+            **{key: round(statistics.fmean(s[key] for s in scores), 4) for key in scores[0]},
+            "search_ms": {"p50": _pct(latencies, 50), "p95": _pct(latencies, 95), "p99": _pct(latencies, 99)},
+            "queries_per_s": round(len(texts) / wall, 1) if wall else None,
+            "embed_s": round(embed_s, 2),
+        }
+    return report
+
+
+def _print_table(report: Dict[str, Any], ks: List[int]) -> None:
+    columns = [*(f"recall@{k}" for k in ks), "mrr", "p50 ms", "p95 ms", "q/s"]
+    width = max(len(name) for name in report) + 2
+    print("variant".ljust(width) + "".join(c.rjust(10) for c in columns))
+    for name, row in report.items():
+        cells = [*(f"{row[f'recall@{k}']:.3f}" for k in ks), f"{row['mrr']:.3f}"]
+        cells += [str(row["search_ms"]["p50"]), str(row["search_ms"]["p95"]), str(row["queries_per_s"])]
+        print(name.ljust(width) + "".join(c.rjust(10) for c in cells))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Evaluate retrieval configs without LLM calls.")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--questions", type=Path, help="labelled JSONL question set")
+    source.add_argument("--traces", type=Path, help="query trace file; its retrieved_docs are the labels")
+    parser.add_argument("--variant", action="append", default=[], metavar="NAME=SPEC")
+    parser.add_argument("--config", type=Path, default=None, help="base retrieval YAML")
+    parser.add_argument("--k", default="1,3,5,10", help="comma-separated cut-offs for recall@k")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--embed-batch", type=int, default=256, help="questions per embedding request")
+    parser.add_argument("--limit", type=int, default=None, help="evaluate at most this many questions")
+    parser.add_argument("--output", type=Path, default=None, help="also write the JSON report here")
+    args = parser.parse_args()
+
+    base = args.config or (Path(p) if (p := retrieval._config_path(None)) else None)
+    ks = sorted({int(k) for k in args.k.split(",") if k})
+    questions = load_questions(args)
+    if not questions:
+        raise SystemExit("No labelled questions found")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        variants = write_variants(args.variant, base, Path(tmp))
+        try:
+            report = get_registry().run_sync(
+                aevaluate(questions, variants, ks=ks, concurrency=args.concurrency, embed_batch=args.embed_batch)
+            )
+        finally:
+            shutdown_registry()
+
+    _print_table(report, ks)
+    if args.output:
+        args.output.write_text(json.dumps({"k": ks, "variants": report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+"""Import-time profile of the API entrypoint, with a cold-start budget.
+
+Usage (from project root):
+
+    python scripts/profile_imports.py                      # backend.main, 1000 ms budget
+    python scripts/profile_imports.py --budget-ms 600 --top 30
+    python scripts/profile_imports.py --module backend.retrieval.retrieval --no-check-routes
+
+Each run imports the module in a fresh interpreter under ``python -X
+importtime`` and the median run is reported: total import time, the
+slowest modules by self time and the cost per top-level package.
+
+The script exits non-zero when
+
+* the median import time is over ``--budget-ms``;
+* any of the ``--forbid`` packages (the LLM / vector store stack by default)
+  is loaded by the import itself; or
+* with route checks on (the default for ``backend.main``), a health check or
+  a ``/api/pdf`` request loads one of them.
+
+so it can guard the serverless cold start in CI.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+_DEFAULT_FORBIDDEN = ["chromadb", "langchain", "langchain_core", "langchain_openai", "openai", "tiktoken", "numpy"]
+
+# Imports the module, exercises the cheap routes and prints which forbidden
+# packages ended up in sys.modules.
+_ROUTE_CHECK = """
+import json, sys
+from fastapi.testclient import TestClient
+from {module} import app
+with TestClient(app) as client:
+    client.get("/")
+    client.get("/api/pdf", params={{"file": "import-profile-missing.pdf"}})
+print(json.dumps(sorted(m for m in {forbidden!r} if m in sys.modules)))
+"""
+
+
+def _env() -> Dict[str, str]:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(ROOT_DIR), env.get("PYTHONPATH")]))
+    # backend.config only reads the key; nothing is called.
+    env.setdefault("OPENAI_API_KEY", "sk-import-profile")
+    return env
+
+
+def _profile_once(module: str) -> Tuple[List[Tuple[str, int, int]], List[str]]:
+    """Return ``(name, self_us, cumulative_us)`` rows and the loaded module names."""
+    code = f"import sys, json; import {module}; print(json.dumps(sorted(sys.modules)))"
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT_DIR,
+        env=_env(),
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise SystemExit(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows, json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _route_check(module: str, forbidden: List[str]) -> List[str]:
+    proc = subprocess.run(
+        [sys.executable, "-c", _ROUTE_CHECK.format(module=module, forbidden=forbidden)],
+        cwd=ROOT_DIR,
+        env=_env(),
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise SystemExit(f"route check failed:\n{proc.stderr[-2000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Profile import time of the API entrypoint.")
+    parser.add_argument("--module", default="backend.main")
+    parser.add_argument("--budget-ms", type=float, default=1000.0)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument(
+        "--forbid", default=",".join(_DEFAULT_FORBIDDEN), help="comma-separated packages the import must not load"
+    )
+    parser.add_argument("--no-check-routes", action="store_true", help="skip the health / PDF request check")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+    forbidden = [name for name in args.forbid.split(",") if name]
+
+    runs = [_profile_once(args.module) for _ in range(max(1, args.runs))]
+    totals = [next(cum for name, _, cum in rows if name == args.module) for rows, _ in runs]
+    rows, loaded = runs[totals.index(sorted(totals)[len(totals) // 2])]
+    total_ms = statistics.median(totals) / 1000
+
+    packages: Dict[str, int] = {}
+    for name, self_us, _ in rows:
+        top = name.split(".")[0]
+        packages[top] = packages.get(top, 0) + self_us
+    slowest = sorted(rows, key=lambda row: row[1], reverse=True)[: args.top]
+    imported = sorted(m for m in forbidden if m in loaded)
+    check_routes = not args.no_check_routes and args.module == "backend.main"
+    after_requests = _route_check(args.module, forbidden) if check_routes else []
+
+    report = {
+        "module": args.module,
+        "runs_ms": [round(t / 1000, 1) for t in totals],
+        "total_ms": round(total_ms, 1),
+        "budget_ms": args.budget_ms,
+        "packages_ms": {k: round(v / 1000, 1) for k, v in sorted(packages.items(), key=lambda kv: -kv[1])[: args.top]},
+        "slowest_ms": [{"module": n, "self": round(s / 1000, 1), "cumulative": round(c / 1000, 1)} for n, s, c in slowest],
+        "forbidden_on_import": imported,
+        "forbidden_after_requests": after_requests,
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"import {args.module}: {report['total_ms']} ms (median of {report['runs_ms']}), budget {args.budget_ms} ms")
+        print("\nBy package (self time):")
+        for name, ms in report["packages_ms"].items():
+            print(f"  {ms:>8.1f} ms  {name}")
+        print("\nSlowest modules (self / cumulative):")
+        for row in report["slowest_ms"]:
+            print(f"  {row['self']:>8.1f} / {row['cumulative']:>8.1f} ms  {row['module']}")
+        if check_routes:
+            print(f"\nLoaded by `/` and `/api/pdf`: {', '.join(after_requests) or 'none of the forbidden packages'}")
+
+    failures = []
+    if total_ms > args.budget_ms:
+        failures.append(f"import time {total_ms:.0f} ms is over the {args.budget_ms:.0f} ms budget")
+    if imported:
+        failures.append(f"importing {args.module} loads {', '.join(imported)}")
+    if after_requests:
+        failures.append(f"health / PDF requests load {', '.join(after_requests)}")
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()